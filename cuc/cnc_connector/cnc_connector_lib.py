@@ -5,12 +5,13 @@ import sys
 from collections import OrderedDict
 from dataclasses import dataclass
 
-from .webhook_lib import WebhookHandler
-
 sys.path.insert(0, '..')
 from shared.aux.logger import Logger
+from shared.aux.flowControl import SendBacklog
 from shared.aux.msgQueuePacket import MsgQueuePacket
 from shared.aux.msgType import MsgType
+from shared.qcc.tsn_types import StatusStream, StatusTalkerListener
+from shared.rap.Listener_status import Listener_status
 
 # Logger
 loggerWrapper = Logger(__file__ + ".log")
@@ -26,8 +27,15 @@ class CncConnectorDummySM:
     (see. self.process_cnc_result)
     """
 
-    def __init__(self, queue_register: dict):
+    def __init__(self, queue_register: dict, webhook_enabled: bool = False):
+        """
+        @param queue_register: Dict of all task queues by task name
+        @param webhook_enabled: start the webhook handler (Flask server) for subscription based results.
+                                Flask is only imported if enabled
+        """
         self.queue_register = queue_register
+        # Results to the stream management, which sends its requests to the cnc connector, see SendBacklog
+        self.sml_backlog = SendBacklog(self.queue_register["stream_management"], "cnc_connector")
 
         # State machine of the corresponding task
         # Includes a mapping from msgTypes to handler function to serve requests/indications from other tasks
@@ -41,8 +49,11 @@ class CncConnectorDummySM:
             MsgType.WHH_RESULT_IND: self.process_cnc_result,
         }
 
-        self.wh_handler = WebhookHandler(self.queue_register)
-        """ The Webhook Handler
+        self.wh_handler = None
+        if webhook_enabled:
+            from .webhook_lib import WebhookHandler
+            self.wh_handler = WebhookHandler(self.queue_register)
+        """ The Webhook Handler, None if disabled
          The wh handler can be used to obtain hook ids for requests
             - wh_handler.generate_hook_id
          This hook id can be used as a response callback for long computations, 
@@ -55,6 +66,12 @@ class CncConnectorDummySM:
         """
         return self.states
 
+    def service_timers(self):
+        """ Send the results held back because the queue of the stream management was full
+        @return: seconds until the next attempt, None if no result is held back
+        """
+        return self.sml_backlog.flush()
+
     def add_stream(self, q_pckt: MsgQueuePacket) -> None:
         """ Initiate the resource reservation process with a CNC
         @param q_pckt: Talker-groupings and Listener-groupings
@@ -118,7 +135,110 @@ class CncConnectorDummySM:
         #    "stream_status":
         #}
 
-        #self.queue_register["stream_management"].send_msg(msg=MsgQueuePacket(MsgType.CC_RESERVATION_RESULT_IND, msg),
-        #                                              sender_name="sml")
+        #self.sml_backlog.send(MsgQueuePacket(MsgType.CC_RESERVATION_RESULT_IND, msg))
         pass
 
+
+@dataclass
+class CncConnectorStubSM(CncConnectorDummySM):
+    """
+    CNC Connector standing in for a CNC which approves every request at once. It keeps the requirements of
+    each stream and answers every add/update request with a successful reservation result for the talker
+    and all listeners of the stream, so the whole pipeline can be measured without a CNC (see
+    tools/end_station_fleet.py)
+    """
+
+    def __init__(self, queue_register: dict, webhook_enabled: bool = False, accumulated_latency: int = 0):
+        """
+        @param queue_register: Dict of all task queues by task name
+        @param webhook_enabled: start the webhook handler (Flask server), not used by the stub
+        @param accumulated_latency: accumulated latency reported for every listener
+        """
+        super().__init__(queue_register, webhook_enabled)
+        self.accumulated_latency = accumulated_latency
+        self.streams = {}  # stream_id : {"talker": Talker, "listeners": OrderedDict(mac : Listener)}
+
+    def get_stream(self, stream_id):
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            stream = self.streams[stream_id] = {"talker": None, "listeners": OrderedDict()}
+        return stream
+
+    @staticmethod
+    def listener_mac(listener) -> str:
+        return listener.endStationInterfaces[0].macAddress
+
+    def add_stream(self, q_pckt: MsgQueuePacket) -> None:
+        stream = self.get_stream(q_pckt.message["stream_id"])
+        if q_pckt.message["talker_req"] is not None:
+            stream["talker"] = q_pckt.message["talker_req"]
+        for listener in q_pckt.message["listener_reqs"]:
+            stream["listeners"][self.listener_mac(listener)] = listener
+        self.send_result(q_pckt)
+
+    def update_stream(self, q_pckt: MsgQueuePacket) -> None:
+        self.add_stream(q_pckt)
+
+    def remove_stream(self, q_pckt: MsgQueuePacket) -> None:
+        self.streams.pop(q_pckt.message["stream_id"], None)
+
+    def add_listener(self, q_pckt: MsgQueuePacket) -> None:
+        listener = q_pckt.message["listener_req"]
+        self.get_stream(q_pckt.message["stream_id"])["listeners"][self.listener_mac(listener)] = listener
+        self.send_result(q_pckt)
+
+    def update_listener(self, q_pckt: MsgQueuePacket) -> None:
+        self.add_listener(q_pckt)
+
+    def remove_listener(self, q_pckt: MsgQueuePacket) -> None:
+        self.get_stream(q_pckt.message["stream_id"])["listeners"].pop(q_pckt.message["listener_mac"], None)
+        self.send_result(q_pckt)
+
+    def send_result(self, q_pckt: MsgQueuePacket) -> None:
+        """ Send a successful reservation result for all end stations of a stream to the SML.
+        No result is sent while the talker of the stream is unknown
+        @param q_pckt: request containing the stream_id
+        """
+        stream_id = q_pckt.message["stream_id"]
+        stream = self.streams.get(stream_id)
+        if stream is None or stream["talker"] is None:
+            logger.info("Stream %s has no talker, not answering", stream_id)
+            return
+
+        talker = stream["talker"]
+        # Configure the interfaces as requested by the talker (mac addresses and vlan tag)
+        config_list = [frame.field.getData() for frame in talker.dataFrameSpecification]
+        talker_conf = self.build_status(talker.endStationInterfaces[0].macAddress, config_list, 0)
+        listeners_conf = [self.build_status(mac, config_list, self.accumulated_latency)
+                          for mac in stream["listeners"]]
+        stream_status = StatusStream({
+            "status-info": {
+                "talker-status": 1,  # ready
+                "listener-status": Listener_status.READY,
+                "failure-code": 0
+            },
+            "failed-interfaces": []
+        })
+
+        msg = {
+            "stream_id": stream_id,
+            "talker_conf": talker_conf,
+            "listeners_conf": listeners_conf,
+            "stream_status": stream_status
+        }
+        self.sml_backlog.send(MsgQueuePacket(MsgType.CC_RESERVATION_RESULT_IND, msg, priority=q_pckt.priority))
+
+    @staticmethod
+    def build_status(mac: str, config_list: list, accumulated_latency: int) -> StatusTalkerListener:
+        return StatusTalkerListener({
+            "accumulated-latency": accumulated_latency,
+            "interface-configuration": {
+                "interface-list": [
+                    {
+                        "mac-address": mac,
+                        "interface-name": "",
+                        "config-list": config_list
+                    }
+                ]
+            }
+        })
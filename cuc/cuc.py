@@ -2,6 +2,7 @@ import sys
 import argparse
 import threading
 import time
+import asyncio
 import concurrent.futures
 import enum
 
@@ -11,78 +12,257 @@ import enum
 #from prompt_toolkit import print_formatted_text as print
 
 from protocol_connector.rap_cuc_lib import RapCucSM
+from protocol_connector.port_config import load_port_config, DEFAULT_PORT_CONFIG_PATH
+from protocol_connector.lrp_capture import lrp_capture, DEFAULT_RING_BYTES
 from stream_management.sml_lib import StreamManagementSM
-from cnc_connector.cnc_connector_lib import CncConnectorDummySM
+from cnc_connector.cnc_connector_lib import CncConnectorDummySM, CncConnectorStubSM
 
 from shared.aux.msgQueue import MsgQueue
+from shared.aux.asyncMsgQueue import AsyncMsgQueue
+from shared.aux.flowControl import DEFAULT_QUEUE_CAPACITY
+from shared.aux.latencyStats import latency_recorder
+from shared.aux.profiler import handler_profiler, PROFILE_CPROFILE, PROFILE_SAMPLING
 from shared.aux.msgQueuePacket import MsgQueuePacket
 from shared.aux.msgType import MsgType
 
 
 sys.path.insert(0, '')
 from shared.aux.task import Task
+from shared.aux.async_task import AsyncTask, RUNTIME_THREADED, RUNTIME_ASYNC
 from shared.aux.logger import Logger
 
 loggerWrapper = Logger("cuc.log")
 logger = loggerWrapper.get_logger()
 
-def main():
-    #logger.info("Parsing arguements")
-    #parser = argparse.ArgumentParser(description='RAP endstation prototype:')
+# Maximum number of messages a task drains from its queue per wakeup
+TASK_BATCH_SIZE = 16
+# Capacity of the protocol connector queue, which receives from rap participants and stream management
+PROTOCOL_CONNECTOR_QUEUE_SIZE = 4096
+# CNC connector implementations selectable with --cnc, the stub approves every request at once
+CNC_CONNECTORS = {
+    "dummy": CncConnectorDummySM,
+    "stub": CncConnectorStubSM,
+}
 
+def main():
+    logger.info("Parsing arguements")
+    parser = argparse.ArgumentParser(description='RAP CUC prototype:')
+    parser.add_argument('--runtime', dest='runtime', action='store', default=RUNTIME_THREADED,
+                        choices=[RUNTIME_THREADED, RUNTIME_ASYNC],
+                        help='run the tasks as threads or as coroutines on a single event loop')
+    parser.add_argument('--participant-workers', dest='participant_workers', action='store', type=int, default=0,
+                        help='number of worker processes the RAP participants are sharded across (0 = no workers)')
+    parser.add_argument('--profile-mode', dest='profile_mode', action='store', default=PROFILE_CPROFILE,
+                        choices=[PROFILE_CPROFILE, PROFILE_SAMPLING],
+                        help='capture mode toggled by SIGUSR1')
+    parser.add_argument('--profile-task', dest='profile_task', action='store', default=None,
+                        help='only profile the handlers of this task (default: all tasks)')
+    parser.add_argument('--profile-msg-type', dest='profile_msg_type', action='store', default=None,
+                        help='only profile the handlers of this message type, e.g. LRP_RECORD_WRITTEN_IND')
+    parser.add_argument('--profile-dir', dest='profile_dir', action='store', default='.',
+                        help='directory profiles are written to')
+    parser.add_argument('--lrp-workers', dest='lrp_workers', action='store', type=int, default=1,
+                        help='number of threads serving portal connections (threaded runtime only)')
+    parser.add_argument('--lrp-listeners-per-port', dest='lrp_listeners_per_port', action='store', type=int,
+                        default=1, help='number of lrp workers listening on each local target port (SO_REUSEPORT)')
+    parser.add_argument('--lrp-ingress-rate', dest='lrp_ingress_rate', action='store', type=float, default=0,
+                        help='records per second each portal may send, reading is paused above (0 = no limit)')
+    parser.add_argument('--lrp-ingress-burst', dest='lrp_ingress_burst', action='store', type=float, default=0,
+                        help='records a portal may send at once (default: one second worth of records)')
+    parser.add_argument('--lrp-capture-bytes', dest='lrp_capture_bytes', action='store', type=int,
+                        default=DEFAULT_RING_BYTES,
+                        help='bytes of records captured per portal, dumped on SIGUSR2 or portal errors (0 = off)')
+    parser.add_argument('--capture-dir', dest='capture_dir', action='store', default='.',
+                        help='directory lrp captures are written to')
+    parser.add_argument('--rap-record-size', dest='rap_record_size', action='store', type=int, default=0,
+                        help='bytes of attribute data several attributes are packed into one LRP record up to '
+                             '(0 = one attribute per record)')
+    parser.add_argument('--port-config', dest='port_config', action='store', default=DEFAULT_PORT_CONFIG_PATH,
+                        help='json file with the local and neighbour target ports')
+    parser.add_argument('--webhook', dest='webhook', action='store_true',
+                        help='start the webhook server of the cnc connector (requires flask)')
+    parser.add_argument('--cnc', dest='cnc', action='store', default="dummy", choices=list(CNC_CONNECTORS),
+                        help='cnc connector, "stub" approves every reservation request (for load tests)')
     #parser.add_argument('--mac', dest='mac', action='store', default=None, required=True,
     #                    help='mac address of the end station (format: 00-00-00-00-00-00)')
     #parser.add_argument('--cuc-ip', dest='cuc_ip', action='store', default=None, required=True,
     #                    help='ip address of the cuc')
     #parser.add_argument('--cuc-port', dest='cuc_port', action='store', default=None, required=True,
     #                    help='tcp port of the cuc')
-    #args = parser.parse_args()
+    args = parser.parse_args()
     #mac = args.mac
 
+    handler_profiler.install_signal_handler(args.profile_mode, args.profile_task, args.profile_msg_type,
+                                            args.profile_dir)
+    lrp_capture.configure(args.lrp_capture_bytes, args.capture_dir)
+    lrp_capture.install_signal_handler()
+
+    # The port configuration is loaded and validated once and shared by the protocol connector and all participants
+    port_config = load_port_config(args.port_config)
+
+    if args.runtime == RUNTIME_ASYNC:
+        try:
+            asyncio.run(run_async(args.participant_workers, port_config, args.webhook, args.cnc,
+                                  args.lrp_ingress_rate, args.lrp_ingress_burst, args.rap_record_size))
+        except KeyboardInterrupt:
+            logger.info("Interrupted, terminating cuc task ... ")
+    else:
+        run_threaded(args.participant_workers, port_config, args.webhook, args.lrp_workers,
+                     args.lrp_listeners_per_port, args.cnc, args.lrp_ingress_rate, args.lrp_ingress_burst,
+                     args.rap_record_size)
+
+
+def run_threaded(participant_workers: int = 0, port_config: dict = None, webhook_enabled: bool = False,
+                 lrp_workers: int = 1, lrp_listeners_per_port: int = 1, cnc: str = "dummy",
+                 lrp_ingress_rate: float = 0, lrp_ingress_burst: float = 0, rap_record_size: int = 0):
+    """ Run the CUC tasks as threads which communicate via blocking message queues
+    @param participant_workers: number of worker processes for the RAP participants
+    @param port_config: target port configuration, loaded from the default location if None
+    @param webhook_enabled: start the webhook server of the cnc connector
+    @param lrp_workers: number of threads serving portal connections
+    @param lrp_listeners_per_port: number of lrp workers listening on each local target port
+    @param cnc: name of the cnc connector, see CNC_CONNECTORS
+    @param lrp_ingress_rate: records per second each portal may send, 0 for no limit
+    @param lrp_ingress_burst: records a portal may send at once
+    @param rap_record_size: bytes of attribute data per LRP record attributes are packed up to, 0 for one each
+    """
     app_msg_queue = MsgQueue("cuc_application", logger)
     queue_register = {"cuc_application": app_msg_queue}
 
     logger.info("Initializing tasks... ")
-    protocol_connector_task = init_task("protocol_connector", queue_register)
+    protocol_connector_task = init_task("protocol_connector", queue_register,
+                                        queue_size=PROTOCOL_CONNECTOR_QUEUE_SIZE)
     sml_task                = init_task("stream_management", queue_register)
     cnc_connector_task      = init_task("cnc_connector", queue_register)
 
     logger.info("Initializing libraries... ")
     # protocol connector lib
-    pc_lib = RapCucSM(queue_register=queue_register)
+    pc_lib = RapCucSM(queue_register=queue_register, participant_workers=participant_workers,
+                      port_config=port_config, lrp_workers=lrp_workers,
+                      lrp_listeners_per_port=lrp_listeners_per_port, lrp_ingress_rate=lrp_ingress_rate,
+                      lrp_ingress_burst=lrp_ingress_burst, rap_record_size=rap_record_size)
     # todo console application wrapper for choosing protocol connector instance
     sml_lib = StreamManagementSM(queue_register=queue_register)
-    cnc_connector_lib = CncConnectorDummySM(queue_register=queue_register)
+    cnc_connector_lib = CNC_CONNECTORS[cnc](queue_register=queue_register, webhook_enabled=webhook_enabled)
     # todo console application wrapper for choosing cnc connector instance
 
     """ Startup Tasks as threads """
     terminate_event = threading.Event()
-    pc_lib = protocol_connector_task.run_task_as_thread(pc_lib)
+    pc_thread = protocol_connector_task.run_task_as_thread(pc_lib)
     cnc_connector_thread = cnc_connector_task.run_task_as_thread(cnc_connector_lib)
     sml_thread = sml_task.run_task_as_thread(sml_lib)
 
-    while True:
+    try:
+        while True:
+            logger.info("Waiting for input ... ")
+            app_msg_queue.get_msg(blocking=True)
+            logger.info("Message received, terminating cuc task ... ")
+            break
+    except KeyboardInterrupt:
+        logger.info("Interrupted, terminating cuc task ... ")
+    finally:
+        log_queue_stats(queue_register)
+        log_transport_stats(pc_lib)
+        log_backlog_stats(pc_lib, sml_lib, cnc_connector_lib)
+        latency_recorder.dump(logger)
+        handler_profiler.dump(logger)
+        handler_profiler.stop()
+
+    terminate_event.set()
+
+
+async def run_async(participant_workers: int = 0, port_config: dict = None, webhook_enabled: bool = False,
+                    cnc: str = "dummy", lrp_ingress_rate: float = 0, lrp_ingress_burst: float = 0,
+                    rap_record_size: int = 0):
+    """ Run the CUC tasks as coroutines on the running event loop
+    @param participant_workers: number of worker processes for the RAP participants
+    @param port_config: target port configuration, loaded from the default location if None
+    @param webhook_enabled: start the webhook server of the cnc connector
+    @param cnc: name of the cnc connector, see CNC_CONNECTORS
+    @param lrp_ingress_rate: records per second each portal may send, 0 for no limit
+    @param lrp_ingress_burst: records a portal may send at once
+    @param rap_record_size: bytes of attribute data per LRP record attributes are packed up to, 0 for one each
+    """
+    app_msg_queue = AsyncMsgQueue("cuc_application", logger)
+    queue_register = {"cuc_application": app_msg_queue}
+
+    logger.info("Initializing tasks... ")
+    protocol_connector_task = init_task("protocol_connector", queue_register, task_class=AsyncTask)
+    sml_task                = init_task("stream_management", queue_register, task_class=AsyncTask)
+    cnc_connector_task      = init_task("cnc_connector", queue_register, task_class=AsyncTask)
+
+    logger.info("Initializing libraries... ")
+    pc_lib = RapCucSM(queue_register=queue_register, runtime=RUNTIME_ASYNC, participant_workers=participant_workers,
+                      port_config=port_config, lrp_ingress_rate=lrp_ingress_rate,
+                      lrp_ingress_burst=lrp_ingress_burst, rap_record_size=rap_record_size)
+    sml_lib = StreamManagementSM(queue_register=queue_register)
+    cnc_connector_lib = CNC_CONNECTORS[cnc](queue_register=queue_register, webhook_enabled=webhook_enabled)
+
+    """ Startup Tasks as coroutines """
+    protocol_connector_task.run_task_as_coroutine(pc_lib)
+    cnc_connector_task.run_task_as_coroutine(cnc_connector_lib)
+    sml_task.run_task_as_coroutine(sml_lib)
+
+    try:
         logger.info("Waiting for input ... ")
-        app_msg_queue.get_msg(blocking=True)
+        await app_msg_queue.get_msg(blocking=True)
         logger.info("Message received, terminating cuc task ... ")
-        break
+    finally:
+        log_queue_stats(queue_register)
+        log_transport_stats(pc_lib)
+        log_backlog_stats(pc_lib, sml_lib, cnc_connector_lib)
+        latency_recorder.dump(logger)
+        handler_profiler.dump(logger)
+        handler_profiler.stop()
 
-    terminate_event.set()
+    Task.terminate_event.set()
 
 
 # todo move to Task class
-def init_task(task_name: str, queue_register: dict):
+def init_task(task_name: str, queue_register: dict, batch_size: int = TASK_BATCH_SIZE, task_class=Task,
+              queue_size: int = DEFAULT_QUEUE_CAPACITY):
     """
     Instantiate a Task Object and add its queue to a task register
     @param task_name: Name of the task
     @param queue_register: Dict of all task queues by task name
+    @param batch_size: Maximum number of messages the task processes per wakeup
+    @param task_class: Task for the threaded runtime, AsyncTask for the asyncio runtime
+    @param queue_size: Capacity of the message queue of the task
     @return: Return the task
     """
-    task = Task(name=task_name)
+    task = task_class(name=task_name, batch_size=batch_size, queue_size=queue_size)
     queue_register[task.name] = task.msg_queue
     return task
 
 
+
+def log_queue_stats(queue_register: dict):
+    """ Log occupancy and flow control counters of all task queues
+    @param queue_register: Dict of all task queues by task name
+    """
+    for queue in queue_register.values():
+        logger.info("Queue stats: %s", queue.get_stats())
+
+
+def log_transport_stats(pc_lib: RapCucSM):
+    """ Log connection and record counters of the LRP transport workers
+    @param pc_lib: protocol connector lib
+    """
+    for stats in pc_lib.lrp_dummy_lib.get_worker_stats():
+        logger.info("LRP worker stats: %s", stats)
+
+
+def log_backlog_stats(pc_lib: RapCucSM, sml_lib: StreamManagementSM, cnc_connector_lib: CncConnectorDummySM):
+    """ Log the messages the tasks held back because the queue of the receiving task was full
+    @param pc_lib: protocol connector lib
+    @param sml_lib: stream management lib
+    @param cnc_connector_lib: cnc connector lib
+    """
+    for backlog in (pc_lib.participant_backlog, sml_lib.cnc_backlog, sml_lib.pc_backlog,
+                    cnc_connector_lib.sml_backlog):
+        logger.info("Backlog stats: %s", backlog.get_stats())
+
+
 if __name__ == '__main__':
     main()
     print("Exiting main", flush=True)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import struct
+import signal
+import threading
+from collections import deque
+
+sys.path.insert(0, '..')
+from shared.aux.logger import Logger
+
+# Logger
+loggerWrapper = Logger(__file__ + ".log")
+logger = loggerWrapper.get_logger()
+
+# Capture file format, all numbers big endian:
+#     file header: CAPTURE_MAGIC
+#     entries:     ENTRY_HEADER (time, portal id, event, record number, payload length) + payload
+# The entries of a portal are in order of time, the portals of a file are not
+CAPTURE_MAGIC = b"LRPCAP02"
+ENTRY_HEADER = struct.Struct(">dIBBI")
+# Entry header by file header, version 1 had a payload length of two bytes
+ENTRY_HEADERS = {
+    CAPTURE_MAGIC: ENTRY_HEADER,
+    b"LRPCAP01": struct.Struct(">dIBBH"),
+}
+# Events of the entries
+EVENT_PORTAL = 0  # first entry of a portal, payload is the peer address
+EVENT_IN = 1  # record received from the portal, payload is the attribute TLV or attribute list, empty for a withdrawal
+EVENT_OUT = 2  # record sent to the portal, payload as for EVENT_IN
+EVENT_CLOSED = 3  # last entry of a closed portal, payload is the reason
+EVENT_DROPPED = 4  # follows EVENT_PORTAL if the ring overflowed, payload is the number of dropped entries (4 bytes)
+
+# Bytes of records kept per portal, 0 disables the capture
+DEFAULT_RING_BYTES = 16384
+# Memory accounted per entry in addition to the record: tuple and bytes object
+ENTRY_OVERHEAD = 96
+# Rings of closed portals kept, the peer may have closed the connection because of the records it got
+DEFAULT_CLOSED_RINGS = 64
+# Minimum seconds between two dumps triggered by portal errors, connection resets often come in bursts
+ERROR_DUMP_INTERVAL = 10.0
+
+
+class CaptureRing:
+    """ Bounded ring of the timestamped records of one portal. Appending and evicting costs O(1), the ring is
+    only appended by the LRP worker owning the portal.
+
+    Received records are kept as the views the RAP participants get, see LrpWorker.receive_chunk, and are only
+    copied into a capture file. A view keeps its whole chunk alive. The records of a chunk are evicted in order,
+    so only the oldest chunk of the ring holds more bytes than its records, at most RECEIVE_CHUNK_SIZE
+    """
+
+    def __init__(self, portal_id: str, peer, capacity: int):
+        """
+        @param portal_id: portal the records belong to
+        @param peer: address of the peer, written to the capture file
+        @param capacity: bytes of records kept
+        """
+        self.portal_id = portal_id
+        self.peer = peer
+        self.capacity = capacity
+        self.entries = deque()  # (time, event, record number, payload)
+        self.size = 0
+        self.dropped = 0
+        self.closed = None  # (time, reason) once the portal is closed
+
+    def append(self, timestamp: float, event: int, record_number: int, payload: bytes) -> None:
+        self.entries.append((timestamp, event, record_number, payload))
+        self.size += len(payload) + ENTRY_OVERHEAD
+        while self.size > self.capacity and self.entries:
+            _, _, _, evicted = self.entries.popleft()
+            self.size -= len(evicted) + ENTRY_OVERHEAD
+            self.dropped += 1
+
+    def received(self, records: list) -> None:
+        """ Capture the records of one read
+        @param records: [(record number, attribute data), ...], data may be a view of an immutable chunk
+        """
+        timestamp = time.time()
+        for record_number, data in records:
+            self.append(timestamp, EVENT_IN, record_number, data)
+
+    def sent(self, record: bytes) -> None:
+        """ Capture a record handed to the connection
+        @param record: record as sent, record number followed by the attribute TLV or three zero bytes
+        """
+        payload = bytes(record[1:]) if len(record) > 4 else b''
+        self.append(time.time(), EVENT_OUT, record[0], payload)
+
+    def write(self, f) -> int:
+        """ Write the ring to a capture file
+        @param f: binary file positioned behind the file header
+        @return: number of written records
+        """
+        # copy() runs without releasing the GIL, the worker may append concurrently
+        entries = self.entries.copy()
+        closed = self.closed
+        portal_number = int(self.portal_id)
+        peer = str(self.peer).encode()
+        first = entries[0][0] if entries else time.time()
+
+        f.write(ENTRY_HEADER.pack(first, portal_number, EVENT_PORTAL, 0, len(peer)))
+        f.write(peer)
+        if self.dropped:
+            f.write(ENTRY_HEADER.pack(first, portal_number, EVENT_DROPPED, 0, 4))
+            f.write(self.dropped.to_bytes(4, 'big'))
+        for timestamp, event, record_number, payload in entries:
+            f.write(ENTRY_HEADER.pack(timestamp, portal_number, event, record_number, len(payload)))
+            f.write(payload)
+        if closed is not None:
+            reason = closed[1].encode()
+            f.write(ENTRY_HEADER.pack(closed[0], portal_number, EVENT_CLOSED, 0, len(reason)))
+            f.write(reason)
+        return len(entries)
+
+
+class LrpCapture:
+    """ Always-on capture of the LRP-Dummy records of every portal, shared by all LRP workers of the process.
+
+    Each portal gets a CaptureRing holding its last inbound and outbound records. The rings are written to a
+    capture file on demand (SIGUSR2 once the signal handler is installed, or dump()) and, limited to the
+    failing portal, when a portal fails with a connection error. tools/lrp_capture_analyzer.py decodes the file
+    """
+
+    def __init__(self, ring_bytes: int = DEFAULT_RING_BYTES, closed_rings: int = DEFAULT_CLOSED_RINGS):
+        self.ring_bytes = ring_bytes
+        self.output_dir = "."
+        self.rings = {}  # "portalId" : CaptureRing of the open portals
+        self.closed_rings = deque(maxlen=closed_rings)
+        self.lock = threading.Lock()
+        self.last_error_dump = 0.0
+
+    def configure(self, ring_bytes: int = DEFAULT_RING_BYTES, output_dir: str = None) -> None:
+        """ Configure the capture, portals opened before keep their ring size
+        @param ring_bytes: bytes of records kept per portal, 0 disables the capture
+        @param output_dir: directory capture files are written to
+        """
+        self.ring_bytes = ring_bytes
+        if output_dir is not None:
+            self.output_dir = output_dir
+
+    def open(self, portal_id: str, peer):
+        """ Start capturing a portal
+        @return: ring of the portal, None if the capture is disabled
+        """
+        if self.ring_bytes <= 0:
+            return None
+        ring = CaptureRing(portal_id, peer, self.ring_bytes)
+        with self.lock:
+            self.rings[portal_id] = ring
+        return ring
+
+    def close(self, portal_id: str, reason: str) -> None:
+        """ Stop capturing a portal, its ring is kept with the last closed ones """
+        with self.lock:
+            ring = self.rings.pop(portal_id, None)
+            if ring is not None:
+                ring.closed = (time.time(), reason)
+                self.closed_rings.append(ring)
+
+    def dump(self, reason: str = "request", portal_ids: list = None):
+        """ Write the rings to a capture file
+        @param reason: part of the file name, e.g. request or error
+        @param portal_ids: only write the rings of these portals, None for all open and the last closed ones
+        @return: path of the written file, None if there was nothing to write
+        """
+        with self.lock:
+            rings = list(self.closed_rings) + list(self.rings.values())
+        if portal_ids is not None:
+            rings = [ring for ring in rings if ring.portal_id in portal_ids]
+        if not rings:
+            logger.info("No portal captured, nothing to dump")
+            return None
+
+        path = os.path.join(self.output_dir, "lrp_capture_%s_%s_%s.bin" % (os.getpid(), reason,
+                                                                            time.strftime("%Y%m%d-%H%M%S")))
+        records = 0
+        with open(path, "wb") as f:
+            f.write(CAPTURE_MAGIC)
+            for ring in rings:
+                records += ring.write(f)
+        logger.info("Wrote %s records of %s portals to %s", records, len(rings), path)
+        return path
+
+    def dump_on_error(self, portal_id: str):
+        """ Write the ring of a portal which failed, at most once per ERROR_DUMP_INTERVAL
+        @return: path of the written file, None if no file was written
+        """
+        now = time.monotonic()
+        if self.ring_bytes <= 0 or now - self.last_error_dump < ERROR_DUMP_INTERVAL:
+            return None
+        self.last_error_dump = now
+        return self.dump("error", [portal_id])
+
+    def install_signal_handler(self) -> None:
+        """ Dump all rings on SIGUSR2. Has to be called from the main thread """
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.dump_in_thread())
+
+    def dump_in_thread(self) -> None:
+        """ Dump from a signal handler, the interrupted main thread may hold the lock """
+        t = threading.Thread(target=self.dump, name="lrp_capture_dump")
+        t.daemon = True
+        t.start()
+
+
+# Capture shared by all LRP workers of the process
+lrp_capture = LrpCapture()
@@ -1,55 +1,154 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import sys
-import socket
+import logging
 import selectors
+import asyncio
+import resource
+import heapq
+import itertools
+import threading
+import time
 from collections import OrderedDict
 from dataclasses import dataclass
 
 sys.path.insert(0, '..')
 from shared.aux.logger import Logger
 from shared.aux.msgQueue import MsgQueue
-from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgQueuePacket import MsgQueuePacket, RANK_EMERGENCY, RANK_NON_EMERGENCY
 from shared.aux.msgType import MsgType
+from shared.aux.socket_task import SocketTask
+from shared.aux.tokenBucket import TokenBucket
+from .lrp_capture import lrp_capture
+from .lrp_transport import open_listener, remove_stale_socket_file
+from .port_config import TRANSPORT_TCP, TRANSPORT_UNIX, TRANSPORT_INPROC, target_port_transport, target_port_address
 
 # Logger
 loggerWrapper = Logger(__file__ + ".log")
 logger = loggerWrapper.get_logger()
 
+# Offset of the stream rank of a TAA in the record data: TLV header (3) + stream id (8)
+TAA_RANK_OFFSET = 11
+# Type of the TLV holding several attributes of one record, see shared.rap.Attribute_list
+ATTRIBUTE_LIST_TYPE = 0x7F
+# Length of the LRP-Dummy record header: record number (1) + type (1) + length (2)
+RECORD_HEADER_LENGTH = 4
+# Bytes read from a portal connection per readiness event
+RECEIVE_CHUNK_SIZE = 65536
+# Maximum number of buffers passed to one sendmsg call
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+# Maximum number of connections accepted per readiness event of a listening socket
+ACCEPT_BATCH = 64
+
+
+def raise_open_file_limit() -> None:
+    """ Raise the soft limit of open files to the hard limit, every portal holds one socket """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            logger.warning("Could not raise open file limit %s to %s", soft, hard)
+
+
+class PortalIdAllocator:
+    """ Allocates portal IDs which are unique for the lifetime of the process. Socket file numbers are reused
+    after a close and can not identify a portal towards the RAP participants
+    """
+
+    def __init__(self):
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def allocate(self) -> str:
+        with self.lock:
+            return str(next(self.counter))
+
 
 @dataclass
-class LrpDummy:
+class LrpWorker:
     """
-    This LrpDummy implements the interface of real LRP but does not perform specified LRP signalling
-    It provides a listening socket to end stations which can connect to it via TCP
+    Transport of the LrpDummy. A worker serves its own listening sockets and the portal connections accepted on
+    them with one selector. It runs as a SocketTask and is fed by the lrp_dummy task with the requests
+    for its portals
     """
 
-    def __init__(self, queue_register: dict):
+    def __init__(self, queue_register: dict, name: str, portal_ids: PortalIdAllocator, portal_workers: dict,
+                 reuse_port: bool = False, ingress_rate: float = 0, ingress_burst: float = 0):
+        """
+        @param queue_register: Dict of all task queues by task name
+        @param name: name of the task running the worker
+        @param portal_ids: allocator of portal IDs shared by all workers
+        @param portal_workers: "portalId" : LrpWorker, shared by all workers
+        @param reuse_port: bind listening sockets with SO_REUSEPORT, so every worker can listen on the same port
+                           and the kernel distributes the connections among them
+        @param ingress_rate: records per second each portal may send, 0 for no limit. A portal exceeding it is
+                            not read until its token bucket is out of debt, the socket buffers push back on the peer
+        @param ingress_burst: records a portal may send at once, default one second worth of records
+        """
         self.queue_register = queue_register
-        self.name = "lrp_dummy"
+        self.name = name
+        self.portal_ids = portal_ids
+        self.portal_workers = portal_workers
+        self.reuse_port = reuse_port
+        self.ingress_rate = ingress_rate
+        self.ingress_burst = ingress_burst
+        self.msg_queue = None  # queue of the task running the worker, set when the task is created
         # State machine of the corresponding task
         # Includes a mapping from msgTypes to handler function to serve requests/indications from other tasks
         self.states = {
             MsgType.LRP_LOCAL_TARGET_PORT_REQ: self.local_target_port_request,
-            MsgType.LRP_NEIGHBOUR_TARGET_PORT_REQ: self.neighbour_target_port_request,
-            MsgType.LRP_ASSOCIATE_PORTAL_REQ: self.associate_portal,
             MsgType.LRP_WRITE_RECORD_REQ: self.write_record,
             MsgType.LRP_DELETE_RECORD_REQ: self.delete_record
         }
 
         self.socketParticipantMapping = {}  # "socketFileNo" : ParticipantId
         self.portalIdtoSocketMapping = {}  # "portalId" : socket
+        self.socketPortalIdMapping = {}  # socket : "portalId"
 
-        self.applicant_db = OrderedDict()  # "portalId": [record to send 1, ...]
+        # Records not yet handed to the socket. A newer write of a record number replaces the pending one
+        self.applicant_db = OrderedDict()  # "portalId": OrderedDict( recordNo : record to send )
+        self.partial_records = {}  # "portalId" : unsent rest of a partially sent record
+        self.receive_buffers = {}  # "portalId" : bytearray with the received bytes of a record split across reads
+        # Ranks of the received records of emergency streams, a withdrawal of such a record gets its rank
+        self.record_ranks = {}  # "portalId" : { recordNo : stream rank }
+
+        # Ingress rate limiting
+        self.ingress_buckets = {}  # "portalId" : TokenBucket
+        self.paused_portals = {}  # "portalId" : monotonic time at which reading is resumed
+        self.resume_timers = []  # heap of (resume time, "portalId")
 
         self.selector = selectors.DefaultSelector()
 
+        self.stats = {
+            "portals_accepted": 0,
+            "portals_closed": 0,
+            "records_received": 0,
+            "records_sent": 0,
+            "records_superseded": 0,
+            "bytes_received": 0,
+            "bytes_sent": 0,
+            "send_stalls": 0,
+            "ingress_throttled": 0,
+        }
+
     def get_peer_by_portalId(self, portalId):
         con = self.portalIdtoSocketMapping.get(portalId)
         if con is not None:
             return con.getpeername()
 
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["name"] = self.name
+        stats["portals_open"] = len(self.portalIdtoSocketMapping)
+        stats["portals_paused"] = len(self.paused_portals)
+        return stats
+
     def associate_portal(self, q_pckt: MsgQueuePacket) -> None:
         """ Associate Portal request for portal creation
         @param q_pckt: portalId, associationAllowed: Bool
@@ -65,20 +164,35 @@ class LrpDummy:
             "associationStatus": "connected",
             "NeighborRegistrarDatabaseOverflow": False
         }
-        self.queue_register["rap_participants"].send_msg(MsgQueuePacket(MsgType.LRP_PORTAL_STATUS_IND, msg), self.name)
+        # Portal control messages use the emergency rank, records of the portal must not overtake them
+        self.queue_register["rap_participants"].send_msg(
+            MsgQueuePacket(MsgType.LRP_PORTAL_STATUS_IND, msg, priority=RANK_EMERGENCY,
+                           order_key=q_pckt.message["portalId"]), self.name)
 
     def write_record(self, q_pckt: MsgQueuePacket) -> None:
         """ Serve a write request from LRP application layer
         @param q_pckt: portalId, recordNo, data
         """
         portal_id = q_pckt.message["portalId"]
+        if portal_id not in self.applicant_db:
+            logger.warning("Dropping record %s for closed portal %s", q_pckt.message["recordNo"], portal_id)
+            return
 
         data = bytearray([q_pckt.message["recordNo"]]) + q_pckt.message["data"]
-        self.applicant_db[portal_id].append(data)
+        if len(data) == 1:
+            data += bytearray(3)
 
-        # Activate write event selector for the right socket
-        con = self.portalIdtoSocketMapping[portal_id]
-        self.selector.modify(con, selectors.EVENT_READ | selectors.EVENT_WRITE, self.handle_connection)
+        pending = self.applicant_db[portal_id]
+        if q_pckt.message["recordNo"] in pending:
+            self.stats["records_superseded"] += 1
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Record %s superseded before transmission on portal %s", q_pckt.message["recordNo"],
+                             portal_id)
+        pending[q_pckt.message["recordNo"]] = data
+
+        # Activate write event selector for the right socket, records queued until it is writable are sent at once
+        if len(pending) == 1 and portal_id not in self.partial_records:
+            self.update_events(portal_id, self.portalIdtoSocketMapping[portal_id])
 
     def delete_record(self, q_pckt: MsgQueuePacket) -> None:
         """ delete a record on behalf of LRP application layer
@@ -98,14 +212,13 @@ class LrpDummy:
         appInfo = q_pckt.message["applicationInformation"]
         timeReset = q_pckt.message["cplCompleteListTimerReset"]
 
-        tcpPort = localTargetPortInfo["tcpPort"]
-        addrIPv4 = localTargetPortInfo["addrIPv4"]
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setblocking(False)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind((addrIPv4, int(tcpPort)))
-        sock.listen()
+        # The transport (tcp, unix or inproc) is selected per local target port, see port_config
+        try:
+            sock = open_listener(localTargetPortInfo, self.reuse_port)
+        except OSError as e:
+            logger.error("%s could not open local target port %s (%s): %s", self.name,
+                         target_port_address(localTargetPortInfo), target_port_transport(localTargetPortInfo), e)
+            return
 
         self.socketParticipantMapping[str(sock.fileno())] = participant_id
 
@@ -118,50 +231,112 @@ class LrpDummy:
         # todo open connection with peer at specified address, port
         pass
 
-    def accept(self, sock, mask):
-        new_connection, addr = sock.accept()
-        new_connection.setblocking(True)
-        portal_id = str(new_connection.fileno())
-
-        self.portalIdtoSocketMapping[portal_id] = new_connection
-        self.applicant_db[portal_id] = []
-
-        #  todo for real lrp implementation: delete this part. This has to be done in the read() then
-        msg = {
-            "portalId": portal_id,
-            "helloLrpdu": None,
-            "participantId": self.socketParticipantMapping[str(sock.fileno())]
-        }
-        self.queue_register["rap_participants"].send_msg(MsgQueuePacket(MsgType.LRP_FIRST_HELLO_IND, msg), self.name)
-
-        self.selector.register(new_connection, selectors.EVENT_READ, self.handle_connection)
+    def accept(self, sock, mask) -> int:
+        """ Accept the pending connections of a listening socket, each connection becomes a portal
+        @return: number of accepted connections
+        """
+        for accepted in range(ACCEPT_BATCH):
+            try:
+                new_connection, addr = sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return accepted
+            except OSError as e:
+                # e.g. out of file descriptors, the connection stays in the backlog
+                logger.error("Accepting connection failed: %s", e)
+                return accepted
+            new_connection.setblocking(False)
+            portal_id = self.portal_ids.allocate()
+
+            self.portalIdtoSocketMapping[portal_id] = new_connection
+            self.socketPortalIdMapping[new_connection] = portal_id
+            self.applicant_db[portal_id] = OrderedDict()
+            self.receive_buffers[portal_id] = bytearray()
+            self.record_ranks[portal_id] = {}
+            if self.ingress_rate > 0:
+                self.ingress_buckets[portal_id] = TokenBucket(self.ingress_rate, self.ingress_burst)
+            self.portal_workers[portal_id] = self
+            self.stats["portals_accepted"] += 1
+            lrp_capture.open(portal_id, addr)
+
+            #  todo for real lrp implementation: delete this part. This has to be done in the read() then
+            msg = {
+                "portalId": portal_id,
+                "helloLrpdu": None,
+                "participantId": self.socketParticipantMapping[str(sock.fileno())]
+            }
+            self.queue_register["rap_participants"].send_msg(
+                MsgQueuePacket(MsgType.LRP_FIRST_HELLO_IND, msg, priority=RANK_EMERGENCY, order_key=portal_id),
+                self.name)
+
+            self.selector.register(new_connection, selectors.EVENT_READ, self.handle_connection)
+        return ACCEPT_BATCH
 
     def write(self, con, mask):
         """ Writes record data to the peers.
             A declaration of an attribute is done by sending the whole record
             A withdrawal of an attribute is done by sending the record number with 3 succeeding bytes of zero
             (This makes recite of data easier since header (recordNo, type, length) is always 4 bytes)
+
+            All pending records of the portal are passed to the socket in one vectored send. The socket is
+            non-blocking, what the peer does not accept now stays pending until the socket is writable again,
+            so a stalled end station does not delay the other portals. Pending records can still be replaced
+            by newer writes, only the rest of a partially sent record has to go out unchanged first
         @param con: scoket object
         @param mask: socket event mask
         """
-        portal_id = str(con.fileno())
-
-        for index in range(len(self.applicant_db[portal_id])):
-            logger.info("Sending data to %s for portal id: %s", con.getpeername(), portal_id)
-            data = self.applicant_db[portal_id][index]
-
-            if len(data) == 1:
-                data += bytearray(3)
-
-            con.sendall(data)
-            self.applicant_db[portal_id].pop(index)
-
-        self.selector.modify(con, selectors.EVENT_READ, self.handle_connection)
+        portal_id = self.socketPortalIdMapping[con]
+        pending = self.applicant_db.get(portal_id)
+        partial = self.partial_records.get(portal_id)
+        if not pending and partial is None:
+            return
 
-    def read(self, connection, mask):
+        buffers = [] if partial is None else [partial]
+        for data in pending.values():
+            if len(buffers) == IOV_MAX:
+                break
+            buffers.append(data)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending %s records to %s for portal id: %s", len(buffers), con.getpeername(), portal_id)
+        try:
+            sent = con.sendmsg(buffers)
+        except (BlockingIOError, InterruptedError):
+            self.stats["send_stalls"] += 1
+            return
+        except ConnectionError as e:
+            self.close_portal(portal_id, con, e)
+            return
+        self.stats["bytes_sent"] += sent
+        capture = lrp_capture.rings.get(portal_id)
+
+        # Drop the records sent completely and keep the unsent rest of a partially sent record
+        if partial is not None:
+            if sent < len(partial):
+                self.partial_records[portal_id] = partial[sent:]
+                self.stats["send_stalls"] += 1
+                return
+            sent -= len(partial)
+            del self.partial_records[portal_id]
+            self.stats["records_sent"] += 1
+        while sent > 0:
+            record_number, data = pending.popitem(last=False)
+            if capture is not None:
+                capture.sent(data)
+            if sent < len(data):
+                self.partial_records[portal_id] = memoryview(data)[sent:]
+                self.stats["send_stalls"] += 1
+                break
+            sent -= len(data)
+            self.stats["records_sent"] += 1
+
+        if not pending and portal_id not in self.partial_records:
+            self.update_events(portal_id, con)
+
+    def read(self, connection, mask) -> int:
         """ This function handles read events of a selected socket
         @param connection: the socket object
         @param mask: mask containing the events
+        @return: number of records received
         """
         """ LRP-Dummy Protocol
             | 0             | 1     | 2   | 3   | 4    ...
@@ -174,33 +349,489 @@ class LrpDummy:
 
             A declaration of an attribute is done by sending the whole record
             A withdrawal of an attribute is done by sending the record number with 3 succeeding bytes of zero
+
+            Records are read in chunks and may arrive split across several reads, see receive_chunk
         """
-        header_data = connection.recv(4)
-        if header_data == b'':
+        portal_id = self.socketPortalIdMapping[connection]
+        try:
+            chunk = connection.recv(RECEIVE_CHUNK_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return 0
+        except ConnectionError as e:
+            self.close_portal(portal_id, connection, e)
+            return 0
+        if chunk == b'':
+            self.close_portal(portal_id, connection)
+            return 0
+
+        self.stats["bytes_received"] += len(chunk)
+        received = self.receive_chunk(portal_id, chunk, self.receive_buffers[portal_id])
+
+        bucket = self.ingress_buckets.get(portal_id)
+        if bucket is not None and received > 0:
+            delay = bucket.consume(received)
+            if delay > 0:
+                self.pause_portal(portal_id, connection, delay)
+        return received
+
+    def pause_portal(self, portal_id, connection, delay: float) -> None:
+        """ Stop reading from a portal which exceeded its ingress rate, see service_timers
+        @param portal_id: the portal
+        @param connection: the socket object of the portal
+        @param delay: seconds until reading is resumed
+        """
+        bucket = self.ingress_buckets[portal_id]
+        if bucket.throttled == 1:
+            logger.warning("Portal %s exceeds its ingress rate of %s records/s, reading is paused", portal_id,
+                           bucket.rate)
+        self.stats["ingress_throttled"] += 1
+        resume_time = time.monotonic() + delay
+        self.paused_portals[portal_id] = resume_time
+        heapq.heappush(self.resume_timers, (resume_time, portal_id))
+        self.update_events(portal_id, connection)
+
+    def service_timers(self):
+        """ Resume reading from the paused portals which are due. Called by the SocketTask on every iteration
+        @return: seconds until the next portal is due, None if no portal is paused
+        """
+        now = time.monotonic()
+        while self.resume_timers and self.resume_timers[0][0] <= now:
+            resume_time, portal_id = heapq.heappop(self.resume_timers)
+            if self.paused_portals.get(portal_id) != resume_time:
+                continue
+            del self.paused_portals[portal_id]
+            self.update_events(portal_id, self.portalIdtoSocketMapping[portal_id])
+        if self.resume_timers:
+            return max(0.0, self.resume_timers[0][0] - now)
+        return None
+
+    def update_events(self, portal_id, connection) -> None:
+        """ Register the events the selector waits for on a portal connection: reading unless the portal is
+        paused, writing while records are pending
+        @param portal_id: the portal
+        @param connection: the socket object of the portal
+        """
+        events = 0 if portal_id in self.paused_portals else selectors.EVENT_READ
+        if self.applicant_db.get(portal_id) or portal_id in self.partial_records:
+            events |= selectors.EVENT_WRITE
+
+        try:
+            registered = self.selector.get_key(connection).events
+        except KeyError:
+            registered = 0
+        if registered == events:
             return
+        if not events:
+            self.selector.unregister(connection)
+        elif not registered:
+            self.selector.register(connection, events, self.handle_connection)
+        else:
+            self.selector.modify(connection, events, self.handle_connection)
 
-        record_number = header_data[0]
-        attribute_type = header_data[1]
-        attribute_length = int.from_bytes(header_data[2:4], signed=False, byteorder='big')
-        logger.info("Received record %s from %s", record_number, connection.getpeername())
+    def receive_chunk(self, portal_id, chunk: bytes, carry: bytearray) -> int:
+        """ Indicate the records of a received chunk to the RAP participants without copying them.
 
-        if attribute_length > 0:
-            data = header_data[1:4] + connection.recv(attribute_length)
-            logger.info("data: %s", data)
+            Buffer ownership: the data of an indicated record is a memoryview into the chunk. A chunk is
+            immutable and never reused, it lives as long as one of its views, so a record stays valid until the
+            participant has decoded and dropped it. Only a record split across reads is copied, its bytes are
+            collected in the carry buffer of the portal until it is complete
 
+            All records completed by the chunk are indicated at once, see record_written
+        @param portal_id: portal the chunk was received on
+        @param chunk: received bytes
+        @param carry: beginning of a record split across reads, the unparsed rest of the chunk is appended
+        @return: number of records received
+        """
+        records = []
+        view = memoryview(chunk)
+        if carry:
+            # Complete the header first to learn the length of the split record
+            missing = RECORD_HEADER_LENGTH - len(carry)
+            if missing > 0:
+                carry += view[:missing]
+                view = view[missing:]
+            if len(carry) < RECORD_HEADER_LENGTH:
+                return 0
+            record_length = RECORD_HEADER_LENGTH + int.from_bytes(carry[2:4], signed=False, byteorder='big')
+            missing = record_length - len(carry)
+            carry += view[:missing]
+            view = view[missing:]
+            if len(carry) < record_length:
+                return 0
+            self.parse_records(portal_id, memoryview(bytes(carry)), records)
+            carry.clear()
+
+        consumed = self.parse_records(portal_id, view, records)
+        carry += view[consumed:]
+        if records:
+            capture = lrp_capture.rings.get(portal_id)
+            if capture is not None:
+                capture.received(records)
+            self.record_written(portal_id, records)
+        return len(records)
+
+    def parse_records(self, portal_id, view: memoryview, records: list) -> int:
+        """ Parse all complete records of received bytes
+        @param portal_id: portal the bytes were received on
+        @param view: view of received bytes starting at a record header, it must not be modified afterwards
+        @param records: list the parsed (record number, data) are appended to
+        @return: number of bytes consumed, the rest is the beginning of an incomplete record
+        """
+        offset = 0
+        view_length = len(view)
+        while view_length - offset >= RECORD_HEADER_LENGTH:
+            record_number = view[offset]
+            attribute_length = int.from_bytes(view[offset + 2:offset + 4], signed=False, byteorder='big')
+            record_end = offset + RECORD_HEADER_LENGTH + attribute_length
+            if record_end > view_length:
+                break
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received record %s on portal %s", record_number, portal_id)
+
+            if attribute_length > 0:
+                data = view[offset + 1:record_end]
+            else:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Portal %s withdrew attribute with number: %s", portal_id, record_number)
+                data = b''
+
+            records.append((record_number, data))
+            self.stats["records_received"] += 1
+            offset = record_end
+        return offset
+
+    def close_portal(self, portal_id, connection, error: Exception = None) -> None:
+        """ Clean up a portal connection which was closed by the peer
+        @param portal_id: portal of the connection
+        @param connection: the socket object
+        @param error: error the connection failed with, its capture is dumped then
+        """
+        if error is None:
+            logger.info("Portal %s closed by peer", portal_id)
+            lrp_capture.close(portal_id, "closed by peer")
         else:
-            logger.info("%s withdrew attribute with number: %s", connection.getpeername(), record_number)
-            data = b''
+            logger.warning("Portal %s failed: %s", portal_id, error)
+            lrp_capture.close(portal_id, str(error))
+            lrp_capture.dump_on_error(portal_id)
+        try:
+            self.selector.unregister(connection)
+        except KeyError:
+            # paused portal without pending records
+            pass
+        connection.close()
+        self.socketPortalIdMapping.pop(connection, None)
+        self.release_portal(portal_id)
+
+    def release_portal(self, portal_id) -> None:
+        """ Forget a closed portal and indicate its disconnection to the RAP participants
+        @param portal_id: the closed portal
+        """
+        self.stats["portals_closed"] += 1
+        self.portal_workers.pop(portal_id, None)
+        self.portalIdtoSocketMapping.pop(portal_id, None)
+        self.applicant_db.pop(portal_id, None)
+        self.partial_records.pop(portal_id, None)
+        self.receive_buffers.pop(portal_id, None)
+        self.record_ranks.pop(portal_id, None)
+        self.ingress_buckets.pop(portal_id, None)
+        self.paused_portals.pop(portal_id, None)
 
         msg = {
-            "portalId": str(connection.fileno()),
-            "recordNo": record_number,
-            "data": data
+            "portalId": portal_id,
+            "associationStatus": "disconnected",
+            "NeighborRegistrarDatabaseOverflow": False
         }
-        self.queue_register["rap_participants"].send_msg(MsgQueuePacket(MsgType.LRP_RECORD_WRITTEN_IND, msg), self.name)
-
-    def handle_connection(self, connection, mask):
+        # Indicated after all records of the portal, see RankedDeque
+        self.queue_register["rap_participants"].send_msg(
+            MsgQueuePacket(MsgType.LRP_PORTAL_STATUS_IND, msg, priority=RANK_EMERGENCY, order_key=portal_id),
+            self.name)
+
+    def record_written(self, portal_id, records: list):
+        """ Indicate received records to the RAP participants. Several records received at once are indicated
+        in one LRP_RECORDS_WRITTEN_IND, so e.g. an end station re-announcing its streams costs one queue hop.
+        The indication gets the rank of its most important record. Indications of a portal keep their order
+        @param portal_id: portal the records were received on
+        @param records: [(record number, attribute data), ...] in order of reception, data is empty for a withdrawal
+        """
+        if len(records) == 1:
+            record_number, data = records[0]
+            msg = {
+                "portalId": portal_id,
+                "recordNo": record_number,
+                "data": data
+            }
+            q_pckt = MsgQueuePacket(MsgType.LRP_RECORD_WRITTEN_IND, msg,
+                                    priority=self.record_rank(portal_id, record_number, data), order_key=portal_id)
+        else:
+            msg = {
+                "portalId": portal_id,
+                "records": records
+            }
+            q_pckt = MsgQueuePacket(MsgType.LRP_RECORDS_WRITTEN_IND, msg,
+                                    priority=min([self.record_rank(portal_id, record_number, data)
+                                                  for record_number, data in records]),
+                                    order_key=portal_id)
+        self.queue_register["rap_participants"].send_msg(q_pckt, self.name)
+
+    def record_rank(self, portal_id, record_number, data) -> int:
+        """ Return the stream rank of a received record. A withdrawal gets the rank of the record it withdraws
+        @param portal_id: portal the record was received on
+        @param record_number: number of the record
+        @param data: attribute data of the record, empty for a withdrawal
+        @return: stream rank
+        """
+        ranks = self.record_ranks[portal_id]
+        if len(data) == 0:
+            return ranks.pop(record_number, RANK_NON_EMERGENCY)
+        rank = self.data_rank(data)
+        if rank != RANK_NON_EMERGENCY:
+            ranks[record_number] = rank
+        else:
+            ranks.pop(record_number, None)
+        return rank
+
+    @staticmethod
+    def data_rank(data) -> int:
+        """ Peek at the stream rank of the attribute data of a record without decoding it.
+        Only TAAs carry a stream rank, a list of attributes gets the rank of its most important TAA,
+        all other records are treated as non-emergency
+        @param data: attribute data of the record
+        @return: stream rank
+        """
+        if data[0] == 0x01:
+            return data[TAA_RANK_OFFSET] if len(data) > TAA_RANK_OFFSET else RANK_NON_EMERGENCY
+        rank = RANK_NON_EMERGENCY
+        if data[0] == ATTRIBUTE_LIST_TYPE:
+            offset = RECORD_HEADER_LENGTH - 1
+            while offset + TAA_RANK_OFFSET < len(data):
+                if data[offset] == 0x01:
+                    rank = min(rank, data[offset + TAA_RANK_OFFSET])
+                offset += RECORD_HEADER_LENGTH - 1 + data[offset + 1] * 256 + data[offset + 2]
+        return rank
+
+    def handle_connection(self, connection, mask) -> int:
+        """ Serve the events of a portal connection
+        @return: work done, the number of received records plus one for a write
+        """
+        work = 0
         if mask & selectors.EVENT_WRITE:
             self.write(connection, mask)
-        if mask & selectors.EVENT_READ:
-            self.read(connection, mask)
+            work += 1
+        # The write may have closed the portal
+        if mask & selectors.EVENT_READ and connection.fileno() != -1:
+            work += self.read(connection, mask)
+        return work
+
+
+@dataclass
+class LrpDummy(LrpWorker):
+    """
+    This LrpDummy implements the interface of real LRP but does not perform specified LRP signalling
+    It provides a listener per local target port to end stations which can connect to it via TCP, a unix domain
+    socket or, if they run in the process of the CUC, an in-process channel (see lrp_transport)
+
+    The lrp_dummy task serves portals itself as the first worker. With more than one worker, additional
+    workers run as own tasks (lrp_worker_1, ...) with their own selector. Local target ports are spread
+    round robin over the workers. A tcp port can be opened on several workers with SO_REUSEPORT, then the kernel
+    distributes its new connections among them. Requests for a portal are forwarded to the worker owning it
+    """
+
+    def __init__(self, queue_register: dict, worker_count: int = 1, listeners_per_port: int = 1,
+                 ingress_rate: float = 0, ingress_burst: float = 0):
+        """
+        @param queue_register: Dict of all task queues by task name
+        @param worker_count: number of workers serving portal connections
+        @param listeners_per_port: number of workers listening on each local target port. Every listener costs
+                                   one socket per port, more than one only pays off for ports with many connections
+        @param ingress_rate: records per second each portal may send, 0 for no limit, see LrpWorker
+        @param ingress_burst: records a portal may send at once
+        """
+        self.listeners_per_port = max(1, min(listeners_per_port, worker_count))
+        super().__init__(queue_register, "lrp_dummy", PortalIdAllocator(), {},
+                         reuse_port=self.listeners_per_port > 1, ingress_rate=ingress_rate,
+                         ingress_burst=ingress_burst)
+        self.states.update({
+            MsgType.LRP_LOCAL_TARGET_PORT_REQ: self.route_local_target_port_request,
+            MsgType.LRP_NEIGHBOUR_TARGET_PORT_REQ: self.neighbour_target_port_request,
+            MsgType.LRP_ASSOCIATE_PORTAL_REQ: self.associate_portal,
+            MsgType.LRP_WRITE_RECORD_REQ: self.route_by_portal_id,
+            MsgType.LRP_DELETE_RECORD_REQ: self.route_by_portal_id,
+        })
+        raise_open_file_limit()
+
+        self.workers = [self]
+        for index in range(1, worker_count):
+            worker_task = SocketTask("lrp_worker_%s" % index)
+            worker = LrpWorker(queue_register, worker_task.name, self.portal_ids, self.portal_workers,
+                               reuse_port=self.listeners_per_port > 1, ingress_rate=ingress_rate,
+                               ingress_burst=ingress_burst)
+            worker.msg_queue = worker_task.msg_queue
+            self.queue_register[worker_task.name] = worker_task.msg_queue
+            worker_task.run_task_as_thread(worker)
+            self.workers.append(worker)
+
+    def get_peer_by_portalId(self, portalId):
+        worker = self.portal_workers.get(portalId)
+        if worker is None:
+            return None
+        return LrpWorker.get_peer_by_portalId(worker, portalId)
+
+    def get_worker_stats(self) -> list:
+        """ Return the transport statistics of every worker """
+        return [worker.get_stats() for worker in self.workers]
+
+    def route_local_target_port_request(self, q_pckt: MsgQueuePacket) -> None:
+        """ Open the local target port on listeners_per_port workers, starting at the worker of the participant
+        @param q_pckt: localTargetPortReq
+        """
+        first = q_pckt.message["participantId"] % len(self.workers)
+        # Only a tcp port can be shared by several listeners
+        listeners = self.listeners_per_port
+        if target_port_transport(q_pckt.message["localTargetPortInfo"]) != TRANSPORT_TCP:
+            listeners = 1
+        for index in range(first, first + listeners):
+            worker = self.workers[index % len(self.workers)]
+            if worker is self:
+                self.local_target_port_request(q_pckt)
+            else:
+                worker.msg_queue.send_msg(q_pckt, self.name)
+
+    def route_by_portal_id(self, q_pckt: MsgQueuePacket) -> None:
+        """ Serve a request for a portal or forward it to the worker owning the portal
+        @param q_pckt: message containing portalId
+        """
+        worker = self.portal_workers.get(q_pckt.message["portalId"], self)
+        if worker is not self:
+            worker.msg_queue.send_msg(q_pckt, self.name)
+        elif q_pckt.msg_type == MsgType.LRP_WRITE_RECORD_REQ:
+            self.write_record(q_pckt)
+        else:
+            self.delete_record(q_pckt)
+
+
+class AsyncLrpDummy(LrpDummy):
+    """
+    LrpDummy for the asyncio runtime. It provides the same interface and LRP-Dummy protocol as LrpDummy,
+    but serves the listening sockets and portal connections with asyncio streams instead of a selector
+    """
+
+    def __init__(self, queue_register: dict, ingress_rate: float = 0, ingress_burst: float = 0):
+        super().__init__(queue_register, ingress_rate=ingress_rate, ingress_burst=ingress_burst)
+        self.selector.close()
+        self.selector = None
+
+        self.servers = []
+
+    def get_peer_by_portalId(self, portalId):
+        writer = self.portalIdtoSocketMapping.get(portalId)
+        if writer is not None:
+            return writer.get_extra_info("peername")
+
+    def write_record(self, q_pckt: MsgQueuePacket) -> None:
+        """ Serve a write request from LRP application layer.
+            The record is handed to the transport of the portal, which sends it without blocking the event loop
+        @param q_pckt: portalId, recordNo, data
+        """
+        portal_id = q_pckt.message["portalId"]
+
+        writer = self.portalIdtoSocketMapping.get(portal_id)
+        if writer is None:
+            logger.warning("Dropping record %s for closed portal %s", q_pckt.message["recordNo"], portal_id)
+            return
+
+        data = bytearray([q_pckt.message["recordNo"]]) + q_pckt.message["data"]
+        if len(data) == 1:
+            data += bytearray(3)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending data to %s for portal id: %s", writer.get_extra_info("peername"), portal_id)
+        writer.write(data)
+        capture = lrp_capture.rings.get(portal_id)
+        if capture is not None:
+            capture.sent(data)
+
+    def local_target_port_request(self, q_pckt: MsgQueuePacket) -> None:
+        """ Create local portal
+        @param q_pckt: localTargetPortReq
+        """
+        participant_id = q_pckt.message["participantId"]
+        localTargetPortInfo = q_pckt.message["localTargetPortInfo"]
+
+        if target_port_transport(localTargetPortInfo) == TRANSPORT_INPROC:
+            # asyncio streams need a real socket, in-process channels are served by the threaded runtime only
+            logger.error("%s could not open local target port %s: in-process transport requires the threaded "
+                         "runtime", self.name, target_port_address(localTargetPortInfo))
+            return
+        asyncio.ensure_future(self.start_server(participant_id, localTargetPortInfo))
+
+    async def start_server(self, participant_id, localTargetPortInfo):
+        def client_connected(reader, writer):
+            return self.serve_portal(reader, writer, participant_id)
+
+        try:
+            if target_port_transport(localTargetPortInfo) == TRANSPORT_UNIX:
+                remove_stale_socket_file(localTargetPortInfo["unixPath"])
+                server = await asyncio.start_unix_server(client_connected, path=localTargetPortInfo["unixPath"])
+            else:
+                server = await asyncio.start_server(client_connected, host=localTargetPortInfo["addrIPv4"],
+                                                    port=int(localTargetPortInfo["tcpPort"]), reuse_address=True)
+        except OSError as e:
+            logger.error("%s could not open local target port %s: %s", self.name,
+                         target_port_address(localTargetPortInfo), e)
+            return
+        self.servers.append(server)
+
+    async def serve_portal(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, participant_id):
+        """ Serve a portal connection for its lifetime, see LrpDummy.read for the LRP-Dummy protocol
+        @param reader: stream reader of the connection
+        @param writer: stream writer of the connection
+        @param participant_id: participant of the local target port the connection was accepted on
+        """
+        portal_id = self.portal_ids.allocate()
+        self.portalIdtoSocketMapping[portal_id] = writer
+        self.portal_workers[portal_id] = self
+        self.record_ranks[portal_id] = {}
+        self.stats["portals_accepted"] += 1
+        lrp_capture.open(portal_id, writer.get_extra_info("peername"))
+
+        #  todo for real lrp implementation: delete this part. This has to be done in the read() then
+        msg = {
+            "portalId": portal_id,
+            "helloLrpdu": None,
+            "participantId": participant_id
+        }
+        self.queue_register["rap_participants"].send_msg(
+            MsgQueuePacket(MsgType.LRP_FIRST_HELLO_IND, msg, priority=RANK_EMERGENCY, order_key=portal_id),
+            self.name)
+
+        carry = bytearray()
+        bucket = TokenBucket(self.ingress_rate, self.ingress_burst) if self.ingress_rate > 0 else None
+        try:
+            while True:
+                chunk = await reader.read(RECEIVE_CHUNK_SIZE)
+                if chunk == b'':
+                    break
+                received = self.receive_chunk(portal_id, chunk, carry)
+                if bucket is not None and received > 0:
+                    delay = bucket.consume(received)
+                    if delay > 0:
+                        # Not reading lets the stream pause the transport, which pushes back on the peer
+                        if bucket.throttled == 1:
+                            logger.warning("Portal %s exceeds its ingress rate of %s records/s, reading is paused",
+                                           portal_id, bucket.rate)
+                        self.stats["ingress_throttled"] += 1
+                        await asyncio.sleep(delay)
+            logger.info("Portal %s closed by peer", portal_id)
+            lrp_capture.close(portal_id, "closed by peer")
+        except ConnectionError as e:
+            logger.warning("Portal %s failed: %s", portal_id, e)
+            lrp_capture.close(portal_id, str(e))
+            lrp_capture.dump_on_error(portal_id)
+        except asyncio.CancelledError:
+            # Runtime is shutting down; end the connection handler quietly instead of re-raising into the
+            # stream protocol callback which would report the cancellation as an error
+            pass
+        finally:
+            writer.close()
+            self.release_portal(portal_id)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import socket
+import stat
+import threading
+
+sys.path.insert(0, '..')
+from shared.aux.wakeupDescriptor import WakeupDescriptor
+from .port_config import TRANSPORT_TCP, TRANSPORT_UNIX, TRANSPORT_INPROC, target_port_transport
+
+# Length of the accept queue of a listening socket
+LISTEN_BACKLOG = 1024
+
+# In-process listeners by inprocName, shared by all LRP workers and co-located end stations of the process
+inproc_listeners = {}
+inproc_listeners_lock = threading.Lock()
+
+
+def open_listener(target_port_info: dict, reuse_port: bool = False):
+    """ Open a non-blocking listener for a local target port with the transport given in its configuration
+    @param target_port_info: local target port entry of the port configuration
+    @param reuse_port: bind a tcp listener with SO_REUSEPORT
+    @return: listening socket or InProcListener, both selectable and accept() returns (connection, peer address)
+    @raise OSError: if the listener can not be opened
+    """
+    transport = target_port_transport(target_port_info)
+    if transport == TRANSPORT_INPROC:
+        return InProcListener(target_port_info["inprocName"])
+
+    if transport == TRANSPORT_UNIX:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        if transport == TRANSPORT_UNIX:
+            remove_stale_socket_file(target_port_info["unixPath"])
+            sock.bind(target_port_info["unixPath"])
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((target_port_info["addrIPv4"], int(target_port_info["tcpPort"])))
+        sock.listen(LISTEN_BACKLOG)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def remove_stale_socket_file(path: str) -> None:
+    """ Remove the socket file a previous run left behind, binding a unix socket fails if the path exists.
+    Other files are kept, so the bind fails and reports the misconfiguration
+    """
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def connect(target_port_info: dict, source_port_info: dict = None):
+    """ Connect to a local target port of the CUC, used by end stations and test tools
+    @param target_port_info: local target port to connect to
+    @param source_port_info: neighbour target port the connection comes from. The CUC identifies listeners by
+                             the address of the peer, so the connection is bound to it if given
+    @return: connected blocking socket or InProcSocket
+    @raise ConnectionRefusedError: if the target port is not listening
+    """
+    transport = target_port_transport(target_port_info)
+    if transport == TRANSPORT_INPROC:
+        with inproc_listeners_lock:
+            listener = inproc_listeners.get(target_port_info["inprocName"])
+        if listener is None:
+            raise ConnectionRefusedError("no in-process listener %r" % target_port_info["inprocName"])
+        return listener.connect(None if source_port_info is None else source_port_info["inprocName"])
+
+    if transport == TRANSPORT_UNIX:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if source_port_info is not None and transport == TRANSPORT_UNIX:
+            remove_stale_socket_file(source_port_info["unixPath"])
+            sock.bind(source_port_info["unixPath"])
+        elif source_port_info is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((source_port_info["addrIPv4"], int(source_port_info["tcpPort"])))
+        if transport == TRANSPORT_TCP:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.connect((target_port_info["addrIPv4"], int(target_port_info["tcpPort"])))
+        else:
+            try:
+                sock.connect(target_port_info["unixPath"])
+            except FileNotFoundError:
+                raise ConnectionRefusedError("no unix listener at %r" % target_port_info["unixPath"])
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class InProcSocket:
+    """
+    One end of an in-process connection. It provides the part of the socket interface used by the LRP workers
+    and end stations, so a portal is served the same way as a tcp or unix connection.
+    Sent bytes are appended to the receive buffer of the other end, no data passes the kernel. The wakeup
+    descriptor is only signalled when the receive buffer turns from empty to non-empty, so a reader draining
+    its buffer costs no system call per record. The receive buffer is unbounded, a send never blocks
+    """
+
+    def __init__(self, name, peer_name):
+        """
+        @param name: address of this end, returned by getsockname
+        @param peer_name: address of the other end, returned by getpeername
+        """
+        self.name = name
+        self.peer_name = peer_name
+        self.peer = None
+        self.blocking = True
+        self.closed = False
+        self.peer_closed = False
+
+        self.receive_buffer = bytearray()
+        self.signalled = False
+        self.condition = threading.Condition()
+        self.wakeup = WakeupDescriptor()
+
+    @staticmethod
+    def pair(name, peer_name) -> tuple:
+        """ Create the two connected ends of an in-process connection
+        @return: (end with address name, end with address peer_name)
+        """
+        first = InProcSocket(name, peer_name)
+        second = InProcSocket(peer_name, name)
+        first.peer = second
+        second.peer = first
+        return first, second
+
+    def fileno(self) -> int:
+        return -1 if self.closed else self.wakeup.fileno()
+
+    def getpeername(self):
+        return self.peer_name
+
+    def getsockname(self):
+        return self.name
+
+    def setblocking(self, flag: bool) -> None:
+        self.blocking = flag
+
+    def deliver(self, data) -> None:
+        """ Append bytes sent by the other end to the receive buffer """
+        with self.condition:
+            if self.closed:
+                return
+            self.receive_buffer += data
+            self.wake()
+
+    def wake(self) -> None:
+        """ Signal readability once until the reader consumes it, called with the condition held """
+        if not self.signalled:
+            self.signalled = True
+            self.wakeup.signal()
+        self.condition.notify()
+
+    def sendmsg(self, buffers) -> int:
+        """ Send all buffers at once, there are no partial sends
+        @return: number of bytes sent
+        @raise BrokenPipeError: if one of the ends is closed
+        """
+        if self.closed or self.peer_closed:
+            raise BrokenPipeError("in-process connection %s closed" % self.name)
+        data = b''.join(buffers)
+        self.peer.deliver(data)
+        return len(data)
+
+    def send(self, data) -> int:
+        return self.sendmsg([data])
+
+    def sendall(self, data) -> None:
+        self.sendmsg([data])
+
+    def recv(self, bufsize: int) -> bytes:
+        """ Take up to bufsize received bytes
+        @return: received bytes, b'' if the other end closed the connection and everything was read
+        @raise BlockingIOError: if nothing was received and the socket is non-blocking
+        """
+        with self.condition:
+            while not self.receive_buffer and not self.peer_closed:
+                if self.closed:
+                    raise OSError("in-process connection %s closed" % self.name)
+                if not self.blocking:
+                    raise BlockingIOError()
+                self.condition.wait()
+
+            data = bytes(self.receive_buffer[:bufsize])
+            del self.receive_buffer[:bufsize]
+            # A closed peer keeps the descriptor readable, so the reader sees the end of the connection
+            if self.signalled and not self.receive_buffer and not self.peer_closed:
+                self.signalled = False
+                self.wakeup.clear()
+            return data
+
+    def shutdown_by_peer(self) -> None:
+        with self.condition:
+            self.peer_closed = True
+            if not self.closed:
+                self.wake()
+
+    def close(self) -> None:
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.receive_buffer = bytearray()
+            self.wakeup.close()
+            self.condition.notify_all()
+        if self.peer is not None:
+            self.peer.shutdown_by_peer()
+
+
+class InProcListener:
+    """
+    Listener of an in-process local target port. Co-located end stations connect to it by its inprocName,
+    see connect(). The listener is selectable like a listening socket and accept() hands out the server end of
+    the pending connections
+    """
+
+    def __init__(self, name: str):
+        """
+        @param name: inprocName of the local target port
+        @raise OSError: if another listener of the process uses the name
+        """
+        self.name = name
+        self.pending = []
+        self.signalled = False
+        self.lock = threading.Lock()
+        self.wakeup = WakeupDescriptor()
+        with inproc_listeners_lock:
+            if name in inproc_listeners:
+                self.wakeup.close()
+                raise OSError("in-process listener %r already exists" % name)
+            inproc_listeners[name] = self
+
+    def fileno(self) -> int:
+        return self.wakeup.fileno()
+
+    def setblocking(self, flag: bool) -> None:
+        pass
+
+    def connect(self, peer_name) -> InProcSocket:
+        """ Create a connection to the listener
+        @param peer_name: address of the connecting end, the accepted connection reports it as peer
+        @return: connecting end of the connection
+        """
+        server_end, client_end = InProcSocket.pair(self.name, peer_name)
+        with self.lock:
+            self.pending.append(server_end)
+            if not self.signalled:
+                self.signalled = True
+                self.wakeup.signal()
+        return client_end
+
+    def accept(self) -> tuple:
+        """ Take the oldest pending connection
+        @return: (connection, peer address)
+        @raise BlockingIOError: if no connection is pending
+        """
+        with self.lock:
+            if not self.pending:
+                raise BlockingIOError()
+            connection = self.pending.pop(0)
+            if not self.pending:
+                self.signalled = False
+                self.wakeup.clear()
+        return connection, connection.getpeername()
+
+    def close(self) -> None:
+        with inproc_listeners_lock:
+            if inproc_listeners.get(self.name) is self:
+                del inproc_listeners[self.name]
+        with self.lock:
+            for connection in self.pending:
+                connection.close()
+            self.pending = []
+            self.wakeup.close()
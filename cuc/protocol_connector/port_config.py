@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+# Static port configuration (Portal Discovery Mode is static), located next to this module
+DEFAULT_PORT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "localTargetPortInfo.json")
+
+# Transports of a target port, selected by its optional "transport" key
+TRANSPORT_TCP = "tcp"
+TRANSPORT_UNIX = "unix"  # unix domain stream socket at "unixPath"
+TRANSPORT_INPROC = "inproc"  # in-process channel named "inprocName", for end stations in the process of the CUC
+TRANSPORTS = (TRANSPORT_TCP, TRANSPORT_UNIX, TRANSPORT_INPROC)
+
+# Keys every target port entry has to provide
+REQUIRED_TARGET_PORT_KEYS = ("chassisId", "portId")
+# Keys a target port entry has to provide for its transport
+REQUIRED_TRANSPORT_KEYS = {
+    TRANSPORT_TCP: ("tcpPort", "addrIPv4"),
+    TRANSPORT_UNIX: ("unixPath",),
+    TRANSPORT_INPROC: ("inprocName",),
+}
+
+
+def target_port_transport(target_port: dict) -> str:
+    """ Return the transport of a target port, tcp if the entry does not select one """
+    return target_port.get("transport", TRANSPORT_TCP)
+
+
+def target_port_address(target_port: dict):
+    """ Return the address of a target port in the form the peer address of a connection from it is reported
+    @param target_port: target port entry
+    @return: (addrIPv4, tcpPort) for tcp, the path for unix and the name for inproc
+    """
+    transport = target_port_transport(target_port)
+    if transport == TRANSPORT_UNIX:
+        return target_port["unixPath"]
+    if transport == TRANSPORT_INPROC:
+        return target_port["inprocName"]
+    return target_port["addrIPv4"], int(target_port["tcpPort"])
+
+
+def load_port_config(path: str = DEFAULT_PORT_CONFIG_PATH) -> dict:
+    """ Read and validate the target port configuration. Loaded once at startup and shared by the
+    protocol connector and the RAP participants
+    @param path: path of the json file
+    @return: { "localTargetPorts": [targetPortInfo, ...], "neighbourTargetPorts": [targetPortInfo, ...] }
+    @raise ValueError: if the configuration is incomplete
+    """
+    with open(path) as f:
+        port_config = json.load(f)
+
+    for list_name in ("localTargetPorts", "neighbourTargetPorts"):
+        target_ports = port_config.get(list_name)
+        if not isinstance(target_ports, list):
+            raise ValueError("%s: %s missing or not a list" % (path, list_name))
+
+        for index, target_port in enumerate(target_ports):
+            transport = target_port_transport(target_port)
+            if transport not in TRANSPORTS:
+                raise ValueError("%s: %s[%s] has unknown transport %r" % (path, list_name, index, transport))
+            missing = [key for key in REQUIRED_TARGET_PORT_KEYS + REQUIRED_TRANSPORT_KEYS[transport]
+                       if key not in target_port]
+            if missing:
+                raise ValueError("%s: %s[%s] misses %s" % (path, list_name, index, ", ".join(missing)))
+            if transport != TRANSPORT_TCP:
+                continue
+            try:
+                tcp_port = int(target_port["tcpPort"])
+            except ValueError:
+                raise ValueError("%s: %s[%s] has invalid tcpPort %r" % (path, list_name, index,
+                                                                        target_port["tcpPort"]))
+            if not 0 < tcp_port < 65536:
+                raise ValueError("%s: %s[%s] has invalid tcpPort %r" % (path, list_name, index,
+                                                                        target_port["tcpPort"]))
+
+    return port_config
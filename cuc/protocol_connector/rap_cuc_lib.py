@@ -2,23 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import sys
-import os
 import json
 import copy
 from collections import OrderedDict
 from dataclasses import dataclass, field
 
-from .lrp_dummy_lib import LrpDummy
+from .lrp_dummy_lib import LrpDummy, AsyncLrpDummy
 from .rap_participant import RapParticipantSM
+from .rap_participant_pool import RapParticipantPoolSM
+from .port_config import load_port_config, target_port_address
 from stream_management.lib.stream_status_db import StreamState
 
 sys.path.insert(0, '..')
 from shared.aux.msgQueue import MsgQueue
+from shared.aux.flowControl import SendBacklog
 from shared.aux.pollableQueue import PollableQueue
-from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgQueuePacket import MsgQueuePacket, RANK_NON_EMERGENCY
 from shared.aux.msgType import MsgType
 from shared.aux.task import Task
 from shared.aux.socket_task import SocketTask
+from shared.aux.async_task import AsyncTask, RUNTIME_THREADED, RUNTIME_ASYNC
 from shared.aux.logger import Logger
 from shared.qcc.tsn_types import Talker
 from shared.qcc.tsn_types import Listener
@@ -31,6 +34,12 @@ from shared.qcc.tsn_types import StatusStream, StatusTalkerListener
 loggerWrapper = Logger(__file__ + ".log")
 logger = loggerWrapper.get_logger()
 
+# Maximum number of messages the sub tasks drain from their queue per wakeup
+SUBTASK_BATCH_SIZE = 16
+# Capacity of the rap_participants queue. The protocol connector and the rap participants send to each other,
+# so the queue is sized to absorb a burst of declarations without blocking the protocol connector
+RAP_PARTICIPANTS_QUEUE_SIZE = 4096
+
 @dataclass()
 class StreamRegister:
     stream_register: dict = field(default_factory=dict)
@@ -46,8 +55,8 @@ class StreamRegister:
             self.stream_register[stream_id] = {}
         if not self.stream_register[stream_id].get("listeners"):
             self.stream_register[stream_id]["listeners"] = []
-            if participant_id not in self.stream_register[stream_id].get("listeners"):
-                self.stream_register[stream_id]["listeners"].append(participant_id)
+        if participant_id not in self.stream_register[stream_id].get("listeners"):
+            self.stream_register[stream_id]["listeners"].append(participant_id)
 
     def deregister_talker(self, stream_id):
         self.stream_register[stream_id].pop("talker")
@@ -58,7 +67,7 @@ class StreamRegister:
 
     def get_participant_id_talker(self, stream_id):
         if self.stream_register.get(stream_id):
-            return self.stream_register.get(stream_id).get("talker")
+            return self.stream_register.get(stream_id).get("talker", -1)
         return -1  # Participant Id is always positive
 
     def get_participant_id_listeners(self, stream_id):
@@ -69,47 +78,94 @@ class StreamRegister:
 
     def get_talker_attribute(self, stream_id):
         attr = self.stream_register[stream_id]["talker_attribute"]
+        # Encoded once, the copies inherit the cached encoding and are only encoded again if they are changed
+        attr.serialize()
         return copy.deepcopy(attr)
 
+    def get_stream_rank(self, stream_id):
+        """ Return the rank of a stream as declared by its talker, non-emergency if the talker is unknown """
+        entry = self.stream_register.get(stream_id)
+        if entry and entry.get("talker_attribute") is not None:
+            return entry["talker_attribute"].stream_rank
+        return RANK_NON_EMERGENCY
+
 
 @dataclass
 class RapCucSM:
 
-    def __init__(self, queue_register: dict):
+    def __init__(self, queue_register: dict, runtime: str = RUNTIME_THREADED, participant_workers: int = 0,
+                 port_config: dict = None, lrp_workers: int = 1, lrp_listeners_per_port: int = 1,
+                 lrp_ingress_rate: float = 0, lrp_ingress_burst: float = 0, rap_record_size: int = 0):
+        """
+        @param queue_register: Dict of all task queues by task name
+        @param runtime: RUNTIME_THREADED runs the sub tasks as threads,
+                        RUNTIME_ASYNC runs them as coroutines on the running event loop
+        @param participant_workers: number of worker processes the RAP participants are sharded across,
+                                    0 runs all participants in the rap_participants task
+        @param port_config: target port configuration, loaded from the default location if None
+        @param lrp_workers: number of workers serving the portal connections (threaded runtime only)
+        @param lrp_listeners_per_port: number of workers listening on each local target port with SO_REUSEPORT
+        @param lrp_ingress_rate: records per second each portal may send, 0 for no limit
+        @param lrp_ingress_burst: records a portal may send at once
+        @param rap_record_size: bytes of attribute data per LRP record the participants pack attributes up to,
+                                0 for one attribute per record
+        """
         self.queue_register = queue_register
+        if port_config is None:
+            port_config = load_port_config()
 
         # State machine of the corresponding task
         # Includes a mapping from msgTypes to handler function to serve requests/indications from other tasks
         self.states = {
             MsgType.RPSI_REGISTER_IND: self.register_attribute,
             MsgType.RPSI_DEREGISTER_IND: self.deregister_attribute,
+            MsgType.RPSI_REGISTER_BATCH_IND: self.register_attribute_batch,
             MsgType.SM_STREAM_STATUS_IND: self.process_stream_status_update,
         }
 
         """ Create Sub-Tasks  """
-        self.lrp_task = SocketTask("lrp_dummy")
-        self.rap_participant_task = Task("rap_participants")
+        if runtime == RUNTIME_ASYNC:
+            self.lrp_task = AsyncTask("lrp_dummy", batch_size=SUBTASK_BATCH_SIZE)
+            self.rap_participant_task = AsyncTask("rap_participants", batch_size=SUBTASK_BATCH_SIZE)
+        else:
+            self.lrp_task = SocketTask("lrp_dummy")
+            self.rap_participant_task = Task("rap_participants", batch_size=SUBTASK_BATCH_SIZE,
+                                             queue_size=RAP_PARTICIPANTS_QUEUE_SIZE)
 
         """ Register Message Queues """
         self.queue_register[self.lrp_task.name] = self.lrp_task.msg_queue
         self.queue_register[self.rap_participant_task.name] = self.rap_participant_task.msg_queue
 
         """ Initialize Task Libraries"""
-        self.lrp_dummy_lib = LrpDummy(self.queue_register)
-        self.rap_participant_lib = RapParticipantSM(self.queue_register)
+        if runtime == RUNTIME_ASYNC:
+            self.lrp_dummy_lib = AsyncLrpDummy(self.queue_register, lrp_ingress_rate, lrp_ingress_burst)
+        else:
+            self.lrp_dummy_lib = LrpDummy(self.queue_register, lrp_workers, lrp_listeners_per_port,
+                                          lrp_ingress_rate, lrp_ingress_burst)
+        if participant_workers > 0:
+            self.rap_participant_lib = RapParticipantPoolSM(self.queue_register, port_config, participant_workers,
+                                                            rap_record_size)
+        else:
+            self.rap_participant_lib = RapParticipantSM(self.queue_register, port_config,
+                                                        record_size=rap_record_size)
 
         """ Run Subtasks """
-        self.lrp_task.run_task_as_thread(self.lrp_dummy_lib)
-        self.rap_participant_task.run_task_as_thread(self.rap_participant_lib)
-
-        localTargetPortInfo = open(
-            os.path.dirname(os.path.realpath('__file__')) + "/protocol_connector/localTargetPortInfo.json").read()
-        targetPortInfo = json.loads(localTargetPortInfo)
-
-        self.neighbourTargetPortList = targetPortInfo["neighbourTargetPorts"]
-        self.localTargetPortList = targetPortInfo["localTargetPorts"]
+        if runtime == RUNTIME_ASYNC:
+            self.lrp_task.run_task_as_coroutine(self.lrp_dummy_lib)
+            self.rap_participant_task.run_task_as_coroutine(self.rap_participant_lib)
+        else:
+            self.lrp_task.run_task_as_thread(self.lrp_dummy_lib)
+            self.rap_participant_task.run_task_as_thread(self.rap_participant_lib)
+
+        self.neighbourTargetPortList = port_config["neighbourTargetPorts"]
+        # Listeners are identified by the neighbour target port their connection comes from
+        self.neighbourMacByAddress = {target_port_address(targetPort): targetPort["chassisId"]
+                                      for targetPort in self.neighbourTargetPortList}
+        self.localTargetPortList = port_config["localTargetPorts"]
 
         self.stream_register = StreamRegister()
+        # Requests to the rap participants which did not fit into their queue, in order
+        self.participant_backlog = SendBacklog(self.queue_register["rap_participants"], "rap_cuc")
 
     def register_attribute(self, q_pckt: MsgQueuePacket) -> None:
         """
@@ -158,8 +214,22 @@ class RapCucSM:
             self.stream_register.register_listener(stream_id, participantId)
 
         if msg is not None and msg_type is not None:
-            self.queue_register["stream_management"].send_msg(msg=MsgQueuePacket(msg_type, msg),
-                                                         sender_name="rap_cuc")
+            self.queue_register["stream_management"].send_msg(
+                msg=MsgQueuePacket(msg_type, msg, priority=self.stream_register.get_stream_rank(stream_id)),
+                sender_name="rap_cuc")
+
+    def register_attribute_batch(self, q_pckt: MsgQueuePacket) -> None:
+        """
+        Process the registrations and deregistrations a RAP participant collected from several records, in order
+        @param q_pckt: participantId and indications: [(RPSI_REGISTER_IND or RPSI_DEREGISTER_IND, attribute), ...]
+        """
+        participantId = q_pckt.message["participantId"]
+        for msg_type, attribute in q_pckt.message["indications"]:
+            msg = {
+                "participantId": participantId,
+                "attribute": attribute
+            }
+            self.states[msg_type](MsgQueuePacket(msg_type, msg, priority=q_pckt.priority))
 
     def build_qcc_talker(self, attribute):
         data = {
@@ -211,15 +281,11 @@ class RapCucSM:
         return Talker(data)
 
     def get_listener_mac(self, participantId):
-        portalId = self.rap_participant_lib.get_partipipant_by_id(participantId).portalId
+        portalId = self.rap_participant_lib.get_portal_id(participantId)
         peer = self.lrp_dummy_lib.get_peer_by_portalId(portalId)
-        peer_addr = peer[0]
-        peer_port = str(peer[1])
-        mac = ""
-        for targetPort in self.neighbourTargetPortList:
-            if peer_port == targetPort["tcpPort"] and peer_addr == targetPort["addrIPv4"]:
-                mac = targetPort["chassisId"]  # We assume that the cassis Id is the mac address
-        return mac
+        # The peer is (address, port) for tcp, the bound path for unix and the name for in-process connections
+        # We assume that the cassis Id is the mac address
+        return self.neighbourMacByAddress.get(peer, "")
 
     def deregister_attribute(self, q_pckt: MsgQueuePacket) -> None:
         """
@@ -230,6 +296,7 @@ class RapCucSM:
         participantId = q_pckt.message["participantId"]
         msg = None
         msg_type = None
+        priority = self.stream_register.get_stream_rank(attribute.get_stream_id())
 
         # TAA
         if 0x01 == attribute.get_type():
@@ -253,7 +320,7 @@ class RapCucSM:
         #  on successfull or unsuccessful stream reservation.
 
         if msg is not None and msg_type is not None:
-            self.queue_register["stream_management"].send_msg(msg=MsgQueuePacket(msg_type, msg),
+            self.queue_register["stream_management"].send_msg(msg=MsgQueuePacket(msg_type, msg, priority=priority),
                                                              sender_name="rap_cuc")
 
     def process_stream_status_update(self, q_pckt: MsgQueuePacket) -> None:
@@ -290,6 +357,9 @@ class RapCucSM:
         self.withdraw_attribute(talker_participantId, LAA(stream_id=stream_id))
 
     def notify_listeners(self, listeners_configs: [StatusTalkerListener], stream_id, stream_status, talker_status):
+        # The talker may have withdrawn its attribute since the request of this result
+        if self.stream_register.get_participant_id_talker(stream_id) == -1:
+            return
         listeners_part_ids = self.stream_register.get_participant_id_listeners(stream_id)
         # listener_partId_mac = {x: self.get_listener_mac(x) for x in listeners_part_ids}
         listener_partId_mac = {self.get_listener_mac(x): x for x in listeners_part_ids}
@@ -297,7 +367,7 @@ class RapCucSM:
         # All successful listeners
         for listener_config in listeners_configs:
             taa = self.stream_register.get_talker_attribute(stream_id)
-            taa.accumulated_maximum_latency += listener_config.accumulatedLatency
+            taa.increase_accumulated_latency(listener_config.accumulatedLatency)
 
             mac = listener_config.interfaceConfiguration.interfaceList[0].interfaceId.macAddress
 
@@ -305,10 +375,16 @@ class RapCucSM:
                 taa.add_failure_information(mac=stream_status.failedInterfaces[0].macAddress,
                                             failure_code=stream_status.statusInfo["failure-code"])
 
-            partId = listener_partId_mac.pop(mac)
-            self.declare_attribute(participantId=partId, attribute=taa)
+            # The listener may have withdrawn its attribute since the request of this result
+            partId = listener_partId_mac.pop(mac, None)
+            if partId is not None:
+                self.declare_attribute(participantId=partId, attribute=taa)
+        # Listeners registered after the request of this result have no configuration yet and are answered
+        # by the result of their own request
+        if not stream_status.failedInterfaces:
+            return
         # failed listeners (listeners with no configuration must be failed)
-        for l_mac, l_partId in listener_partId_mac:
+        for l_mac, l_partId in listener_partId_mac.items():
             taa = self.stream_register.get_talker_attribute(stream_id)
             taa.add_failure_information(mac=stream_status.failedInterfaces[0].macAddress,
                                         failure_code=stream_status.statusInfo["failure-code"])
@@ -316,7 +392,7 @@ class RapCucSM:
 
     def notify_talker(self, stream_id, stream_status, talkers_config):
         laa = LAA(stream_id)
-        laa.listener_attach_status = stream_status.statusInfo["listener-status"]
+        laa.update_status(stream_status.statusInfo["listener-status"])
         # Attach failure information if needed
         if laa.listener_attach_status is Listener_status.FAILED \
                 or laa.listener_attach_status is Listener_status.PARTIAL_FAILED:
@@ -329,6 +405,7 @@ class RapCucSM:
         talker_participantId = self.stream_register.get_participant_id_talker(stream_id)
         if talker_participantId != -1:
             self.declare_attribute(participantId=talker_participantId, attribute=laa)
+        else:
             logger.error("Talker does not Exist!")
 
 
@@ -337,13 +414,31 @@ class RapCucSM:
             "participantId": participantId,
             "attribute": attribute
         }
-        self.queue_register["rap_participants"].send_msg(msg=MsgQueuePacket(MsgType.RPSI_DECLARE_REQ, msg),
-                                                         sender_name="rap_cuc")
+        self.send_to_participants(MsgQueuePacket(MsgType.RPSI_DECLARE_REQ, msg,
+                                                 priority=self.stream_register.get_stream_rank(
+                                                     attribute.get_stream_id())))
 
     def withdraw_attribute(self, participantId, attribute):
         msg = {
             "participantId": participantId,
             "attribute": attribute
         }
-        self.queue_register["rap_participants"].send_msg(msg=MsgQueuePacket(MsgType.RPSI_WITHDRAW_REQ, msg),
-                                                         sender_name="rap_cuc")
+        self.send_to_participants(MsgQueuePacket(MsgType.RPSI_WITHDRAW_REQ, msg,
+                                                 priority=self.stream_register.get_stream_rank(
+                                                     attribute.get_stream_id())))
+
+    def send_to_participants(self, q_pckt: MsgQueuePacket) -> None:
+        """
+        Send a request to the rap participants without blocking. The rap participants send their indications to
+        the protocol connector, so blocking on their full queue could deadlock both tasks. A request which does not
+        fit is held back, it and all later requests are sent in order by service_timers
+        @param q_pckt: request to the rap participants
+        """
+        self.participant_backlog.send(q_pckt)
+
+    def service_timers(self):
+        """
+        Send the requests held back by send_to_participants as long as the queue of the rap participants takes them
+        @return: seconds until the next attempt, None if no request is held back
+        """
+        return self.participant_backlog.flush()
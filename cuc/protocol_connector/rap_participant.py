@@ -1,9 +1,7 @@
 #!/usr/bin/env python3.8
 # -*- coding: utf-8 -*-
 import copy
-import os
 import sys
-import json
 from collections import OrderedDict
 from dataclasses import dataclass, field
 
@@ -11,16 +9,29 @@ sys.path.insert(0, '..')
 from shared.aux.logger import Logger
 from shared.aux.msgQueue import MsgQueue
 from shared.aux.pollableQueue import PollableQueue
-from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgQueuePacket import MsgQueuePacket, RANK_EMERGENCY, RANK_NON_EMERGENCY
 from shared.aux.msgType import MsgType
 from shared.rap.TAA import TAA
 from shared.rap.LAA import LAA
 from shared.rap.RACA import RACA
+from shared.rap.Attribute_list import Attribute_list
 
 # Logger
 loggerWrapper = Logger(__file__ + ".log")
 logger = loggerWrapper.get_logger()
 
+
+# Highest record number of a portal, LRP-Dummy sends it in one byte
+MAX_RECORD_NO = 255
+# Highest targetRecordSize, the attribute list of a record has a TLV length of two bytes
+MAX_RECORD_SIZE = 65535
+
+
+def attribute_rank(attribute) -> int:
+    """ Stream rank of an attribute used to prioritize its messages. Only TAAs carry a stream rank """
+    return getattr(attribute, "stream_rank", RANK_NON_EMERGENCY)
+
+
 @dataclass
 class RapParticipant:
     participantId: int
@@ -38,6 +49,7 @@ class RapParticipant:
 
     registrationList: OrderedDict = field(default_factory=OrderedDict) # "attributeId" : attributeTlv
     desMappingInfo: OrderedDict = field(default_factory=OrderedDict)  # "recordNo" : [attributeIds]
+    desRecordData: dict = field(default_factory=dict)  # "recordNo" : data of the last received record
 
     #localTargetPortOper
     neighborDiscoveryMode: int = 2  # 1 = lldp; 2 = static; 3 = Exploratory Hello
@@ -58,7 +70,15 @@ class RapParticipant:
 
     appId: str = "00-80-C2-01"
     attributeIdToRecordNoMapping: OrderedDict = field(default_factory=OrderedDict)   # attributeId : record number
-    recordNoCounter: int = 0  # the current highest record number
+    recordNoCounter: int = 0  # the lowest record number never used
+    freeRecordNumbers: list = field(default_factory=list)  # numbers of emptied records, reused first
+    openRecordNo: int = -1  # record new declarations are added to while it is below targetRecordSize
+    # Bytes of attribute data per record new declarations are packed up to, 0 for one attribute per record
+    targetRecordSize: int = 0
+
+    # (msgType, attribute) of the registrations and deregistrations collected while records are deserialized,
+    # None while no records are deserialized
+    pendingIndications: list = None
 
 # RAP Service Interface
     def declare_attribute(self, attribute_tlv):
@@ -89,7 +109,7 @@ class RapParticipant:
         elif type == 0x01:
             attribute: TAA = attribute_tlv
 
-            return attribute.get_stream_id() + "-" + str(attribute.data_frame_parameters_stlv.vlan_id)
+            return attribute.get_stream_id().attribute_id(attribute.data_frame_parameters_stlv.vlan_id)
 
         elif type == 0x02:
             attribute: LAA = attribute_tlv
@@ -140,7 +160,10 @@ class RapParticipant:
             "portalId" : self.portalId,
             "allowed": association_allowed,
         }
-        self.lrp_queue.send_msg(msg=MsgQueuePacket(MsgType.LRP_ASSOCIATE_PORTAL_REQ, msg), sender_name="rap_participant")
+        # Portal control messages use the emergency rank, records of the portal must not overtake them
+        self.lrp_queue.send_msg(msg=MsgQueuePacket(MsgType.LRP_ASSOCIATE_PORTAL_REQ, msg, priority=RANK_EMERGENCY,
+                                                   order_key=self.portalId),
+                                sender_name="rap_participant")
 
     def processPortalStatusInd(self, portalStatusInd):
         """ Process the portal status indication which indicates receit of receipt of a Hello LRPDU(hsConnected).
@@ -170,6 +193,7 @@ class RapParticipant:
         self.reset_registration_database()
         self.reset_portal_registrar_database()
         self.desMappingInfo.clear()
+        self.desRecordData.clear()
         pass
 
 #class AttributeDeclarationDatabase:
@@ -184,8 +208,9 @@ class RapParticipant:
         if attribute_id not in self.declarationList:
             return
 
-        self.declarationList.pop(attribute_id)
-        self.serializeAttribute(attribute_id)
+        attribute = self.declarationList.pop(attribute_id)
+        # The withdrawal gets the rank of the withdrawn attribute
+        self.serializeAttribute(attribute_id, attribute_rank(attribute))
 
 #class AttributeRegistrationDatabase:
 
@@ -194,11 +219,7 @@ class RapParticipant:
         self.registrationList[inAttributeId] = inAttribute
 
         # Indicate attribute registration to rap cuc
-        msg = {
-            "participantId": self.participantId,
-            "attribute": inAttribute
-        }
-        self.protocol_connector_queue.send_msg(msg=MsgQueuePacket(MsgType.RPSI_REGISTER_IND, msg), sender_name="rap_participant")
+        self.indicate_registration(MsgType.RPSI_REGISTER_IND, inAttribute)
 
     def deregister_attribute_db(self, inAttributeId):
         if inAttributeId not in self.registrationList:
@@ -207,13 +228,44 @@ class RapParticipant:
         attribute = self.registrationList.pop(inAttributeId)
 
         # Indicate attribute registration to rap cuc
+        self.indicate_registration(MsgType.RPSI_DEREGISTER_IND, attribute)
+
+    def indicate_registration(self, msg_type, attribute):
+        """ Indicate a registration or deregistration to the rap cuc, or collect it while records are deserialized
+        @param msg_type: RPSI_REGISTER_IND or RPSI_DEREGISTER_IND
+        @param attribute: the (de)registered attribute
+        """
+        if self.pendingIndications is not None:
+            self.pendingIndications.append((msg_type, attribute))
+            return
+
         msg = {
             "participantId": self.participantId,
             "attribute": attribute
         }
-        self.protocol_connector_queue.send_msg(msg=MsgQueuePacket(MsgType.RPSI_DEREGISTER_IND, msg),
+        self.protocol_connector_queue.send_msg(msg=MsgQueuePacket(msg_type, msg, priority=attribute_rank(attribute),
+                                                                  order_key=self.participantId),
                                                sender_name="rap_participant")
 
+    def flush_registration_indications(self):
+        """ Indicate the collected registrations and deregistrations to the rap cuc. Several are sent in one
+        RPSI_REGISTER_BATCH_IND, which keeps their order and gets the rank of the most important attribute.
+        Indications of a participant are never reordered by their rank, see RankedDeque
+        """
+        indications, self.pendingIndications = self.pendingIndications, None
+        if len(indications) == 1:
+            self.indicate_registration(*indications[0])
+        elif indications:
+            msg = {
+                "participantId": self.participantId,
+                "indications": indications
+            }
+            priority = min(attribute_rank(attribute) for _, attribute in indications)
+            self.protocol_connector_queue.send_msg(msg=MsgQueuePacket(MsgType.RPSI_REGISTER_BATCH_IND, msg,
+                                                                      priority=priority,
+                                                                      order_key=self.participantId),
+                                                   sender_name="rap_participant")
+
     def reset_registration_database(self):
 
         # if registration list is empty
@@ -226,105 +278,179 @@ class RapParticipant:
 #class AttributeSerializationDatabase:
 
     def allocate_record_numbers(self, attributeId):
-        # Generate as uuIDs, standard allows to serialize multiple attributes in one records but include only one
-
-        if not self.attributeIdToRecordNoMapping.get(attributeId):
-            self.attributeIdToRecordNoMapping[attributeId] = self.recordNoCounter
+        """ Choose the record of a newly declared attribute. With a targetRecordSize the attribute is added to the
+        record opened last as long as the record stays within the target size, otherwise it gets a record of its
+        own. Numbers of emptied records are reused, LRP-Dummy has MAX_RECORD_NO + 1 numbers per portal
+        @param attributeId: id of the attribute in the declarationList
+        @return: the record number, None if no record has room for the attribute
+        """
+        openRecord = self.serMappingInfo.get(self.openRecordNo)
+        if self.targetRecordSize > 0 and openRecord:
+            lengths = [len(self.declarationList[attrId].serialize()) for attrId in openRecord + [attributeId]]
+            if Attribute_list.encoded_length(lengths) <= self.targetRecordSize:
+                return self.openRecordNo
+
+        if self.freeRecordNumbers:
+            recordNo = self.freeRecordNumbers.pop()
+        elif self.recordNoCounter <= MAX_RECORD_NO:
+            recordNo = self.recordNoCounter
             self.recordNoCounter += 1
-
-        return self.attributeIdToRecordNoMapping[attributeId]
+        else:
+            # All numbers are in use, exceed the target size of the smallest record up to the TLV length
+            recordNo, length = self.smallest_record(attributeId)
+            if length > MAX_RECORD_SIZE:
+                logger.error("Participant %s is out of record numbers and space, %s is not declared",
+                             self.participantId, attributeId)
+                return None
+            logger.warning("Participant %s is out of record numbers, adding %s to record %s", self.participantId,
+                           attributeId, recordNo)
+        self.openRecordNo = recordNo
+        return recordNo
+
+    def smallest_record(self, attributeId):
+        """ Return the number of the record with the fewest bytes of attribute data and its length with the
+        attribute added
+        @param attributeId: id of the attribute in the declarationList
+        """
+        lengths = {recordNo: [len(self.declarationList[attrId].serialize()) for attrId in attributeIds]
+                   for recordNo, attributeIds in self.serMappingInfo.items()}
+        recordNo = min(lengths, key=lambda recNo: sum(lengths[recNo]))
+        length = len(self.declarationList[attributeId].serialize())
+        return recordNo, Attribute_list.encoded_length(lengths[recordNo] + [length])
 
     def updateSerMappingInfo(self, inAttributeId):
-        """
+        """ Add a new declaration to a record or remove a withdrawn attribute from its record
         @param inAttributeId:
-        @return: outRecordNumber and outAttributeIdList
+        @return: number of the record to write, None if the attribute is not serialized
         """
-        attributeToDeclare = self.declarationList.get(inAttributeId)
-        isInMappingInfo = False
-        recordNo = -1
-
-        for recNo, attributeIdList in self.serMappingInfo.items():
-            if inAttributeId in attributeIdList:
-                isInMappingInfo = True
-                recordNo = recNo
-                break
+        recordNo = self.attributeIdToRecordNoMapping.get(inAttributeId)
+        isDeclared = inAttributeId in self.declarationList
 
         # New Declaration
-        if (attributeToDeclare is not None) and isInMappingInfo is False:
+        if isDeclared and recordNo is None:
             recordNo = self.allocate_record_numbers(inAttributeId)
-            self.serMappingInfo[recordNo] = [inAttributeId]
+            if recordNo is None:
+                return None
+            self.serMappingInfo.setdefault(recordNo, []).append(inAttributeId)
+            self.attributeIdToRecordNoMapping[inAttributeId] = recordNo
         # withdrawal of declared attribute
-        elif (attributeToDeclare is None) and isInMappingInfo is True:
-            self.serMappingInfo[recordNo].remove(inAttributeId)
-
-        attributeIdList = self.serMappingInfo[recordNo]
-
-        if attributeIdList is []:
-            self.serMappingInfo.pop(recordNo)
-
-        return recordNo, attributeIdList
-
-    def serializeAttribute(self, inAttributeId):
-        """ Issues a LRP_WRITE_RECORD_REQ to trigger transport of the attribute via LRP
+        elif not isDeclared and recordNo is not None:
+            del self.attributeIdToRecordNoMapping[inAttributeId]
+            attributeIdList = self.serMappingInfo[recordNo]
+            attributeIdList.remove(inAttributeId)
+            if not attributeIdList:
+                self.serMappingInfo.pop(recordNo)
+                self.freeRecordNumbers.append(recordNo)
+
+        return recordNo
+
+    def serializeAttribute(self, inAttributeId, priority=RANK_NON_EMERGENCY):
+        """ Issues a LRP_WRITE_RECORD_REQ to trigger transport of the record holding the attribute via LRP
         @param inAttributeId:
+        @param priority: rank of the request at least, e.g. the rank of a withdrawn attribute
         @return:
         """
-        recordNo, attributeIdList = self.updateSerMappingInfo(inAttributeId=inAttributeId)
+        recordNo = self.updateSerMappingInfo(inAttributeId=inAttributeId)
+        if recordNo is None:
+            return
+        self.writeRecord(recordNo, priority)
+
+    def writeRecord(self, recordNo, priority=RANK_NON_EMERGENCY):
+        """ Issues a LRP_WRITE_RECORD_REQ with the attributes of a record, a withdrawal if the record is empty.
+        The record gets the rank of its most important attribute. The writes of a portal are never reordered by
+        their rank, LRP-Dummy only sends the last pending write of a record number
+        @param recordNo:
+        @param priority: rank of the request at least
+        @return:
+        """
+        attributes = [self.declarationList[attributeId] for attributeId in self.serMappingInfo.get(recordNo, [])]
         serializedData = bytearray(0)
-
-        if attributeIdList is not []:
-            if len(attributeIdList) == 1:
-                attribute = self.declarationList[attributeIdList[0]]
-                serializedData = attribute.serialize()
-            else:
-                pass
-                # The standard support multiple attributes in one record.
-                # We simplify implementation by assuming a single attribute per record.
+        if attributes:
+            serializedData = Attribute_list.pack([attribute.serialize() for attribute in attributes])
+            priority = min([priority] + [attribute_rank(attribute) for attribute in attributes])
 
         msg = {
             "portalId": self.portalId,
             "recordNo": recordNo,
             "data": serializedData
         }
-        self.lrp_queue.send_msg(msg=MsgQueuePacket(MsgType.LRP_WRITE_RECORD_REQ, msg),
-                                               sender_name="rap_participant")
+        self.lrp_queue.send_msg(msg=MsgQueuePacket(MsgType.LRP_WRITE_RECORD_REQ, msg, priority=priority,
+                                                   order_key=self.portalId),
+                                sender_name="rap_participant")
+
+    def reset_serialization_database(self):
+        """ Forget the records of the declared attributes, they are serialized into new records when declared again
+        @return:
+        """
+        self.serMappingInfo = OrderedDict()
+        self.attributeIdToRecordNoMapping = OrderedDict()
+        self.freeRecordNumbers = []
+        self.recordNoCounter = 0
+        self.openRecordNo = -1
 
     #AttributeDeserializationDatabase:
 
     def deserialize_attribute(self, inRecordWrittenInd):
-        """ Invoked after receiving a LRP_RECORD_WRITTEN_IND
-        @param inRecordWrittenInd: contains a dict with portalId, recordNo, data
+        """ Invoked after receiving a LRP_RECORD_WRITTEN_IND or LRP_RECORDS_WRITTEN_IND. The registrations and
+        deregistrations resulting from all records are indicated to the rap cuc at once
+        @param inRecordWrittenInd: contains a dict with portalId and either recordNo, data or
+                                   records: [(recordNo, data), ...]
         @return:
         """
-        portalId = inRecordWrittenInd["portalId"]
-        recordNo = inRecordWrittenInd["recordNo"]
-        data = inRecordWrittenInd["data"]
+        if inRecordWrittenInd["portalId"] != self.portalId:
+            return
+
+        records = inRecordWrittenInd.get("records")
+        if records is None:
+            records = [(inRecordWrittenInd["recordNo"], inRecordWrittenInd["data"])]
+
+        self.pendingIndications = []
+        try:
+            for recordNo, data in records:
+                self.deserialize_record(recordNo, data)
+        finally:
+            self.flush_registration_indications()
+
+    def deserialize_record(self, recordNo, data):
+        """ Register the attributes of a received record and deregister those it no longer contains.
+        A record received again unchanged, e.g. when an end station re-announces its streams, is not decoded and
+        registers nothing
+        @param recordNo: number of the record
+        @param data: attribute data of the record, an attribute TLV or an Attribute_list, empty for a withdrawal
+        """
+        if len(data) > 0 and self.desRecordData.get(recordNo) == data:
+            return
+
         attributeList = []
         attributeIds = []
         mapping = {}
 
-        if portalId != self.portalId:
-            return
-
         if len(data) > 0:
-            attribute = None
-            if data[0] == 0x00:  #RACA
-                attribute = RACA()
-                attribute.deserialize(data)
-                attributeList.append(attribute)
-            elif data[0] == 0x01:  #TAA
-                attribute = TAA()
-                attribute.deserialize(data)
-                attributeList.append(attribute)
-            elif data[0] == 0x02:  #LAA
-                attribute = LAA()
-                attribute.deserialize(data)
-                attributeList.append(attribute)
+            try:
+                for tlv in Attribute_list.unpack(data):
+                    if tlv[0] == 0x00:  #RACA
+                        attribute = RACA([])
+                    elif tlv[0] == 0x01:  #TAA
+                        attribute = TAA()
+                    elif tlv[0] == 0x02:  #LAA
+                        attribute = LAA()
+                    else:
+                        continue
+                    attribute.deserialize(tlv)
+                    attributeList.append(attribute)
+            except (ValueError, IndexError) as e:
+                # A malformed record is dropped like an unknown attribute, the record keeps its registrations
+                logger.warning("Participant %s dropped malformed record %s: %s", self.participantId, recordNo, e)
+                return
 
             for attribute in attributeList:
                 attributeId = self.generate_attribute_id(attribute)
                 attributeIds.append(attributeId)
                 mapping[attributeId] = attribute
+            # Copied, the data is a view into a receive buffer
+            self.desRecordData[recordNo] = bytes(data)
+        else:
+            self.desRecordData.pop(recordNo, None)
 
         # new record
         if not self.desMappingInfo.get(recordNo):
@@ -340,7 +466,6 @@ class RapParticipant:
                 if attributeId not in localList:
                     self.register_attribute_db(mapping[attributeId], attributeId)
                     self.desMappingInfo[recordNo].append(attributeId)
-                    residual.remove(attributeId)
                 # update attribute
                 elif attributeId in localList:
                     self.register_attribute_db(mapping[attributeId], attributeId)
@@ -367,9 +492,9 @@ class RapParticipant:
                 "portalId" : self.portalId,
                 "recordNo" : recordNo
             }
-            self.lrp_queue.send_msg(msg=MsgQueuePacket(MsgType.LRP_DELETE_RECORD_REQ, msg),
+            self.lrp_queue.send_msg(msg=MsgQueuePacket(MsgType.LRP_DELETE_RECORD_REQ, msg, order_key=self.portalId),
                                                    sender_name="rap_participant")
-        self.serMappingInfo = OrderedDict()
+        self.reset_serialization_database()
 
 
 @dataclass
@@ -380,7 +505,15 @@ class RapParticipantSM:
     and deregistered attributes
     """
 
-    def __init__(self, queue_register: dict):
+    def __init__(self, queue_register: dict, port_config: dict, shard: tuple = None, record_size: int = 0):
+        """
+        @param queue_register: Dict of all task queues by task name
+        @param port_config: target port configuration, see port_config.load_port_config
+        @param shard: (index, count) to only instantiate the participants with participantId % count == index,
+                      None instantiates a participant for every local target port
+        @param record_size: bytes of attribute data per record the participants pack attributes up to,
+                            0 for one attribute per record
+        """
         self.queue_register = queue_register
 
         # State machine of the corresponding task
@@ -390,38 +523,40 @@ class RapParticipantSM:
             MsgType.LRP_FIRST_HELLO_IND: self.process_first_hello,
             MsgType.LRP_PORTAL_STATUS_IND: self.process_portal_status,
             MsgType.LRP_RECORD_WRITTEN_IND: self.process_record_written,
+            MsgType.LRP_RECORDS_WRITTEN_IND: self.process_record_written,
             MsgType.RPSI_DECLARE_REQ: self.declare_attribute_request,
             MsgType.RPSI_WITHDRAW_REQ: self.withdraw_attribute_request,
         }
         self.rapParticipants = []
-
-        localTargetPortInfo = open(
-            os.path.dirname(os.path.realpath('__file__')) + "/protocol_connector/localTargetPortInfo.json").read()
-        localTargetPortInfo = json.loads(localTargetPortInfo)
+        self.participantsById = {}  # participantId : RapParticipant
+        self.participantsByPortalId = {}  # "portalId" : RapParticipant
 
         # Instantiate RAP Participants
-        for targetPortInfo in localTargetPortInfo["localTargetPorts"]:
-            self.rapParticipants.append(RapParticipant(participantId=(len(self.rapParticipants)),
+        for participantId, targetPortInfo in enumerate(port_config["localTargetPorts"]):
+            if shard is not None and participantId % shard[1] != shard[0]:
+                continue
+            self.rapParticipants.append(RapParticipant(participantId=participantId,
                                                        localTargetPortInfo=targetPortInfo,
                                                        lrp_queue=self.queue_register["lrp_dummy"],
-                                                       protocol_connector_queue=self.queue_register["protocol_connector"]))
+                                                       protocol_connector_queue=self.queue_register["protocol_connector"],
+                                                       targetRecordSize=min(record_size, MAX_RECORD_SIZE)))
+
+        for rapParticipant in self.rapParticipants:
+            self.participantsById[rapParticipant.participantId] = rapParticipant
 
         # Instantiate RAP Participants
         for rapParticipant in self.rapParticipants:
             rapParticipant.initiatePortalCreation()
 
     def get_partipipant_by_id(self, participantId):
+        return self.participantsById.get(participantId)
 
-        for rapp in self.rapParticipants:
-            if rapp.participantId == participantId:
-                return rapp
-        return None
+    def get_portal_id(self, participantId):
+        """ Return the portal Id of a participant, -1 if the participant has no portal yet """
+        return self.get_partipipant_by_id(participantId).portalId
 
     def get_partipipant_by_portalid(self, portalid):
-        for rapp in self.rapParticipants:
-            if rapp.portalId == portalid:
-                return rapp
-        return None
+        return self.participantsByPortalId.get(portalid)
 
     def process_first_hello(self, q_pckt: MsgQueuePacket) -> None:
         """ Process the first hello indication for portal creation
@@ -429,21 +564,35 @@ class RapParticipantSM:
         @param q_pckt:
         """
         rapp = self.get_partipipant_by_id(q_pckt.message["participantId"])
+        if rapp.portalId != -1:
+            # A new connection replaces the portal of the participant
+            logger.warning("Participant %s replaces portal %s by portal %s", rapp.participantId, rapp.portalId,
+                           q_pckt.message["portalId"])
+            self.participantsByPortalId.pop(rapp.portalId, None)
         rapp.processFirstHello(q_pckt.message)
+        self.participantsByPortalId[rapp.portalId] = rapp
 
     def process_portal_status(self, q_pckt: MsgQueuePacket) -> None:
         """ Process a portal status indication for portal creation
         @param q_pckt: portalId, associationStatus
         """
         rapp = self.get_partipipant_by_portalid(q_pckt.message["portalId"])
+        if rapp is None:
+            logger.error("Dropping %s of unknown portal %s", q_pckt.msg_type.name, q_pckt.message["portalId"])
+            return
         rapp.processPortalStatusInd(q_pckt.message)
+        if q_pckt.message["associationStatus"] == "disconnected":
+            self.participantsByPortalId.pop(q_pckt.message["portalId"], None)
 
     def process_record_written(self, q_pckt: MsgQueuePacket) -> None:
-        """ LRP task indicates that a new record was received. Process the record, store it as an attribute in RDB,
+        """ LRP task indicates that new records were received. Process the records, store them as attributes in RDB,
         and message the RAP-CUC
-        @param q_pckt: portalId, recordNo, data
+        @param q_pckt: portalId and recordNo, data or records: [(recordNo, data), ...]
         """
         rapp = self.get_partipipant_by_portalid(q_pckt.message["portalId"])
+        if rapp is None:
+            logger.error("Dropping %s of unknown portal %s", q_pckt.msg_type.name, q_pckt.message["portalId"])
+            return
         rapp.deserialize_attribute(q_pckt.message)
 
     def declare_attribute_request(self, q_pckt: MsgQueuePacket) -> None:
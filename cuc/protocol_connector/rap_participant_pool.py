@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import signal
+import threading
+import multiprocessing
+from dataclasses import dataclass
+
+from .rap_participant import RapParticipantSM
+
+sys.path.insert(0, '..')
+from shared.aux.logger import Logger
+from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgType import MsgType
+from shared.aux.profiler import handler_profiler
+from shared.aux.task import Task
+
+# Logger
+loggerWrapper = Logger(__file__ + ".log")
+logger = loggerWrapper.get_logger()
+
+
+class ProcessQueueProxy:
+    """ Stands in for the message queue of a task of the main process inside a worker process.
+    Messages are passed to the main process via an inter-process queue and delivered there to the task's queue
+    """
+
+    def __init__(self, task_name: str, out_queue):
+        self.task_name = task_name
+        self.out_queue = out_queue
+
+    def send_msg(self, msg, sender_name):
+        self.out_queue.put((self.task_name, msg, sender_name))
+
+
+def participant_worker(shard_index: int, shard_count: int, port_config: dict, in_queue, out_queue,
+                       profiler_config=None, record_size: int = 0) -> None:
+    """ Main function of a worker process. Owns the RAP participants of one shard including their declaration
+    and registration databases and serves the messages routed to them
+    @param shard_index: index of the shard served by this worker
+    @param shard_count: total number of shards
+    @param port_config: target port configuration loaded by the main process
+    @param in_queue: inter-process queue with messages for the participants of this shard
+    @param out_queue: inter-process queue for messages to the tasks of the main process
+    @param profiler_config: SIGUSR1 profiling configuration of the main process, see HandlerProfiler.install_signal_handler
+    @param record_size: target record size of the participants, see RapParticipant.targetRecordSize
+    """
+    # Ctrl+C reaches the whole process group, the workers are daemons stopped with the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if profiler_config is not None:
+        handler_profiler.install_signal_handler(*profiler_config)
+
+    queue_register = {
+        "lrp_dummy": ProcessQueueProxy("lrp_dummy", out_queue),
+        "protocol_connector": ProcessQueueProxy("protocol_connector", out_queue),
+    }
+    task = Task("rap_participants_%s" % shard_index)
+    lib = RapParticipantSM(queue_register, port_config, shard=(shard_index, shard_count), record_size=record_size)
+
+    while True:
+        q_pckt = in_queue.get()
+        if q_pckt is None:
+            break
+        task.statemachine(lib.states, q_pckt)
+
+
+@dataclass
+class RapParticipantPoolSM:
+    """
+    Runs the RAP participants in a pool of worker processes, so decoding and encoding of attributes
+    scales with the number of cores. Participants are partitioned by participantId, each worker process owns
+    the participants of its shard. This state machine runs in the rap_participants task and routes messages
+    to the worker owning the addressed participant. Messages of the workers are delivered to the task queues
+    of the main process by a forwarding thread.
+    """
+
+    def __init__(self, queue_register: dict, port_config: dict, worker_count: int, record_size: int = 0):
+        self.queue_register = queue_register
+        self.worker_count = worker_count
+
+        # State machine of the corresponding task
+        # Includes a mapping from msgTypes to handler function to serve requests/indications from other tasks
+        self.states = {
+            MsgType.LRP_FIRST_HELLO_IND: self.route_by_participant_id,
+            MsgType.LRP_PORTAL_STATUS_IND: self.route_by_portal_id,
+            MsgType.LRP_RECORD_WRITTEN_IND: self.route_by_portal_id,
+            MsgType.LRP_RECORDS_WRITTEN_IND: self.route_by_portal_id,
+            MsgType.RPSI_DECLARE_REQ: self.route_by_participant_id,
+            MsgType.RPSI_WITHDRAW_REQ: self.route_by_participant_id,
+        }
+
+        self.portalIdToParticipantId = {}  # "portalId" : participantId
+        self.participantIdToPortalId = {}  # participantId : "portalId"
+
+        # spawn instead of fork, since the main process already runs threads
+        context = multiprocessing.get_context("spawn")
+        self.out_queue = context.Queue()
+        self.worker_queues = []
+        self.workers = []
+        for shard_index in range(worker_count):
+            in_queue = context.Queue()
+            worker = context.Process(target=participant_worker, name="rap_participants_%s" % shard_index,
+                                     args=(shard_index, worker_count, port_config, in_queue, self.out_queue,
+                                           handler_profiler.signal_config, record_size), daemon=True)
+            worker.start()
+            handler_profiler.forward_signal_to(worker.pid)
+            self.worker_queues.append(in_queue)
+            self.workers.append(worker)
+
+        forwarder = threading.Thread(target=self.forward_worker_messages, daemon=True)
+        forwarder.start()
+
+    def forward_worker_messages(self) -> None:
+        """ Deliver messages of the worker processes to the task queues of the main process """
+        while True:
+            task_name, q_pckt, sender_name = self.out_queue.get()
+            self.queue_register[task_name].send_msg(q_pckt, sender_name)
+
+    def get_portal_id(self, participantId):
+        """ Return the portal Id of a participant, -1 if the participant has no portal yet """
+        return self.participantIdToPortalId.get(participantId, -1)
+
+    def route(self, participantId, q_pckt: MsgQueuePacket) -> None:
+        self.worker_queues[participantId % self.worker_count].put(q_pckt)
+
+    def route_by_participant_id(self, q_pckt: MsgQueuePacket) -> None:
+        """ Route a message carrying a participantId to the worker owning the participant
+        @param q_pckt: message containing participantId
+        """
+        participantId = q_pckt.message["participantId"]
+
+        if q_pckt.msg_type == MsgType.LRP_FIRST_HELLO_IND:
+            self.portalIdToParticipantId[q_pckt.message["portalId"]] = participantId
+            self.participantIdToPortalId[participantId] = q_pckt.message["portalId"]
+
+        self.route(participantId, q_pckt)
+
+    def route_by_portal_id(self, q_pckt: MsgQueuePacket) -> None:
+        """ Route a message carrying a portalId to the worker owning the participant of the portal
+        @param q_pckt: message containing portalId
+        """
+        participantId = self.portalIdToParticipantId.get(q_pckt.message["portalId"])
+        if participantId is None:
+            logger.error("No participant for portal %s", q_pckt.message["portalId"])
+            return
+
+        # Records are views into a receive buffer of the LrpDummy, a view can not be sent to a worker process
+        if q_pckt.msg_type == MsgType.LRP_RECORD_WRITTEN_IND:
+            q_pckt.message["data"] = bytes(q_pckt.message["data"])
+        elif q_pckt.msg_type == MsgType.LRP_RECORDS_WRITTEN_IND:
+            q_pckt.message["records"] = [(recordNo, bytes(data)) for recordNo, data in q_pckt.message["records"]]
+        elif q_pckt.msg_type == MsgType.LRP_PORTAL_STATUS_IND \
+                and q_pckt.message["associationStatus"] == "disconnected":
+            del self.portalIdToParticipantId[q_pckt.message["portalId"]]
+            if self.participantIdToPortalId.get(participantId) == q_pckt.message["portalId"]:
+                del self.participantIdToPortalId[participantId]
+        self.route(participantId, q_pckt)
@@ -30,20 +30,18 @@ class StreamRequirementDb:
                 return self.data[mac].pop(stream_id)
 
     def get_talker_by_stream_id(self, stream_id):
-        for mac, item in self.data.items():
-            for key in item.keys():
-                if key == stream_id:
-                    if self.data[mac][key].type == "talker":
-                        return self.data[mac][key].requirements
+        for item in self.data.values():
+            requirement = item.get(stream_id)
+            if requirement is not None and requirement.type == "talker":
+                return requirement.requirements
         return None
 
     def get_listeners_by_stream_id(self, stream_id):
         listeners = []
-        for mac, item in self.data.items():
-            for key in item.keys():
-                if key == stream_id:
-                    if self.data[mac][key].type == "listener":
-                        listeners.append(self.data[mac][key].requirements)
+        for item in self.data.values():
+            requirement = item.get(stream_id)
+            if requirement is not None and requirement.type == "listener":
+                listeners.append(requirement.requirements)
         return listeners
 
     def get_endstations_by_stream_id(self, stream_id):
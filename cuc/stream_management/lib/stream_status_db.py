@@ -66,6 +66,10 @@ class StreamStatusDb:
                 if curr_state == StreamState.NEW:
                     self.data[stream_id].state = StreamState.PENDING
                     return MsgType.CC_ADD_STREAM_REQ
+                else:
+                    # The stream was requested by its listeners before the talker joined
+                    self.data[stream_id].state = StreamState.PENDING
+                    return MsgType.CC_UPDATE_STREAM_REQ
 
             if event == "UDT_TALKER":
                 if curr_state != StreamState.NEW:
@@ -79,7 +83,7 @@ class StreamStatusDb:
                     return MsgType.CC_ADD_STREAM_REQ
                 elif curr_state == StreamState.PENDING:
                     return MsgType.CC_ADD_LISTENER_REQ
-                elif curr_state == StreamState.ERROR:
+                elif curr_state == StreamState.ERROR or curr_state == StreamState.DEPLOYED:
                     self.data[stream_id].state = StreamState.PENDING
                     return MsgType.CC_ADD_LISTENER_REQ
 
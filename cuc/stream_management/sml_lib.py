@@ -10,8 +10,9 @@ from .lib.stream_status_db import StreamStatusDb, StreamState
 
 sys.path.insert(0, '..')
 from shared.aux.logger import Logger
+from shared.aux.flowControl import SendBacklog, earliest_timeout
 from shared.aux.msgQueue import MsgQueue
-from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgQueuePacket import MsgQueuePacket, RANK_NON_EMERGENCY
 from shared.aux.msgType import MsgType
 
 # Logger
@@ -33,6 +34,11 @@ class StreamManagementSM:
 
         self.srdb = StreamRequirementDb()
         self.ssdb = StreamStatusDb()
+        # The cnc connector and the protocol connector send to the stream management, so it sends to them without
+        # blocking, see SendBacklog. The protocol connector blocks on a full stream management queue, which slows
+        # down the rap participants without closing a cycle of blocked tasks
+        self.cnc_backlog = SendBacklog(self.queue_register["cnc_connector"], "sml")
+        self.pc_backlog = SendBacklog(self.queue_register["protocol_connector"], "sml")
 
         # State machine of the corresponding task
         # Includes a mapping from msgTypes to handler function to serve requests/indications from other tasks
@@ -44,12 +50,25 @@ class StreamManagementSM:
             MsgType.CC_RESERVATION_RESULT_IND: self.process_reservation_result,
         }
 
+    def service_timers(self):
+        """ Send the messages held back because the queue of the cnc connector or protocol connector was full
+        @return: seconds until the next attempt, None if no message is held back
+        """
+        return earliest_timeout([self.cnc_backlog.flush(), self.pc_backlog.flush()])
+
+    def stream_rank(self, stream_id) -> int:
+        """ Return the rank of a stream from its talker requirements, non-emergency if the talker is unknown """
+        talker = self.srdb.get_talker_by_stream_id(stream_id)
+        if talker is not None and talker.streamRank is not None:
+            return talker.streamRank
+        return RANK_NON_EMERGENCY
 
     def register_talker_requirements(self, q_pckt: MsgQueuePacket) -> None:
         """ Register a talkers requirements for stream life cycle management
         @param q_pckt: stream_id, mac, talker
         """
         stream_id = q_pckt.message["stream_id"]
+        priority = q_pckt.priority
         mac = q_pckt.message["mac"]
         requirement = q_pckt.message["talker"]
 
@@ -64,14 +83,14 @@ class StreamManagementSM:
                 "talker_req": self.srdb.get_talker_by_stream_id(stream_id),
                 "listener_reqs": self.srdb.get_listeners_by_stream_id(stream_id)
             }
-            self.queue_register["cnc_connector"].send_msg(msg=MsgQueuePacket(msg_type, msg),
-                                                              sender_name="sml")
+            self.cnc_backlog.send(MsgQueuePacket(msg_type, msg, priority=priority))
 
     def register_listener_requirements(self, q_pckt: MsgQueuePacket) -> None:
         """ Register a talkers requirements for stream life cycle management
         @param q_pckt: stream_id, mac, listener
         """
         stream_id = q_pckt.message["stream_id"]
+        priority = q_pckt.priority
         mac = q_pckt.message["mac"]
         requirement = q_pckt.message["listener"]
         msg = None
@@ -94,14 +113,14 @@ class StreamManagementSM:
                         "listener_req": requirement
                     }
 
-            self.queue_register["cnc_connector"].send_msg(msg=MsgQueuePacket(msg_type, msg),
-                                                          sender_name="sml")
+            self.cnc_backlog.send(MsgQueuePacket(msg_type, msg, priority=priority))
 
     def deregister_talker_requirements(self, q_pckt: MsgQueuePacket) -> None:
         """ Deregister a talkers requirements for stream life cycle management
         @param q_pckt: talker MAC and Stream ID
         """
         stream_id = q_pckt.message["stream_id"]
+        priority = q_pckt.priority
         mac = q_pckt.message["mac"]
 
         self.srdb.remove_requirement(mac, stream_id)
@@ -117,14 +136,14 @@ class StreamManagementSM:
             msg = {
                 "stream_id": stream_id,
             }
-            self.queue_register["cnc_connector"].send_msg(msg=MsgQueuePacket(msg_type, msg),
-                                                          sender_name="sml")
+            self.cnc_backlog.send(MsgQueuePacket(msg_type, msg, priority=priority))
 
     def deregister_listener_requirements(self, q_pckt: MsgQueuePacket) -> None:
         """ Deegister a talkers requirements for stream life cycle management
         @param q_pckt: listener MAC and stream ID
         """
         stream_id = q_pckt.message["stream_id"]
+        priority = q_pckt.priority
         mac = q_pckt.message["mac"]
         msg_type = None
         msg = None
@@ -153,14 +172,14 @@ class StreamManagementSM:
             msg = {
                 "stream_id": stream_id,
             }
-        self.queue_register["cnc_connector"].send_msg(msg=MsgQueuePacket(msg_type, msg),
-                                                      sender_name="sml")
+        self.cnc_backlog.send(MsgQueuePacket(msg_type, msg, priority=priority))
 
     def process_reservation_result(self, q_pckt: MsgQueuePacket) -> None:
         """ Process the result of a reservation procedure
         @param q_pckt: stream_id, talker_conf: StatusTalkerListener, listeners_conf: [StatusTalkerListener, ...], stream_status: StatusStream
         """
         stream_id = q_pckt.message["stream_id"]
+        priority = self.stream_rank(stream_id)
         talkers_status = q_pckt.message["talker_conf"]
         listeners_status = q_pckt.message["listeners_conf"]
         stream_status = q_pckt.message["stream_status"]
@@ -174,5 +193,4 @@ class StreamManagementSM:
 
         q_pckt.message["stream_state"] = self.ssdb.data.get(stream_id).state
         msg = q_pckt.message
-        self.queue_register["protocol_connector"].send_msg(msg=MsgQueuePacket(msg_type, msg),
-                                                      sender_name="sml")
+        self.pc_backlog.send(MsgQueuePacket(msg_type, msg, priority=priority))
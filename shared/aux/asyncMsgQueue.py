@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import asyncio
+import sys
+from time import perf_counter
+
+sys.path.insert(0, '..')
+from shared.aux.rankQueue import RankedDeque
+
+class AsyncMsgQueue(asyncio.Queue):
+    """ Message Queue for passing messages between tasks running as coroutines on one event loop
+        send_msg keeps the synchronous interface of MsgQueue, so the handlers of a state machine can be used
+        unchanged. Messages sent from threads outside of the event loop (e.g. the webhook server) are handed
+        over to the loop thread-safely.
+    """
+    def __init__(self, task_name: str, logger):
+        super().__init__()
+        self.task_name = task_name
+        self.name = task_name + "_queue"
+        self.logger = logger
+
+        try:
+            self._owner_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._owner_loop = None
+
+        self.sent_count = 0
+        self.peak_occupancy = 0
+
+    def _init(self, maxsize):
+        # Packets of emergency streams overtake other packets
+        self._queue = RankedDeque()
+
+    def _in_owner_loop(self):
+        try:
+            return asyncio.get_running_loop() is self._owner_loop
+        except RuntimeError:
+            return False
+
+    async def get_msg(self, blocking=True):
+        """ Get a message from the queue
+        @param blocking: not used in this queue type. Included for compatibility of interface
+        @return: return message queue item
+        """
+        self.logger.debug("%s: %s takes from queue and waits", self.name, self.task_name)
+        if self._owner_loop is None:
+            self._owner_loop = asyncio.get_running_loop()
+
+        msg = await self.get()
+        self.logger.debug("%s: %s got item from queue", self.name, self.task_name)
+
+        return msg
+
+    async def get_batch(self, max_items: int, max_wait=None) -> list:
+        """ Get up to max_items messages from the queue
+        @param max_items: maximum number of messages to return
+        @param max_wait: seconds to wait for the first message, None waits until a message arrives
+        @return: list of messages in queue order, empty if max_wait expired
+        """
+        if self._owner_loop is None:
+            self._owner_loop = asyncio.get_running_loop()
+
+        try:
+            batch = [await asyncio.wait_for(self.get(), max_wait)]
+        except asyncio.TimeoutError:
+            return []
+
+        while len(batch) < max_items and not self.empty():
+            batch.append(self.get_nowait())
+
+        self.logger.debug("%s: %s got %s items from queue", self.name, self.task_name, len(batch))
+        return batch
+
+    def _enqueue(self, msg):
+        self.put_nowait(msg)
+        self.sent_count += 1
+        self.peak_occupancy = max(self.peak_occupancy, self.qsize())
+
+    def send_msg(self, msg, sender_name, block=True):
+        """ Add a new message in the queue
+        @param msg: message to send
+        @param sender_name: name of the sending task
+        @param block: not used in this queue type, the queue is unbounded. Included for compatibility of interface
+        @return: True
+        """
+        self.logger.debug("%s: %s adds item to queue: %s", self.name, sender_name, msg.message)
+        msg.sender = sender_name
+        msg.enqueue_time = perf_counter()
+        if self._owner_loop is None or self._in_owner_loop():
+            self._enqueue(msg)
+        else:
+            self._owner_loop.call_soon_threadsafe(self._enqueue, msg)
+        self.logger.debug("%s: %s added item to queue", self.name, sender_name)
+        return True
+
+    def try_send(self, msg, sender_name) -> bool:
+        """ Send a message without blocking. Never overflows since the queue is unbounded """
+        return self.send_msg(msg, sender_name, block=False)
+
+    def is_congested(self) -> bool:
+        return False
+
+    def get_stats(self) -> dict:
+        """ Return the occupancy counters of the queue """
+        return {
+            "name": self.name,
+            "occupancy": self.qsize(),
+            "capacity": 0,
+            "peak_occupancy": self.peak_occupancy,
+            "sent": self.sent_count,
+        }
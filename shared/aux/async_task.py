@@ -0,0 +1,54 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import sys
+import asyncio
+from dataclasses import dataclass
+
+sys.path.insert(0, '..')
+from shared.aux.logger import Logger
+from shared.aux.task import Task
+from shared.aux.asyncMsgQueue import AsyncMsgQueue
+
+# Logger
+loggerWrapper = Logger(__file__ + ".log")
+logger = loggerWrapper.get_logger()
+
+# Runtimes the CUC tasks can be run with
+RUNTIME_THREADED = "threaded"
+RUNTIME_ASYNC = "async"
+
+
+@dataclass
+class AsyncTask(Task):
+    """ Task which services messages from other tasks as a coroutine on an asyncio event loop.
+    It uses the same state machines as the threaded Task, the handler functions are called from the loop.
+    """
+
+    def __init__(self, name="", batch_size=1, batch_wait=None, queue_size=0):
+        """
+        @param queue_size: not used, the queues of the asyncio runtime are unbounded since handlers
+                           can not block the event loop on a full queue
+        """
+        self.name = name
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.msg_queue = AsyncMsgQueue(name, logger)
+
+    async def run(self, lib) -> None:
+        """ Main coroutine of the task, which waits on messages from a queue and processes according to a state machine
+        @param lib: implementation of task, contains states
+        """
+        while not Task.terminate_event.is_set():
+            batch = await self.msg_queue.get_batch(self.batch_size, self.batch_wait)
+            for q_pckt in batch:
+                self.statemachine(lib.states, q_pckt)
+
+    def run_task_as_coroutine(self, lib_instance) -> asyncio.Task:
+        """
+        This methods runs the task on the running event loop. The state machine is defined by the lib_instance
+        @param lib_instance: lib instance of the task containing message handlers
+        @return:
+        """
+        logger.info("Starting %s task.. ", self.name)
+        return asyncio.ensure_future(self.run(lib_instance))
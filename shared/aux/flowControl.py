@@ -0,0 +1,193 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import sys
+from collections import deque
+from time import perf_counter
+
+sys.path.insert(0, '..')
+
+# Default capacity of the message queues between tasks
+DEFAULT_QUEUE_CAPACITY = 256
+# Seconds until a task tries again to send the messages held back in a SendBacklog
+BACKLOG_RETRY_INTERVAL = 0.01
+
+
+class FlowControl:
+    """ Flow control for message queues derived from queue.Queue
+
+        - Capacity: maxsize of the queue, 0 for an unbounded queue
+        - Watermarks: the queue is marked congested when it fills up to the high watermark
+          and clears the congestion when it drains down to the low watermark
+        - Credits: a producer may have at most producer_credits messages in the queue at a time,
+          so a single fast producer can not fill the queue on its own
+        - try_send: non-blocking send which reports an overflow instead of stalling the sender
+
+        The queue must call init_flow_control in its constructor and enqueue via enqueue_msg.
+    """
+
+    def init_flow_control(self, high_watermark=None, low_watermark=None, producer_credits=None):
+        """
+        @param high_watermark: occupancy at which the queue is congested, default 3/4 of the capacity
+        @param low_watermark: occupancy at which the congestion is cleared, default 1/4 of the capacity
+        @param producer_credits: maximum number of queued messages per producer, None for no limit
+        """
+        if high_watermark is None and self.maxsize > 0:
+            high_watermark = max(1, (self.maxsize * 3) // 4)
+        if low_watermark is None and high_watermark is not None:
+            low_watermark = high_watermark // 3
+
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.producer_credits = producer_credits
+
+        self.congested = False
+        self.outstanding = {}  # sender_name : number of queued messages
+        self.sent_count = 0
+        self.received_count = 0
+        self.overflow_count = 0
+        self.congestion_count = 0
+        self.peak_occupancy = 0
+
+    def _has_room(self, sender_name) -> bool:
+        if 0 < self.maxsize <= self._qsize():
+            return False
+        if self.producer_credits is not None and self.outstanding.get(sender_name, 0) >= self.producer_credits:
+            return False
+        return True
+
+    def enqueue_msg(self, msg, sender_name, block=True) -> bool:
+        """ Add a message to the queue, respecting capacity and credits of the sender
+        @param msg: message to send
+        @param sender_name: name of the sending task
+        @param block: wait for room in the queue, otherwise report an overflow
+        @return: True if the message was queued
+        """
+        with self.not_full:
+            while not self._has_room(sender_name):
+                if not block:
+                    self.overflow_count += 1
+                    return False
+                self.not_full.wait()
+
+            msg.sender = sender_name
+            msg.enqueue_time = perf_counter()
+            self._put(msg)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+            self.outstanding[sender_name] = self.outstanding.get(sender_name, 0) + 1
+            self.sent_count += 1
+            occupancy = self._qsize()
+            self.peak_occupancy = max(self.peak_occupancy, occupancy)
+            if not self.congested and self.high_watermark is not None and occupancy >= self.high_watermark:
+                self.congested = True
+                self.congestion_count += 1
+                self.logger.warning("%s: congested at %s queued messages", self.name, occupancy)
+        return True
+
+    def _get(self):
+        """ Take an item and release the credit of its producer. Called with the queue mutex held """
+        msg = super()._get()
+
+        sender_name = getattr(msg, "sender", None)
+        if sender_name in self.outstanding:
+            self.outstanding[sender_name] -= 1
+        self.received_count += 1
+
+        if self.congested and self._qsize() <= self.low_watermark:
+            self.congested = False
+            self.logger.info("%s: congestion cleared", self.name)
+
+        if self.producer_credits is not None:
+            # Waiting producers may wait for their own credit, not for space in the queue
+            self.not_full.notify_all()
+        return msg
+
+    def try_send(self, msg, sender_name) -> bool:
+        """ Send a message without blocking
+        @param msg: message to send
+        @param sender_name: name of the sending task
+        @return: True if the message was queued, False on overflow (queue full or sender out of credits)
+        """
+        if self.send_msg(msg, sender_name, block=False):
+            return True
+        self.logger.warning("%s: overflow, message of %s not queued", self.name, sender_name)
+        return False
+
+    def is_congested(self) -> bool:
+        return self.congested
+
+    def get_stats(self) -> dict:
+        """ Return the occupancy and flow control counters of the queue """
+        with self.mutex:
+            return {
+                "name": self.name,
+                "occupancy": self._qsize(),
+                "capacity": self.maxsize,
+                "peak_occupancy": self.peak_occupancy,
+                "high_watermark": self.high_watermark,
+                "low_watermark": self.low_watermark,
+                "congested": self.congested,
+                "congestion_count": self.congestion_count,
+                "sent": self.sent_count,
+                "received": self.received_count,
+                "overflows": self.overflow_count,
+                "outstanding": dict(self.outstanding),
+            }
+
+
+class SendBacklog:
+    """ Non-blocking sending from one task to the queue of another task.
+    Tasks which send to each other must not block on a full queue, otherwise both wait for the other to drain its
+    queue. A message which does not fit is held back, it and all later messages are sent in order by flush, which
+    the sending task calls from its service_timers method
+    """
+
+    def __init__(self, queue, sender_name):
+        """
+        @param queue: queue of the receiving task
+        @param sender_name: name of the sending task
+        """
+        self.queue = queue
+        self.sender_name = sender_name
+        self.pending = deque()
+        self.overflows = 0  # number of times a message was held back while the backlog was empty
+
+    def __len__(self):
+        return len(self.pending)
+
+    def send(self, msg) -> None:
+        """ Send a message, or hold it back if the queue is full or messages are held back already
+        @param msg: message to send
+        """
+        if not self.pending and self.queue.try_send(msg, sender_name=self.sender_name):
+            return
+        if not self.pending:
+            self.overflows += 1
+        self.pending.append(msg)
+
+    def flush(self):
+        """ Send the held back messages as long as the queue takes them
+        @return: seconds until the next attempt, None if no message is held back
+        """
+        while self.pending:
+            if not self.queue.send_msg(self.pending[0], sender_name=self.sender_name, block=False):
+                return BACKLOG_RETRY_INTERVAL
+            self.pending.popleft()
+        return None
+
+    def get_stats(self) -> dict:
+        """ Return the number of held back messages and overflows """
+        return {
+            "queue": self.queue.name,
+            "sender": self.sender_name,
+            "pending": len(self.pending),
+            "overflows": self.overflows,
+        }
+
+
+def earliest_timeout(timeouts):
+    """ Return the shortest of the given timeouts of service_timers, None if all are None """
+    timeouts = [timeout for timeout in timeouts if timeout is not None]
+    return min(timeouts) if timeouts else None
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import sys
+
+sys.path.insert(0, '..')
+
+
+class LogHistogram:
+    """ Histogram with fixed log2 scaled buckets over microseconds.
+        Bucket i counts durations d with 2^(i-1) <= d < 2^i microseconds, bucket 0 counts durations below 1 us.
+        The last bucket collects everything above 2^(BUCKET_COUNT-2) us (~18 minutes).
+    """
+    BUCKET_COUNT = 32
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * LogHistogram.BUCKET_COUNT
+
+    def record(self, seconds: float) -> None:
+        index = int(seconds * 1000000).bit_length()
+        if index >= LogHistogram.BUCKET_COUNT:
+            index = LogHistogram.BUCKET_COUNT - 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @staticmethod
+    def bucket_upper_bound(index: int) -> float:
+        """ Upper bound of a bucket in seconds """
+        return (1 << index) / 1000000
+
+    def percentile(self, percent: float) -> float:
+        """ Return the upper bound of the bucket containing the given percentile in seconds """
+        if self.count == 0:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(LogHistogram.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": list(self.buckets),
+        }
+
+
+class LatencyRecorder:
+    """ Collects queueing delay (enqueue until dispatch) and handler execution time
+        per task and message type
+    """
+
+    def __init__(self):
+        # (task_name, msg_type) : (queue wait LogHistogram, handler time LogHistogram). Both histograms of a key
+        # are published at once, snapshot may run concurrently in another thread
+        self.stats = {}
+
+    def record(self, task_name: str, msg_type, queue_wait, handler_time: float) -> None:
+        """
+        @param task_name: name of the task which handled the message
+        @param msg_type: type of the message
+        @param queue_wait: seconds the message waited in the queue, None if unknown
+        @param handler_time: seconds the handler took
+        """
+        key = (task_name, msg_type)
+        histograms = self.stats.get(key)
+        if histograms is None:
+            histograms = self.stats.setdefault(key, (LogHistogram(), LogHistogram()))
+        histograms[1].record(handler_time)
+        if queue_wait is not None:
+            histograms[0].record(queue_wait)
+
+    def snapshot(self) -> dict:
+        """ Return the statistics as dict { task_name: { msg_type name: { "queue_wait": ..., "handler": ... } } } """
+        stats = {}
+        for (task_name, msg_type), (queue_wait, handler_time) in list(self.stats.items()):
+            name = getattr(msg_type, "name", str(msg_type))
+            stats.setdefault(task_name, {})[name] = {
+                "queue_wait": queue_wait.snapshot(),
+                "handler": handler_time.snapshot(),
+            }
+        return stats
+
+    def dump(self, logger) -> None:
+        """ Log a summary line per task and message type """
+        for task_name, types in self.snapshot().items():
+            for msg_type, stats in types.items():
+                wait = stats["queue_wait"]
+                handler = stats["handler"]
+                logger.info("%s %s: n=%s wait p50=%.6fs p99=%.6fs max=%.6fs handler p50=%.6fs p99=%.6fs max=%.6fs",
+                            task_name, msg_type, handler["count"], wait["p50"], wait["p99"], wait["max"],
+                            handler["p50"], handler["p99"], handler["max"])
+
+
+# Recorder shared by all tasks of the process
+latency_recorder = LatencyRecorder()
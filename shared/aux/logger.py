@@ -1,21 +1,196 @@
-import logging 
+
+import os
+import copy
+import enum
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import deque
+
+# Root of all CUC loggers. Every module logs to the child logger "cuc.<subsystem>"
+ROOT_LOGGER_NAME = "cuc"
+
+FILE_FORMAT = '%(asctime)s %(filename)s[line:%(lineno)d] %(levelname)s %(message)s'
+FILE_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S'
+CONSOLE_FORMAT = '%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s - %(message)s'
+
+# Environment variables to configure logging without code changes
+#   CUC_LOG_LEVEL=INFO                          level of all subsystems
+#   CUC_LOG_LEVELS=lrp_dummy_lib=DEBUG,task=WARNING  level per subsystem
+#   CUC_LOG_SAMPLING=msgQueue=100               only pass every n-th record below WARNING of a subsystem
+#   CUC_LOG_DIR=/tmp/cuc                        directory of the log files instead of next to their modules
+ENV_LOG_LEVEL = "CUC_LOG_LEVEL"
+ENV_LOG_LEVELS = "CUC_LOG_LEVELS"
+ENV_LOG_SAMPLING = "CUC_LOG_SAMPLING"
+ENV_LOG_DIR = "CUC_LOG_DIR"
+
+
+def _parse_setting(value: str) -> dict:
+    settings = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, setting = item.split("=", 1)
+            settings[name.strip()] = setting.strip()
+    return settings
+
+
+class SamplingFilter(logging.Filter):
+    """ Passes only every n-th record below WARNING, records of WARNING and above always pass """
+
+    def __init__(self, every_n: int):
+        super().__init__()
+        self.every_n = every_n
+        self.counter = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        self.counter += 1
+        return (self.counter - 1) % self.every_n == 0
+
+
+# Arguments passed to the writer thread as they are, they can not change after logging
+IMMUTABLE_ARG_TYPES = (str, bytes, int, float, complex, type(None), enum.Enum, frozenset, range)
+# Arguments passed to the writer thread as a shallow copy
+COPIED_ARG_TYPES = (list, dict, set, bytearray, deque)
+# Returned by _frozen_arg for an argument which has to be formatted in the calling thread
+_NOT_FROZEN = object()
+
+
+def _frozen_arg(arg):
+    """ Return an argument which does not change after logging: the argument itself if it is immutable, a copy if
+    it is a builtin container, _NOT_FROZEN for other objects """
+    if isinstance(arg, IMMUTABLE_ARG_TYPES):
+        return arg
+    if isinstance(arg, tuple):
+        items = tuple(_frozen_arg(item) for item in arg)
+        return _NOT_FROZEN if any(item is _NOT_FROZEN for item in items) else items
+    if isinstance(arg, COPIED_ARG_TYPES):
+        return copy.copy(arg)
+    return _NOT_FROZEN
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """ Hands records to the background writer, which merges the arguments into the message and formats the line.
+    Arguments may be mutated after logging, so builtin containers are copied. The message of a record with other
+    objects as arguments is merged in the calling thread
+    """
+
+    def prepare(self, record):
+        args = _frozen_arg(record.args) if isinstance(record.msg, str) else _NOT_FROZEN
+        if args is _NOT_FROZEN:
+            record.msg = record.getMessage()
+            record.args = None
+        else:
+            record.args = args
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _RoutingHandler(logging.Handler):
+    """ Runs in the background writer thread and writes each record to the log file of its subsystem
+    and to the console. Log files are opened when the first record of a subsystem arrives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log_files = {}  # logger name : file name
+        self.file_handlers = {}  # logger name : FileHandler
+        self.file_formatter = logging.Formatter(FILE_FORMAT, FILE_DATE_FORMAT)
+        self.console = logging.StreamHandler()
+        self.console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    def emit(self, record):
+        handler = self.file_handlers.get(record.name)
+        if handler is None:
+            log_file = self.log_files.get(record.name)
+            if log_file is not None:
+                handler = logging.FileHandler(log_file, mode='w')
+                handler.setFormatter(self.file_formatter)
+                self.file_handlers[record.name] = handler
+        if handler is not None:
+            handler.handle(record)
+        self.console.handle(record)
+
+    def flush(self):
+        for handler in list(self.file_handlers.values()):
+            handler.flush()
+        self.console.flush()
+
+
+class _LogPipeline:
+    """ Process wide logging pipeline: loggers -> queue -> background writer thread -> files/console """
+    lock = threading.Lock()
+    router = None
+    listener = None
+
+    @classmethod
+    def setup(cls):
+        with cls.lock:
+            if cls.listener is not None:
+                return
+
+            log_queue = queue.SimpleQueue()
+            cls.router = _RoutingHandler()
+            cls.listener = logging.handlers.QueueListener(log_queue, cls.router)
+            cls.listener.start()
+            atexit.register(cls.listener.stop)
+
+            root = logging.getLogger(ROOT_LOGGER_NAME)
+            root.addHandler(_LazyQueueHandler(log_queue))
+            root.setLevel(os.environ.get(ENV_LOG_LEVEL, "INFO").upper())
+            root.propagate = False
+
 
 class Logger:
     def __init__(self, module_name):
-        logging.basicConfig(
-                filename= module_name, 
-                level=logging.INFO,
-                format='%(asctime)s %(filename)s[line:%(lineno)d] %(levelname)s %(message)s',
-                datefmt='%a, %d %b %Y %H:%M:%S',
-                filemode='w')
-
-        ch = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s - %(message)s')
-        ch.setFormatter(formatter)
-
-        self.logger = logging.getLogger(module_name)
-        self.logger.addHandler(ch)
-        
+        """
+        @param module_name: name of the log file of the module, usually __file__ + ".log". The file is created in
+                            CUC_LOG_DIR if set. The subsystem name is derived from it, e.g. "lrp_dummy_lib" for
+                            lrp_dummy_lib.py.log
+        """
+        _LogPipeline.setup()
+
+        self.subsystem = Logger.subsystem_name(module_name)
+        self.logger = logging.getLogger(ROOT_LOGGER_NAME + "." + self.subsystem)
+        log_dir = os.environ.get(ENV_LOG_DIR)
+        log_file = os.path.join(log_dir, os.path.basename(module_name)) if log_dir else module_name
+        _LogPipeline.router.log_files[self.logger.name] = log_file
+
+        level = _parse_setting(os.environ.get(ENV_LOG_LEVELS, "")).get(self.subsystem)
+        if level is not None:
+            self.logger.setLevel(level.upper())
+
+        sampling = _parse_setting(os.environ.get(ENV_LOG_SAMPLING, "")).get(self.subsystem)
+        if sampling is not None:
+            self.logger.addFilter(SamplingFilter(int(sampling)))
+
+    @staticmethod
+    def subsystem_name(module_name: str) -> str:
+        name = os.path.basename(module_name)
+        for suffix in (".log", ".py"):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+        return name
+
+    @staticmethod
+    def set_level(subsystem: str, level) -> None:
+        """ Change the level of a subsystem at runtime, "" changes the level of all subsystems """
+        name = ROOT_LOGGER_NAME + "." + subsystem if subsystem else ROOT_LOGGER_NAME
+        logging.getLogger(name).setLevel(level)
+
+    @staticmethod
+    def set_sampling(subsystem: str, every_n: int) -> None:
+        """ Only pass every n-th record below WARNING of a subsystem, 1 disables sampling """
+        logger = logging.getLogger(ROOT_LOGGER_NAME + "." + subsystem)
+        for log_filter in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+            logger.removeFilter(log_filter)
+        if every_n > 1:
+            logger.addFilter(SamplingFilter(every_n))
 
     def get_logger(self):
         return self.logger
@@ -3,24 +3,39 @@
 
 import queue
 import sys
+from time import monotonic as time
 
 sys.path.insert(0, '..')
+from shared.aux.flowControl import FlowControl, DEFAULT_QUEUE_CAPACITY
+from shared.aux.rankQueue import RankedDeque
 
-class MsgQueue(queue.Queue):
+class MsgQueue(FlowControl, queue.Queue):
     """ Message Queue for asynchronously passing messages between tasks"""
-    def __init__(self, task_name: str, logger):
-        super().__init__(maxsize=15)
+    def __init__(self, task_name: str, logger, maxsize=DEFAULT_QUEUE_CAPACITY, high_watermark=None,
+                 low_watermark=None, producer_credits=None):
+        """
+        @param task_name: name of the task owning the queue
+        @param logger: logger of the owning module
+        @param maxsize: capacity of the queue, 0 for an unbounded queue
+        @param high_watermark, low_watermark, producer_credits: flow control settings, see FlowControl
+        """
+        super().__init__(maxsize=maxsize)
         self.task_name = task_name
         self.name = task_name + "_queue"
         self.logger = logger
+        self.init_flow_control(high_watermark, low_watermark, producer_credits)
+
+    def _init(self, maxsize):
+        # Packets of emergency streams overtake other packets
+        self.queue = RankedDeque()
 
     def get_msg(self, blocking=True):
         """ Get a message from the queue """
-        self.logger.info("%s: %s takes from queue and blocks", self.name, self.task_name)
+        self.logger.debug("%s: %s takes from queue and blocks", self.name, self.task_name)
 
         try:
             msg = self.get(block=blocking)
-            self.logger.info("%s: %s got item from queue and releases ", self.name, self.task_name)
+            self.logger.debug("%s: %s got item from queue and releases ", self.name, self.task_name)
 
         except queue.Empty:
             self.logger.error("%s: %s reached in an empty queue", self.name, self.task_name)
@@ -28,16 +43,45 @@ class MsgQueue(queue.Queue):
 
         return msg
 
-    def send_msg(self, msg, sender_name):
+    def get_batch(self, max_items: int, max_wait=None) -> list:
+        """ Get up to max_items messages from the queue with a single lock acquisition
+        @param max_items: maximum number of messages to return
+        @param max_wait: seconds to wait for the first message, None blocks until a message arrives
+        @return: list of messages in queue order, empty if max_wait expired
+        """
+        with self.not_empty:
+            if max_wait is None:
+                while not self._qsize():
+                    self.not_empty.wait()
+            else:
+                endtime = time() + max_wait
+                while not self._qsize():
+                    remaining = endtime - time()
+                    if remaining <= 0.0:
+                        return []
+                    self.not_empty.wait(remaining)
+
+            batch = []
+            while self._qsize() and len(batch) < max_items:
+                batch.append(self._get())
+            self.not_full.notify(len(batch))
+
+        self.logger.debug("%s: %s got %s items from queue", self.name, self.task_name, len(batch))
+        return batch
+
+    def send_msg(self, msg, sender_name, block=True):
         """
         Add a new message in the queue
         @param msg:
         @param sender_name:
-        @return:
+        @param block: wait until the queue has room and the sender has credits
+        @return: True if the message was queued
         """
-        self.logger.info("%s: %s adds item to queue: %s", self.name, sender_name, msg.message)
-        self.put(msg)
-        self.logger.info("%s: %s added item to queue", self.name, sender_name)
+        self.logger.debug("%s: %s adds item to queue: %s", self.name, sender_name, msg.message)
+        if not self.enqueue_msg(msg, sender_name, block):
+            return False
+        self.logger.debug("%s: %s added item to queue", self.name, sender_name)
+        return True
 
     def is_empty(self):
         return self.is_empty()
@@ -1,8 +1,16 @@
 #!/usr/bin/env python3.8
 # -*- coding: utf-8 -*-
 
+# Stream ranks of 802.1Qcc, a lower rank is more important
+RANK_EMERGENCY = 0
+RANK_NON_EMERGENCY = 1
+
+
 class MsgQueuePacket:
-    def __init__(self, msg_type, msg):
+    def __init__(self, msg_type, msg, priority=RANK_NON_EMERGENCY, order_key=None):
         self.msg_type = msg_type
         self.message = msg
-
+        self.priority = priority  # stream rank of the stream the message belongs to, see RankedDeque
+        self.order_key = order_key  # packets with the same order key (e.g. a portal id) keep their order
+        self.sender = None  # name of the sending task, set by the queue
+        self.enqueue_time = None  # time.perf_counter() when the packet was queued, set by the queue
@@ -19,10 +19,12 @@ class MsgType(enum.IntEnum):
     LRP_FIRST_HELLO_IND = 0x1005,
     LRP_PORTAL_STATUS_IND = 0x1006,
     LRP_WRITE_RECORD_REQ = 0x1007,
+    LRP_RECORDS_WRITTEN_IND = 0x1008,
     RPSI_DECLARE_REQ = 0x2000,
     RPSI_WITHDRAW_REQ = 0x2001,
     RPSI_REGISTER_IND = 0x2002,
     RPSI_DEREGISTER_IND = 0x2003,
+    RPSI_REGISTER_BATCH_IND = 0x2004,
     PC_REG_TALKER_REQUIREMENT_IND = 0x3000,
     PC_REG_LISTENER_REQUIREMENT_IND = 0x3001,
     PC_DEREG_TALKER_REQUIREMENT_IND = 0x3002,
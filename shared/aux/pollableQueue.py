@@ -1,59 +1,106 @@
+
 import queue
-import socket
-import os
+import sys
+
+sys.path.insert(0, '..')
+from shared.aux.flowControl import FlowControl
+from shared.aux.rankQueue import RankedDeque
+from shared.aux.wakeupDescriptor import WakeupDescriptor
 
-class PollableQueue(queue.Queue):
+class PollableQueue(FlowControl, queue.Queue):
     """Speacial Message Queue for tasks which need to block/wait on socket input and a classic message queue
-        The task can use a selector to register its listening sockets and this queue which has internal sockets
-        to trigger the selector of the task.
+        The task can use a selector to register its listening sockets and this queue which has an internal
+        file descriptor to trigger the selector of the task.
+        Wakeups are coalesced: the descriptor is only signalled when the queue turns from empty to non-empty,
+        the consumer is expected to drain the queue when the descriptor becomes readable.
     """
-    def __init__(self, task_name, logger):
-        super().__init__()
+    def __init__(self, task_name, logger, maxsize=0, high_watermark=None, low_watermark=None,
+                 producer_credits=None):
+        """
+        @param task_name: name of the task owning the queue
+        @param logger: logger of the owning module
+        @param maxsize: capacity of the queue, 0 for an unbounded queue
+        @param high_watermark, low_watermark, producer_credits: flow control settings, see FlowControl
+        """
+        super().__init__(maxsize=maxsize)
 
         self.task_name = task_name
         self.name = task_name + "_queue"
         self.logger = logger
+        self.init_flow_control(high_watermark, low_watermark, producer_credits)
+
+    def _init(self, maxsize):
+        # Packets of emergency streams overtake other packets
+        self.queue = RankedDeque()
+
+        # Set while a wakeup is outstanding, guarded by self.mutex
+        self._signalled = False
 
-        # Create a pair of connected sockets
-        if os.name == 'posix':
-            self._putsocket, self._getsocket = socket.socketpair()
-        else:
-            # Compatibility on non-POSIX systems
-            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            server.bind(('127.0.0.1', 0))
-            server.listen(1)
-            self._putsocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._putsocket.connect(server.getsockname())
-            self._getsocket, _ = server.accept()
-            server.close()
+        self._wakeup = WakeupDescriptor()
 
     def fileno(self):
-        """ This function returns the fileno of the get-socket.
+        """ This function returns the fileno of the wakeup descriptor.
         This is used by a Selector to register socket events
         """
-        return self._getsocket.fileno()
+        return self._wakeup.fileno()
 
     def get_msg(self, blocking=True):
         """ Get a message from the queue
-        @param blocking: not used in this queue type. Included for compatibility of interface
-        @return: return message queue item
+        @param blocking: wait until a message arrives, otherwise return None from an empty queue
+        @return: return message queue item, None if not blocking and the queue is empty
          """
-        self.logger.info("%s: %s takes from queue and blocks", self.name, self.task_name)
-        self._getsocket.recv(1)
-        msg = super().get()
-        self.logger.info("%s: %s got item from queue and releases ", self.name, self.task_name)
+        self.logger.debug("%s: %s takes from queue and blocks", self.name, self.task_name)
+        while True:
+            batch = self.get_batch(1)
+            if batch or not blocking:
+                break
+            with self.not_empty:
+                while not self._qsize():
+                    self.not_empty.wait()
+        self.logger.debug("%s: %s got item from queue and releases ", self.name, self.task_name)
 
-        return msg
+        return batch[0] if batch else None
 
-    def send_msg(self, msg, sender_name):
+    def get_batch(self, max_items=None, max_wait=None) -> list:
+        """ Get up to max_items messages from the queue.
+        If messages remain in the queue afterwards, the wakeup descriptor is signalled again
+        so the selector of the task returns to the queue.
+        @param max_items: maximum number of messages to return, None drains the whole queue
+        @param max_wait: not used in this queue type. Included for compatibility of interface
+        @return: list of messages in queue order
+        """
+        self._wakeup.clear()
+        with self.mutex:
+            count = self._qsize() if max_items is None else min(max_items, self._qsize())
+            batch = [self._get() for _ in range(count)]
+            self._signalled = self._qsize() > 0
+            resignal = self._signalled
+            self.not_full.notify(len(batch))
+
+        if resignal:
+            self._wakeup.signal()
+
+        self.logger.debug("%s: %s got %s items from queue", self.name, self.task_name, len(batch))
+        return batch
+
+    def send_msg(self, msg, sender_name, block=True):
         """ Add a new message in the queue
         @param msg: message to send
         @param sender_name: name of the sending task
-        @return:
+        @param block: wait until the queue has room and the sender has credits
+        @return: True if the message was queued
         """
 
-        self.logger.info("%s: %s adds item to queue: %s", self.name, sender_name, msg.message)
-        super().put(msg)
-        self._putsocket.send(b'x')  # could by any other character
-        self.logger.info("%s: %s added item to queue", self.name, sender_name)
+        self.logger.debug("%s: %s adds item to queue: %s", self.name, sender_name, msg.message)
+        if not self.enqueue_msg(msg, sender_name, block):
+            return False
+
+        with self.mutex:
+            signal = not self._signalled
+            self._signalled = True
+
+        if signal:
+            self._wakeup.signal()
+        self.logger.debug("%s: %s added item to queue", self.name, sender_name)
+        return True
 
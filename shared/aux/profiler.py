@@ -0,0 +1,238 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from time import thread_time
+
+sys.path.insert(0, '..')
+from shared.aux.logger import Logger
+
+# Logger
+loggerWrapper = Logger(__file__ + ".log")
+logger = loggerWrapper.get_logger()
+
+# Capture modes of the handler profiler
+PROFILE_CPROFILE = "cprofile"
+PROFILE_SAMPLING = "sampling"
+
+# Seconds between two stack samples in sampling mode
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class HandlerProfiler:
+    """ Profiling surface wrapped around the dispatch of the task state machines.
+
+    Counter mode is always on: calls and CPU time of the calling thread are counted per task and message type.
+    A capture can be switched on and off at runtime, either via start()/stop() or by SIGUSR1 once the signal
+    handler is installed. It is restricted to one task and/or message type and runs in one of two modes:
+        - cprofile: the matching handler calls run under cProfile, written to a .pstats file on stop
+        - sampling: a thread samples the stacks of threads inside matching handlers, written as collapsed
+                    stacks (one "frame;frame;... count" line per stack, input format of flamegraph.pl) on stop
+    """
+
+    def __init__(self):
+        self.counters = {}  # (task_name, msg_type) : [calls, cpu seconds]
+        self.lock = threading.Lock()
+
+        # Capture configuration, mode is None while no capture is running
+        self.mode = None
+        self.task_name = None
+        self.msg_type = None
+        self.output_dir = "."
+        self.sample_interval = DEFAULT_SAMPLE_INTERVAL
+        # Arguments of install_signal_handler, passed on to worker processes
+        self.signal_config = None
+        # Worker processes SIGUSR1 is forwarded to
+        self.forward_pids = []
+
+        # cprofile mode: one profiler per thread, a profiler can only be enabled in one thread at a time
+        self.profiles = {}  # thread id : cProfile.Profile
+        # sampling mode
+        self.active_handlers = {}  # thread id : (task_name, msg_type name)
+        self.samples = Counter()
+        self.sampler = None
+
+    def call(self, task_name: str, msg_type, handler, q_pckt) -> None:
+        """ Call a handler of a state machine, count it and capture it if a matching capture is running
+        @param task_name: name of the task calling the handler
+        @param msg_type: type of the message
+        @param handler: handler function of the state machine
+        @param q_pckt: message passed to the handler
+        """
+        cpu_start = thread_time()
+        if self.mode is not None and self.matches(task_name, msg_type):
+            self.capture(task_name, msg_type, handler, q_pckt)
+        else:
+            handler(q_pckt)
+        cpu_time = thread_time() - cpu_start
+
+        counter = self.counters.get((task_name, msg_type))
+        if counter is None:
+            counter = self.counters[(task_name, msg_type)] = [0, 0.0]
+        counter[0] += 1
+        counter[1] += cpu_time
+
+    def matches(self, task_name: str, msg_type) -> bool:
+        if self.task_name is not None and self.task_name != task_name:
+            return False
+        if self.msg_type is not None and self.msg_type != getattr(msg_type, "name", msg_type):
+            return False
+        return True
+
+    def capture(self, task_name: str, msg_type, handler, q_pckt) -> None:
+        thread_id = threading.get_ident()
+        mode = self.mode
+        if mode == PROFILE_CPROFILE:
+            profile = self.profiles.get(thread_id)
+            if profile is None:
+                with self.lock:
+                    profile = self.profiles[thread_id] = cProfile.Profile()
+            profile.runcall(handler, q_pckt)
+        elif mode == PROFILE_SAMPLING:
+            self.active_handlers[thread_id] = (task_name, getattr(msg_type, "name", str(msg_type)))
+            try:
+                handler(q_pckt)
+            finally:
+                del self.active_handlers[thread_id]
+        else:
+            handler(q_pckt)
+
+    def start(self, mode: str = PROFILE_CPROFILE, task_name: str = None, msg_type: str = None,
+              output_dir: str = None) -> None:
+        """ Start a capture
+        @param mode: PROFILE_CPROFILE or PROFILE_SAMPLING
+        @param task_name: only capture handlers of this task, None for all tasks
+        @param msg_type: only capture handlers of this message type (MsgType name), None for all types
+        @param output_dir: directory the capture is written to on stop
+        """
+        if mode not in (PROFILE_CPROFILE, PROFILE_SAMPLING):
+            raise ValueError("Unknown profiling mode: %s" % mode)
+        with self.lock:
+            if self.mode is not None:
+                logger.warning("Profiling already running in %s mode", self.mode)
+                return
+            self.task_name = task_name
+            self.msg_type = msg_type
+            if output_dir is not None:
+                self.output_dir = output_dir
+            self.profiles = {}
+            self.samples = Counter()
+            if mode == PROFILE_SAMPLING:
+                self.sampler = threading.Thread(target=self.sample, name="profiler_sampler")
+                self.sampler.daemon = True
+            self.mode = mode
+            if self.sampler is not None:
+                self.sampler.start()
+        logger.info("Started %s profiling of task %s, message type %s", mode, task_name or "*", msg_type or "*")
+
+    def stop(self):
+        """ Stop the running capture and write it to a file
+        @return: path of the written file, None if no capture was running
+        """
+        with self.lock:
+            mode = self.mode
+            if mode is None:
+                return None
+            self.mode = None
+            sampler, self.sampler = self.sampler, None
+        if sampler is not None:
+            sampler.join()
+
+        path = os.path.join(self.output_dir, "profile_%s_%s" % (os.getpid(), time.strftime("%Y%m%d-%H%M%S")))
+        if mode == PROFILE_CPROFILE:
+            path += ".pstats"
+            # Handlers still running in another thread keep their profiler enabled until they return
+            profiles = [profile for profile in self.profiles.values() if profile.getstats()]
+            if not profiles:
+                logger.info("No matching handler was called while profiling")
+                return None
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(path)
+        else:
+            if not self.samples:
+                logger.info("No matching handler was sampled while profiling")
+                return None
+            path += ".collapsed"
+            with open(path, "w") as f:
+                for stack, count in self.samples.most_common():
+                    f.write("%s %s\n" % (stack, count))
+        logger.info("Wrote %s profile to %s", mode, path)
+        return path
+
+    def toggle(self, mode: str = PROFILE_CPROFILE, task_name: str = None, msg_type: str = None):
+        """ Stop a running capture or start a new one with the given configuration """
+        if self.mode is None:
+            self.start(mode, task_name, msg_type)
+        else:
+            self.stop()
+
+    def sample(self) -> None:
+        """ Main function of the sampler thread in sampling mode """
+        while self.mode == PROFILE_SAMPLING:
+            frames = sys._current_frames()
+            for thread_id, (task_name, msg_type) in list(self.active_handlers.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s (%s:%s)" % (code.co_name, os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append(msg_type)
+                stack.append(task_name)
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def install_signal_handler(self, mode: str = PROFILE_CPROFILE, task_name: str = None, msg_type: str = None,
+                               output_dir: str = None) -> None:
+        """ Toggle a capture with the given configuration on SIGUSR1. Has to be called from the main thread.
+        The signal is forwarded to the worker processes registered with forward_signal_to
+        """
+        if output_dir is not None:
+            self.output_dir = output_dir
+        self.signal_config = (mode, task_name, msg_type, output_dir)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle_in_thread(mode, task_name, msg_type))
+
+    def toggle_in_thread(self, mode: str, task_name: str, msg_type: str) -> None:
+        """ Toggle from a signal handler. Stopping joins the sampler and writes the file, which must not
+        happen while the interrupted main thread may hold the lock
+        """
+        for pid in self.forward_pids:
+            try:
+                os.kill(pid, signal.SIGUSR1)
+            except ProcessLookupError:
+                pass
+        t = threading.Thread(target=self.toggle, args=[mode, task_name, msg_type], name="profiler_toggle")
+        t.daemon = True
+        t.start()
+
+    def forward_signal_to(self, pid: int) -> None:
+        """ Forward SIGUSR1 to a worker process, which profiles its own handlers """
+        self.forward_pids.append(pid)
+
+    def snapshot(self) -> dict:
+        """ Return the counters as dict { task_name: { msg_type name: { "calls": ..., "cpu": ... } } } """
+        stats = {}
+        for (task_name, msg_type), (calls, cpu_time) in list(self.counters.items()):
+            name = getattr(msg_type, "name", str(msg_type))
+            stats.setdefault(task_name, {})[name] = {"calls": calls, "cpu": cpu_time}
+        return stats
+
+    def dump(self, logger) -> None:
+        """ Log a counter line per task and message type """
+        for task_name, types in self.snapshot().items():
+            for msg_type, counter in types.items():
+                logger.info("%s %s: calls=%s cpu=%.6fs", task_name, msg_type, counter["calls"], counter["cpu"])
+
+
+# Profiler shared by all tasks of the process
+handler_profiler = HandlerProfiler()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import sys
+from collections import deque
+
+sys.path.insert(0, '..')
+from shared.aux.msgQueuePacket import RANK_EMERGENCY
+
+# Number of emergency packets served in a row before a waiting non-emergency packet is served
+DEFAULT_EMERGENCY_BURST = 8
+
+
+class RankedDeque:
+    """ Storage for message queues which serves packets of emergency streams (stream rank 0) before all other
+    packets. Packets of the same rank keep FIFO order. To protect the non-emergency traffic from starvation,
+    one non-emergency packet is served after emergency_burst emergency packets in a row, but only if it was
+    queued before the oldest waiting emergency packet: a non-emergency packet never overtakes an emergency
+    packet sent before it (e.g. the first hello of its portal).
+    Packets with the same order key are never reordered: an emergency packet queued while a non-emergency packet
+    with its order key waits is queued behind it, so e.g. an emergency record of a portal does not overtake an
+    earlier withdrawal of the portal.
+    Provides the deque methods used by queue.Queue and asyncio.Queue (append, popleft, len).
+    """
+
+    def __init__(self, emergency_burst: int = DEFAULT_EMERGENCY_BURST):
+        self.emergency = deque()
+        self.normal = deque()
+        self.emergency_burst = emergency_burst
+        self.served_in_row = 0
+        # Sequence number of the next packet, packets are stored as (sequence number, packet)
+        self.sequence = 0
+        self.normal_keys = {}  # order key : number of packets with this key in the non-emergency deque
+
+    def append(self, q_pckt) -> None:
+        self.sequence += 1
+        key = getattr(q_pckt, "order_key", None)
+        if getattr(q_pckt, "priority", None) == RANK_EMERGENCY and key not in self.normal_keys:
+            self.emergency.append((self.sequence, q_pckt))
+            return
+        self.normal.append((self.sequence, q_pckt))
+        if key is not None:
+            self.normal_keys[key] = self.normal_keys.get(key, 0) + 1
+
+    def popleft(self):
+        if self.emergency and (not self.normal or self.served_in_row < self.emergency_burst
+                               or self.emergency[0][0] < self.normal[0][0]):
+            self.served_in_row += 1
+            return self.emergency.popleft()[1]
+
+        self.served_in_row = 0
+        q_pckt = self.normal.popleft()[1]
+        key = getattr(q_pckt, "order_key", None)
+        if key is not None:
+            if self.normal_keys[key] == 1:
+                del self.normal_keys[key]
+            else:
+                self.normal_keys[key] -= 1
+        return q_pckt
+
+    def __len__(self):
+        return len(self.emergency) + len(self.normal)
+
+    def __bool__(self):
+        return bool(self.emergency) or bool(self.normal)
+
+    def __iter__(self):
+        for _, q_pckt in self.emergency:
+            yield q_pckt
+        for _, q_pckt in self.normal:
+            yield q_pckt
@@ -21,26 +21,78 @@ from shared.aux.msgType import MsgType
 loggerWrapper = Logger(__file__ + ".log")
 logger = loggerWrapper.get_logger()
 
+# Units of work served per iteration of the selector loop, a message or a received record is one unit
+WORK_BUDGET = 1024
+# Share of the work budget the message queue may take, the rest is left to the sockets
+QUEUE_SHARE = 0.5
+
 @dataclass
 class SocketTask(Task):
     """
     Special task which works as a tcp server and serves a message queue for inter-task communication
+
+    Every iteration of the selector loop serves at most work_budget units of work: the message queue first,
+    limited to its queue_share of the budget, then the ready sockets. Sockets left over when the budget is spent
+    are served first in the next iteration, so a busy portal can not starve the others or the queue.
+    Socket callbacks return the work they did (e.g. the number of records received), None counts as one unit.
+    A lib with a service_timers() method is called on every iteration, it returns the seconds until its next
+    timer is due or None
     """
 
-    def __init__(self, name):
+    def __init__(self, name, work_budget: int = WORK_BUDGET, queue_share: float = QUEUE_SHARE):
+        """
+        @param name: name of the task
+        @param work_budget: units of work served per iteration of the selector loop
+        @param queue_share: share of the work budget the message queue may take
+        """
         super().__init__(name=name)
 
         self.msg_queue = PollableQueue(self.name, logger)
+        self.work_budget = work_budget
+        self.queue_budget = max(1, int(work_budget * queue_share))
+        self.deferred = []  # file descriptors which were ready but not served in the last iteration, in order
 
         self.lib = None
 
-    def handle_queue(self, connection, mask):
+    def handle_queue(self, connection, mask) -> int:
         if mask & selectors.EVENT_READ:
 
-            logger.info("Checking for message...")
-            q_pckt = self.msg_queue.get_msg(blocking=True)
-            logger.info("Message from other task received!")
-            self.statemachine(self.lib.states, q_pckt)
+            logger.debug("Checking for message...")
+            # Wakeups of the queue are coalesced, the queue signals itself again if messages are left over
+            batch = self.msg_queue.get_batch(self.queue_budget)
+            logger.debug("%s messages from other tasks received!", len(batch))
+            for q_pckt in batch:
+                self.statemachine(self.lib.states, q_pckt)
+            return len(batch)
+        return 0
+
+    def serve_events(self, events: list) -> None:
+        """ Serve the ready file descriptors of one selector iteration within the work budget
+        @param events: [(selector key, mask), ...] as returned by select
+        """
+        ready = OrderedDict()
+        for fd in self.deferred:
+            ready[fd] = None
+        for key, mask in events:
+            ready[key.fd] = (key, mask)
+
+        budget = self.work_budget
+        queue_fd = self.msg_queue.fileno()
+        if ready.get(queue_fd) is not None:
+            key, mask = ready.pop(queue_fd)
+            budget -= key.data(key.fileobj, mask)
+
+        self.deferred = []
+        for fd, event in ready.items():
+            # Deferred descriptors which are not ready anymore
+            if event is None:
+                continue
+            if budget <= 0:
+                self.deferred.append(fd)
+                continue
+            key, mask = event
+            work = key.data(key.fileobj, mask)
+            budget -= 1 if work is None else work
 
     def statemachine(self, states: dict, q_pckt: MsgQueuePacket) -> None:
         """
@@ -52,8 +104,8 @@ class SocketTask(Task):
         """
 
         if q_pckt.msg_type in states.keys():
-            logger.info("Passing message to handler: %s", q_pckt.msg_type)
-            states[q_pckt.msg_type](q_pckt)
+            logger.debug("Passing message to handler: %s", q_pckt.msg_type)
+            self.dispatch(states[q_pckt.msg_type], q_pckt)
         else:
             logger.error("Unknown message type!")
 
@@ -64,13 +116,15 @@ class SocketTask(Task):
         self.lib = lib
 
         lib.selector.register(self.msg_queue, selectors.EVENT_READ, self.handle_queue)
+        service_timers = getattr(lib, "service_timers", None)
 
         while not Task.terminate_event.is_set():
             try:
                 while True:
-                    for key, mask in lib.selector.select(timeout=None):
-                        callback = key.data
-                        callback(key.fileobj, mask)
+                    timeout = service_timers() if service_timers is not None else None
+                    if self.deferred:
+                        timeout = 0
+                    self.serve_events(lib.selector.select(timeout=timeout))
 
             except KeyboardInterrupt:
                 print('Shutting down CUC')
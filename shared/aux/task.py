@@ -6,10 +6,14 @@ from collections import OrderedDict
 from dataclasses import dataclass
 import threading
 from threading import Event
+from time import perf_counter
 
 sys.path.insert(0, '..')
 from shared.aux.logger import Logger
 from shared.aux.msgQueue import MsgQueue
+from shared.aux.flowControl import DEFAULT_QUEUE_CAPACITY
+from shared.aux.latencyStats import latency_recorder
+from shared.aux.profiler import handler_profiler
 from shared.aux.msgQueuePacket import MsgQueuePacket
 from shared.aux.msgType import MsgType
 
@@ -20,13 +24,23 @@ logger = loggerWrapper.get_logger()
 
 @dataclass
 class Task:
-    """General task which uses a given state machine to service messages from other tasks"""
+    """General task which uses a given state machine to service messages from other tasks.
+    A lib with a service_timers() method is called on every iteration, it returns the seconds until its next
+    timer is due or None
+    """
     terminate_event = threading.Event()
 
-    def __init__(self, name=""):
-
+    def __init__(self, name="", batch_size=1, batch_wait=None, queue_size=DEFAULT_QUEUE_CAPACITY):
+        """
+        @param name: name of the task, also used to name its message queue
+        @param batch_size: maximum number of messages processed per wakeup, 1 disables batching
+        @param batch_wait: seconds to wait for the first message of a batch, None blocks
+        @param queue_size: capacity of the message queue of the task, 0 for an unbounded queue
+        """
         self.name = name
-        self.msg_queue = MsgQueue(name, logger)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.msg_queue = MsgQueue(name, logger, maxsize=queue_size)
 
     def statemachine(self, states: dict, q_pckt: MsgQueuePacket) -> None:
         """
@@ -38,22 +52,56 @@ class Task:
         """
 
         if q_pckt.msg_type in states.keys():
-            logger.info("Passing message to handler")
-            states[q_pckt.msg_type](q_pckt)
+            logger.debug("Passing message to handler")
+            self.dispatch(states[q_pckt.msg_type], q_pckt)
         else:
             logger.error("Unknown message type!")
 
+    def dispatch(self, handler, q_pckt: MsgQueuePacket) -> None:
+        """
+        Call the handler of a message and record its queueing delay and the execution time of the handler.
+        The call goes through the handler profiler, which counts it and captures it while profiling is switched on
+        @param handler: handler function of the state machine
+        @param q_pckt: Message from a message queue.
+        """
+        start = perf_counter()
+        handler_profiler.call(self.name, q_pckt.msg_type, handler, q_pckt)
+        end = perf_counter()
+
+        queue_wait = start - q_pckt.enqueue_time if q_pckt.enqueue_time is not None else None
+        latency_recorder.record(self.name, q_pckt.msg_type, queue_wait, end - start)
+
     def run(self, lib) -> None:
         """ Main loop of the task, which waits on messages from a queue and processes according to a state machine
         @param lib:
         """
+        if self.batch_size > 1 or hasattr(lib, "service_timers"):
+            self.run_batched(lib)
+            return
+
         while not Task.terminate_event.is_set():
 
-            logger.info("Checking for message...")
+            logger.debug("Checking for message...")
             q_pckt = self.msg_queue.get_msg(blocking=True)
-            logger.info("Message from other task received!")
+            logger.debug("Message from other task received!")
             self.statemachine(lib.states, q_pckt)
 
+    def run_batched(self, lib) -> None:
+        """ Main loop in batch mode. Drains up to batch_size messages per wakeup and passes them in order
+        to the state machine
+        @param lib:
+        """
+        service_timers = getattr(lib, "service_timers", None)
+        while not Task.terminate_event.is_set():
+            wait = self.batch_wait
+            timeout = service_timers() if service_timers is not None else None
+            if timeout is not None:
+                wait = timeout if wait is None else min(wait, timeout)
+            batch = self.msg_queue.get_batch(self.batch_size, wait)
+            logger.debug("%s received %s messages from other tasks", self.name, len(batch))
+            for q_pckt in batch:
+                self.statemachine(lib.states, q_pckt)
+
     def run_task_as_thread(self, lib_instance) -> threading.Thread:
         """
         This methods runs the task as a thread. The state machine is defined by the lib_instance
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+from time import monotonic
+
+
+class TokenBucket:
+    """ Token bucket limiting the rate of an ingress, e.g. the records received on a portal
+
+        - Rate: tokens added per second
+        - Burst: capacity of the bucket, the amount accepted at once after an idle period
+        - The bucket may go into debt, since the amount is only known after the data was read.
+          consume returns the time until the debt is paid off, the ingress is paused until then
+
+        Counters: consumed (tokens taken in total) and throttled (number of times the bucket went into debt)
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        """
+        @param rate: tokens per second
+        @param burst: capacity of the bucket, default one second worth of tokens
+        """
+        self.rate = rate
+        self.burst = rate if burst is None or burst <= 0 else burst
+        self.tokens = self.burst
+        self.last = monotonic()
+
+        self.consumed = 0
+        self.throttled = 0
+
+    def consume(self, amount: int, now: float = None) -> float:
+        """ Take tokens from the bucket
+        @param amount: number of tokens
+        @param now: monotonic time, read from the clock if None
+        @return: seconds until the bucket is out of debt, 0 if it is not in debt
+        """
+        if now is None:
+            now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        self.tokens -= amount
+        self.consumed += amount
+        if self.tokens >= 0:
+            return 0.0
+        self.throttled += 1
+        return -self.tokens / self.rate
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3.8
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+
+
+class WakeupDescriptor:
+    """ File descriptor which is made readable to wake up a selector waiting on it.
+        Linux uses a single eventfd counter, other POSIX systems a pair of connected sockets and other systems a
+        pair of connected tcp sockets. Signals are not counted, clear consumes all outstanding signals
+    """
+
+    def __init__(self):
+        self._eventfd = None
+        if hasattr(os, 'eventfd'):
+            # Linux: a single eventfd counter serves as wakeup descriptor
+            self._eventfd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            return
+
+        if os.name == 'posix':
+            # Create a pair of connected sockets
+            self._putsocket, self._getsocket = socket.socketpair()
+        else:
+            # Compatibility on non-POSIX systems
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind(('127.0.0.1', 0))
+            server.listen(1)
+            self._putsocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._putsocket.connect(server.getsockname())
+            self._getsocket, _ = server.accept()
+            server.close()
+        self._getsocket.setblocking(False)
+
+    def fileno(self) -> int:
+        """ Return the descriptor to register with a selector """
+        if self._eventfd is not None:
+            return self._eventfd
+        return self._getsocket.fileno()
+
+    def signal(self) -> None:
+        """ Make the descriptor readable """
+        if self._eventfd is not None:
+            os.eventfd_write(self._eventfd, 1)
+        else:
+            self._putsocket.send(b'x')  # could by any other character
+
+    def clear(self) -> None:
+        """ Consume the pending signals so the descriptor is no longer readable """
+        try:
+            if self._eventfd is not None:
+                os.eventfd_read(self._eventfd)
+            else:
+                self._getsocket.recv(64)
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        if self._eventfd is not None:
+            os.close(self._eventfd)
+            self._eventfd = -1
+        else:
+            self._putsocket.close()
+            self._getsocket.close()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from .TLV import TLV
+
+
+class Attribute_list:
+    """ Record data holding several attributes. 802.1Qdd allows several attributes in one LRP record, LRP-Dummy
+    delimits a record by the length of the TLV following the record number, so the attribute TLVs are wrapped into
+    one attribute list TLV. A record with a single attribute holds the attribute TLV itself
+    """
+    TYPE_ID = 0x7F  # not used by the attributes and sub-TLVs of RAP
+    HEADER_LENGTH = TLV.HEADER.size
+
+    @staticmethod
+    def pack(encodings: list) -> bytes:
+        """ Return the data of a record holding the given attribute TLVs
+        @param encodings: serialized attributes, at least one
+        """
+        if len(encodings) == 1:
+            return encodings[0]
+        value = b"".join(encodings)
+        return TLV.HEADER.pack(Attribute_list.TYPE_ID, len(value)) + value
+
+    @staticmethod
+    def unpack(data) -> list:
+        """ Return the attribute TLVs of the data of a record as memoryviews into data, empty for a withdrawal
+        @raise ValueError: if an attribute TLV exceeds the attribute list
+        """
+        if len(data) == 0:
+            return []
+        if data[0] != Attribute_list.TYPE_ID:
+            return [data]
+
+        value, _ = TLV.extract(data)
+        tlvs = []
+        offset = 0
+        while offset < len(value):
+            if offset + Attribute_list.HEADER_LENGTH > len(value):
+                raise ValueError("Truncated attribute in attribute list")
+            end = offset + Attribute_list.HEADER_LENGTH + value[offset + 1] * 256 + value[offset + 2]
+            if end > len(value):
+                raise ValueError("Truncated attribute in attribute list")
+            tlvs.append(value[offset:end])
+            offset = end
+        return tlvs
+
+    @staticmethod
+    def encoded_length(encoding_lengths: list) -> int:
+        """ Return the length of the data of a record holding attribute TLVs of the given lengths """
+        if len(encoding_lengths) == 1:
+            return encoding_lengths[0]
+        return Attribute_list.HEADER_LENGTH + sum(encoding_lengths)
@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import struct
+
 from .TLV import TLV
 
 class Data_frame_parameters_tlv:
+    # type (1), length (2), dst mac (6), vlan id (12 bit), priority (3 bit), reserved (1 bit)
+    ENCODING = struct.Struct(">BH6sH")
+
     def __init__(self, dst_mac_address = '00-00-00-00-00-00', vlan_id=0, priority=0):
         self.__TYPE_ID = 0x21
 
@@ -19,13 +24,18 @@ class Data_frame_parameters_tlv:
 
     def serialize(self):
         """ This Method serializes the object to string"""
+        return TLV.encode(self)
 
-        compound_field = ((self.vlan_id << 3) | self.priority) << 1
+    def encoded_length(self):
+        return self.ENCODING.size
 
-        value = self.dst_mac_address + compound_field.to_bytes(2, 'big')
-        length = 8  
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        compound_field = ((self.vlan_id << 3) | self.priority) << 1
 
-        return TLV.encapsulate_object(self.__TYPE_ID, length, value)
+        self.ENCODING.pack_into(buffer, offset, self.__TYPE_ID, self.ENCODING.size - 3, self.dst_mac_address,
+                                compound_field)
+        return offset + self.ENCODING.size
 
     def deserialize(self, tlv ):
         """ This Method builds an object from a string"""
@@ -35,7 +45,7 @@ class Data_frame_parameters_tlv:
         if (len(value) != 8):
             raise ValueError("Invalid data frame parameter tlv")
 
-        self.dst_mac_address = value[0:6]
+        self.dst_mac_address = bytes(value[0:6])
 
         compound_field = int.from_bytes(value[6:8], byteorder='big', signed=False) >> 1
         
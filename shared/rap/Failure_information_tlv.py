@@ -2,11 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import binascii
+import struct
 
 from .TLV import TLV
 from .Failure_code import Failure_code
 
 class Failure_information_tlv:
+    # type (1), length (2), system id (8), failure code (1)
+    ENCODING = struct.Struct(">BH8sB")
+
     def __init__(self, mac= '00-00-00-00-00-00', failure_code = Failure_code.ERROR):
         self.__TYPE_ID = 0x026
         self.__SYSTEM_ID_LEN = 8
@@ -34,18 +38,22 @@ class Failure_information_tlv:
 
     def serialize(self):
         """ This Method serializes the object to byte array containing the TLV structures """
-        system_id_bytes = bytearray(self.system_id)
-        failure_code_bytes = bytearray(self.failure_code.value.to_bytes(self.__FAILURE_CODE_LEN, byteorder = 'big'))
+        return TLV.encode(self)
 
-        tlv = TLV.encapsulate_object(self.__TYPE_ID, len(system_id_bytes + failure_code_bytes), system_id_bytes + failure_code_bytes)
+    def encoded_length(self):
+        return self.ENCODING.size
 
-        return tlv
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        self.ENCODING.pack_into(buffer, offset, self.__TYPE_ID, self.ENCODING.size - 3, self.system_id,
+                                self.failure_code.value)
+        return offset + self.ENCODING.size
 
     def deserialize(self, tlv):
         """ This Method builds an object from a byte array """
         value, rest = TLV.extract(tlv)
 
-        self.system_id = value[0:8]
+        self.system_id = bytes(value[0:8])
         self.failure_code = Failure_code(value[8])
 
         return len(value) + 3
@@ -1,12 +1,15 @@
 import json
-import binascii
+import struct
 
 from .TLV import TLV
+from .Stream_id import Mac_address
 
 
 
 class Interface_configuration_tlv:
     ''' This class models the data for one item of the iterface_list in the interface configuration '''
+    # time aware offset (4), follows the mac address and vlan tag sub-TLVs
+    TIME_AWARE_OFFSET = struct.Struct(">I")
 
     def __init__(self):
         self.__TYPE_ID = 0x0FF
@@ -19,30 +22,27 @@ class Interface_configuration_tlv:
 
     def serialize(self):
         """ This Method serializes the object to byte array containing the TLV structures """
-        mac_tlv = self.mac_addresses_tlv.serialize()
-        vlan_tlv = self.vlan_tag_tlv.serialize()
-        tao = self.time_aware_offset.to_bytes(4, "big")
+        return TLV.encode(self)
 
-        value = mac_tlv + vlan_tlv + tao
+    def encoded_length(self):
+        return 3 + self.mac_addresses_tlv.encoded_length() + self.vlan_tag_tlv.encoded_length() + \
+               self.TIME_AWARE_OFFSET.size
 
-        tlv = TLV.encapsulate_object(self.__TYPE_ID, len(value), value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        end = self.mac_addresses_tlv.pack_into(buffer, offset + 3)
+        end = self.vlan_tag_tlv.pack_into(buffer, end)
+        self.TIME_AWARE_OFFSET.pack_into(buffer, end, self.time_aware_offset)
+        end += self.TIME_AWARE_OFFSET.size
 
-        return tlv
-
-    def __btos(self, number):
-        return binascii.hexlify(bytearray([number])).decode("utf-8")
+        TLV.HEADER.pack_into(buffer, offset, self.__TYPE_ID, end - offset - 3)
+        return end
 
     def get_dst_mac(self):
-        s = self.mac_addresses_tlv.dst_mac
-        mac = self.__btos(s[0]) + "-" + self.__btos(s[1]) + "-" + self.__btos(s[2]) + "-" + self.__btos(s[3]) + "-" + self.__btos(s[4]) + "-" \
-              + self.__btos(s[5])
-        return mac
+        return Mac_address.from_bytes(self.mac_addresses_tlv.dst_mac)
 
     def get_src_mac(self):
-        s = self.mac_addresses_tlv.src_mac
-        mac = self.__btos(s[0]) + "-" + self.__btos(s[1]) + "-" + self.__btos(s[2]) + "-" + self.__btos(s[3]) + "-" + self.__btos(s[4]) + "-" \
-              + self.__btos(s[5])
-        return mac
+        return Mac_address.from_bytes(self.mac_addresses_tlv.src_mac)
 
     def deserialize(self, tlv):
         """ This Method builds an object from a byte array """
@@ -92,16 +92,30 @@ class Mac_address_tlv:
         self.src_mac = bytearray.fromhex(mac)
 
     def serialize(self):
-        value = self.dst_mac + self.src_mac
-        return TLV.encapsulate_object(self.__TYPE_ID, len(value), value)
+        return TLV.encode(self)
+
+    def encoded_length(self):
+        return 3 + len(self.dst_mac) + len(self.src_mac)
+
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        TLV.HEADER.pack_into(buffer, offset, self.__TYPE_ID, len(self.dst_mac) + len(self.src_mac))
+        offset += 3
+        buffer[offset:offset + len(self.dst_mac)] = self.dst_mac
+        offset += len(self.dst_mac)
+        buffer[offset:offset + len(self.src_mac)] = self.src_mac
+        return offset + len(self.src_mac)
 
     def deserialize(self, tlv):
         value, rest = TLV.extract(tlv)
-        self.dst_mac = value[0:6]
-        self.src_mac = value[6:]
+        self.dst_mac = bytes(value[0:6])
+        self.src_mac = bytes(value[6:])
 
 
 class Vlan_tag_tlv:
+    # type (1), length (2), priority code point (3 bit), reserved (1 bit), vlan id (12 bit)
+    ENCODING = struct.Struct(">BHH")
+
     def __init__(self, pcp=0x0, vlanid=0x000):
         self.__TYPE_ID = 0x0FD
         self.priority_code_point = pcp  # L = 3 bit
@@ -109,13 +123,19 @@ class Vlan_tag_tlv:
         self.vlan_id = vlanid           # L = 12 bit
 
     def serialize(self):
+        return TLV.encode(self)
+
+    def encoded_length(self):
+        return self.ENCODING.size
 
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
         if self.vlan_id > 4095:
             raise ValueError("Vlan ID to large")
 
-        value = (self.priority_code_point << 13) | self.vlan_id
-
-        return TLV.encapsulate_object(self.__TYPE_ID, 2, value.to_bytes(2, "big"))
+        self.ENCODING.pack_into(buffer, offset, self.__TYPE_ID, self.ENCODING.size - 3,
+                                (self.priority_code_point << 13) | self.vlan_id)
+        return offset + self.ENCODING.size
 
     def deserialize(self, tlv):
         value, rest = TLV.extract(tlv)
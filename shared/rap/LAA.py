@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import binascii
+import struct
 import sys
 
 sys.path.insert(0, '/app/shared/rap/')
 
 from .Listener_status import Listener_status
-from .TLV import TLV
+from .TLV import TLV, CachedTLV
+from .Stream_id import Stream_id
 from .Failure_information_tlv import Failure_information_tlv
 from .Interface_configuration_tlv import Interface_configuration_tlv
 from .Failure_code import Failure_code  # For test code at bottom
 
-class LAA:
+class LAA(CachedTLV):
+    # type (1), length (2), stream id (8), listener attach status (1), followed by the sub-TLVs
+    HEADER = struct.Struct(">BH8sB")
+
     def __init__(self, stream_id= "00-00-00-00-00-00:00-00"):
         self.__TYPE_ID = 0x02
 
@@ -32,68 +36,54 @@ class LAA:
     def get_type(self):
         return self.__TYPE_ID
 
-    def __btos(self, number):
-        return binascii.hexlify(bytearray([number])).decode("utf-8")
-
     def get_stream_id(self):
-        s = self.stream_id
-        stream_id_string = self.__btos(s[0]) + "-" + self.__btos(s[1]) + "-" + self.__btos(s[2]) + "-" \
-                           + self.__btos(s[3]) + "-" + self.__btos(s[4]) + "-"  + self.__btos(s[5]) + ":" \
-                           + self.__btos(s[6]) + "-" + self.__btos(s[7])
-        return stream_id_string
+        return Stream_id.from_bytes(self.stream_id)
 
     def serialize(self):
-        """ This Method serializes the object to byte array containing the TLV structures """
-        stream_id_bytes = bytearray(self.stream_id)
-        listener_status_bytes = bytearray([self.listener_attach_status.value])
-    
-        length = len(stream_id_bytes + listener_status_bytes )
-        value = stream_id_bytes + listener_status_bytes 
-
-        if self.failure_information_stlv is not None: 
-            failure_bytes = self.failure_information_stlv.serialize()        
-            length = length + len(failure_bytes)
-            value = value +  failure_bytes
+        """ This Method serializes the object to bytes containing the TLV structures. The encoding is cached until
+        the LAA is changed by one of its methods """
+        return self.cached_encoding()
 
+    def encoded_length(self):
+        length = self.HEADER.size
+        if self.failure_information_stlv is not None:
+            length += self.failure_information_stlv.encoded_length()
         if self.interface_configuration is not None:
-            inter_conf = self.interface_configuration.serialize()
-            length = length + len(inter_conf)
-            value = value + inter_conf
+            length += self.interface_configuration.encoded_length()
+        return length
 
-        tlv = TLV.encapsulate_object(self.__TYPE_ID, length, value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        end = offset + self.HEADER.size
+        if self.failure_information_stlv is not None:
+            end = self.failure_information_stlv.pack_into(buffer, end)
+        if self.interface_configuration is not None:
+            end = self.interface_configuration.pack_into(buffer, end)
 
-        return tlv
+        self.HEADER.pack_into(buffer, offset, self.__TYPE_ID, end - offset - 3, self.stream_id,
+                              self.listener_attach_status.value)
+        return end
 
     def deserialize(self, tlv):
         """ This Method builds an object from a string"""
         
         value, rest = TLV.extract(tlv)
 
-        self.stream_id = value[0:8]
+        self.stream_id = bytes(value[0:8])
         self.listener_attach_status = Listener_status(value[8])
        
-        if len(value) > 9: # optional sub-tlv is present
-            if value[9] == 0x026: # is Failure_information_tlv
-                fail_obj = Failure_information_tlv()
-                fail_length = fail_obj.deserialize(value[9:])
-                self.failure_information_stlv = fail_obj
-
-                if len(value) > (9+fail_length):
-                    inter_conf = Interface_configuration_tlv()
-                    inter_conf.deserialize(value[9+fail_length:])
-                    self.interface_configuration = inter_conf
-
-            elif value[9] == 0x0FF:  # is interface configuration
-                inter_conf = Interface_configuration_tlv()
-                inter_conf.deserialize(value[9:])
-                self.interface_configuration = inter_conf
-
-
-            elif value[9] == 0x27: # is orga tlv
-                self.organizationally_defined_stlv, rest = TLV.extract(rest) 
-
+        for sub_tlv in TLV.split(value[9:]): # optional sub-tlvs are present
+            if sub_tlv[0] == 0x26: # is Failure_information_tlv
+                self.failure_information_stlv = Failure_information_tlv()
+                self.failure_information_stlv.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0xFF:  # is interface configuration
+                self.interface_configuration = Interface_configuration_tlv()
+                self.interface_configuration.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0x27: # is orga tlv, kept as bytes
+                self.organizationally_defined_stlv = bytes(TLV.extract(sub_tlv)[0])
             else:
                 raise ValueError("Invalid Sub TLV in LAA")
+        self.invalidate()
 
     def add_failure_information(self, mac, failure_code):
         """ Add a failure information sub-TLV to LAA
@@ -102,19 +92,23 @@ class LAA:
             failure_code    is the failure code from 802.1Qcc (Table 46-15)
         """
         self.failure_information_stlv = Failure_information_tlv(mac, failure_code)
+        self.invalidate()
 
     def add_interface_configuration(self, json_string):
         inter_conf = Interface_configuration_tlv()
         inter_conf.parse_from_json(json_string)
         self.interface_configuration = inter_conf
+        self.invalidate()
 
     def remove_failure_information(self):
         """ Remove the failure information tlv"""
         self.failure_information_stlv = None
+        self.invalidate()
 
     def update_status(self, status):
         """ Update the status of the LAA, done by bridges or CUC"""
         self.listener_attach_status = status
+        self.invalidate()
 
     def dump(self):
         """ Dump object to console"""
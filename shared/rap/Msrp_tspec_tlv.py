@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import struct
+
 from .TLV import TLV
 
 class Msrp_tspec_tlv:
+    # type (1), length (2), max frame size (2), max interval frames (2)
+    ENCODING = struct.Struct(">BHHH")
+
     def __init__(self, max_frame_size = 0, max_interval_frames = 0):
         self.__TYPE_ID = 0x23
 
@@ -19,13 +24,16 @@ class Msrp_tspec_tlv:
 
     def serialize(self):
         """ This method serializes the object to string"""
+        return TLV.encode(self)
 
-        length = 4
-        value = self.max_frame_size.to_bytes(2, "big") + self.max_interval_frames.to_bytes(2, "big")
-        
-        tlv = TLV.encapsulate_object(self.__TYPE_ID, length, value)
+    def encoded_length(self):
+        return self.ENCODING.size
 
-        return tlv
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        self.ENCODING.pack_into(buffer, offset, self.__TYPE_ID, self.ENCODING.size - 3, self.max_frame_size,
+                                self.max_interval_frames)
+        return offset + self.ENCODING.size
 
     def deserialize(self, tlv):
         """ This method builds an object from a string"""
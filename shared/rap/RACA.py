@@ -69,7 +69,7 @@ class Ra_class_descriptor:
         value = tlv
 
         self.priority = value[0]
-        self.rsid = value[1:5]
+        self.rsid = bytes(value[1:5])
 
 
 
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import struct
+
 from .TLV import TLV
 from .Failure_code import Failure_code
 from .Vlan_context_tlv import Vlan_context_tlv
 
 
 class Redundancy_control_tlv:
-    def __init__(self, r_tag_status = False, vlan_context_list = []):
+    # type (1), length (2), r tag status (1 bit), padding (7 bit), followed by the vlan context sub-TLVs
+    HEADER = struct.Struct(">BHB")
+
+    def __init__(self, r_tag_status = False, vlan_context_list = ()):
         self.__TYPE_ID = 0x24
         
         self.r_tag_status = r_tag_status # 1 bit usigned int with 7 bit succeeding padding L = 1
@@ -17,64 +22,52 @@ class Redundancy_control_tlv:
             raise ValueError('Invalid r tag status')
 
 
-        self.vlan_context_stlv_list = vlan_context_list # L = variable
+        self.vlan_context_stlv_list = tuple(vlan_context_list) # L = variable, not changed in place
 
     def serialize(self):
-        r_tag_status_formated = int(self.r_tag_status) << 7
-        
-        if self.vlan_context_stlv_list is []:
-            raise ValueError('Invalid number of VLAN contexts') 
-
-        length = 1
-        value = bytearray([r_tag_status_formated])
-
-        print(value)
+        return TLV.encode(self)
 
-        if self.vlan_context_stlv_list is []: 
-            raise ValueError('List of Vlan contexts can not be empty!')
-        else:
-            for vlan_context in self.vlan_context_stlv_list:
-                vlan_bytes = vlan_context.serialize()        
-                length = length + len(vlan_bytes)
-                value = value +  vlan_bytes
-                print(value)
+    def encoded_length(self):
+        length = self.HEADER.size
+        for vlan_context in self.vlan_context_stlv_list:
+            length += vlan_context.encoded_length()
+        return length
 
-        tlv = TLV.encapsulate_object(self.__TYPE_ID, length, value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        end = offset + self.HEADER.size
+        for vlan_context in self.vlan_context_stlv_list:
+            end = vlan_context.pack_into(buffer, end)
 
-        return tlv
+        self.HEADER.pack_into(buffer, offset, self.__TYPE_ID, end - offset - 3, int(self.r_tag_status) << 7)
+        return end
 
     def deserialize(self, tlv):
-        print(tlv)
         value, rest = TLV.extract(tlv)
 
         self.r_tag_status = int.from_bytes(value[0:1], byteorder='big', signed=False) >> 7
-        if self.r_tag_status is 1 or 0:
+        if self.r_tag_status in (0, 1):
             self.r_tag_status = bool(self.r_tag_status)
         else:
             raise ValueError('Invalid r tag status')
         
-        self.vlan_context_stlv_list = []
+        vlan_context_stlv_list = []
 
-        print(value)
-        
         if len(value) > 1: 
             start = 1 
-            print("value len: " + str(len(value)))
 
-            print("start_oben:" + str(start))
             while start < len(value)-1:
 
                 offset = value[start+1] * 256 + value[start+2] + 2
-                print("start offset: " + str(offset))
 
                 if value[start] == 0x25: # is vlan_context_stlv:
                     vlan = Vlan_context_tlv()
                     vlan.deserialize(value[start:start+offset+1])
 
-                    self.vlan_context_stlv_list.append(vlan)
+                    vlan_context_stlv_list.append(vlan)
 
-                    start = start + offset + 1
-                print("start_unten:" + str(start))
+                start = start + offset + 1
+        self.vlan_context_stlv_list = tuple(vlan_context_stlv_list)
 
     def dump(self):
         """ Dump object to console"""
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+
+sys.path.insert(0, '..')
+from shared.aux.logger import Logger
+
+# Logger
+loggerWrapper = Logger(__file__ + ".log")
+logger = loggerWrapper.get_logger()
+
+# Number of interned identifiers per class, the table is cleared when it is full. Interning only saves work and
+# memory, identifiers created before clearing stay equal to the ones created after
+INTERN_LIMIT = 65536
+
+
+class Interned_id(str):
+    """ Identifier which is its canonical string, e.g. a stream id "00-11-22-33-44-55:00-01", and is backed by
+    an integer (value). It compares and hashes as the string, so it is a key interchangeable with the string of
+    other sources like the CNC, but each value is formatted only once: identifiers are interned by value and
+    creating one from the bytes of a TLV costs a dict lookup
+    """
+    LENGTH = 0  # bytes of the value
+    FORMAT = ""  # canonical string, formatted from the bytes of the value
+    interned = {}  # value : identifier, one table per subclass
+    limit_reached = False  # set when the table of the subclass was cleared the first time
+
+    def __new__(cls, identifier):
+        """
+        @param identifier: string with the hex digits of the value, '-' and ':' are ignored
+        @raise ValueError: if identifier has not LENGTH bytes
+        """
+        digits = identifier.replace(':', '').replace('-', '')
+        if len(digits) != 2 * cls.LENGTH:
+            raise ValueError("Invalid %s %r" % (cls.__name__, identifier))
+        return cls.from_value(int(digits, 16))
+
+    def __getnewargs__(self):
+        return str(self),
+
+    @classmethod
+    def from_bytes(cls, identifier):
+        """ Return the identifier of the first LENGTH bytes of a TLV field """
+        return cls.from_value(int.from_bytes(identifier[:cls.LENGTH], 'big'))
+
+    @classmethod
+    def from_value(cls, value: int):
+        interned = cls.interned.get(value)
+        if interned is None:
+            if len(cls.interned) >= INTERN_LIMIT:
+                if not cls.limit_reached:
+                    cls.limit_reached = True
+                    logger.warning("Intern table of %s is full with %s identifiers, it is cleared whenever it is "
+                                   "full and identifiers are formatted again", cls.__name__, INTERN_LIMIT)
+                cls.interned.clear()
+            interned = str.__new__(cls, cls.FORMAT % tuple(value.to_bytes(cls.LENGTH, 'big')))
+            interned.value = value
+            cls.interned[value] = interned
+        return interned
+
+
+class Stream_id(Interned_id):
+    """ Stream id of 802.1Qcc, mac address of the talker and unique id """
+    LENGTH = 8
+    FORMAT = "%02x-%02x-%02x-%02x-%02x-%02x:%02x-%02x"
+    interned = {}
+
+    def attribute_id(self, vlan_id: int) -> str:
+        """ Return the id of the TAA of the stream in a vlan, "stream id-vlan id", formatted once per vlan """
+        attribute_ids = self.__dict__.setdefault('attribute_ids', {})
+        attribute_id = attribute_ids.get(vlan_id)
+        if attribute_id is None:
+            attribute_id = attribute_ids[vlan_id] = self + "-" + str(vlan_id)
+        return attribute_id
+
+
+class Mac_address(Interned_id):
+    LENGTH = 6
+    FORMAT = "%02x-%02x-%02x-%02x-%02x-%02x"
+    interned = {}
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import binascii
-from .TLV import TLV
+import struct
+from .TLV import TLV, CachedTLV
+from .Stream_id import Stream_id, Mac_address
 from .Data_frame_parameters_tlv import Data_frame_parameters_tlv
 from .Msrp_tspec_tlv import Msrp_tspec_tlv
 from .Token_bucket_tspec_tlv import Token_bucket_tspec_tlv
@@ -12,7 +13,10 @@ from .Failure_code import Failure_code
 from .Interface_configuration_tlv import Interface_configuration_tlv
 
 
-class TAA:
+class TAA(CachedTLV):
+    # type (1), length (2), stream id (8), stream rank (1), accumulated maximum latency (4), followed by the sub-TLVs
+    HEADER = struct.Struct(">BH8sBI")
+
     def __init__(self, stream_id="00-00-00-00-00-00:00-00", stream_rank=0, destination_mac='00-00-00-00-00-00',
                  vlan_id=0x0, priority=0x0, msrp_tspec=None, token_bucket_tspec=None, organizationally_defined=None):
         self.__TYPE_ID = 0x01
@@ -38,64 +42,58 @@ class TAA:
     def get_type(self):
         return self.__TYPE_ID
 
-    def __btos(self, number):
-        return binascii.hexlify(bytearray([number])).decode("utf-8")
-
     def get_stream_id(self):
-        s = self.stream_id
-        stream_id_string = self.__btos(s[0]) + "-" + self.__btos(s[1]) + "-" + self.__btos(s[2]) + "-" \
-                           + self.__btos(s[3]) + "-" + self.__btos(s[4]) + "-"  + self.__btos(s[5]) + ":" \
-                           + self.__btos(s[6]) + "-" + self.__btos(s[7])
-        return stream_id_string
+        return Stream_id.from_bytes(self.stream_id)
 
     def get_dst_mac(self):
-        s = self.data_frame_parameters_stlv.dst_mac_address
-        mac = str(s[0]) + "-" + str(s[1]) + "-" + str(s[2]) + "-" + str(s[3]) + "-" + str(s[4]) + "-" \
-                           + str(s[5])
-        return mac
+        """ Destination mac address of the stream as sent to the CNC in "destination-mac-address", hex octets
+        separated by "-" like all mac addresses of the qcc model. A CNC returns it in the interface configuration
+        of the talker, which is encoded from this format """
+        return Mac_address.from_bytes(self.data_frame_parameters_stlv.dst_mac_address)
 
     def get_mac(self):
-        s = self.stream_id
-        mac = self.__btos(s[0]) + "-" + self.__btos(s[1]) + "-" + self.__btos(s[2]) + "-" \
-                           + self.__btos(s[3]) + "-" + self.__btos(s[4]) + "-"  + self.__btos(s[5])
-        return mac
+        return Mac_address.from_bytes(self.stream_id)
 
     def serialize(self):
-        """ This Method serializes the object to string"""
-        tspec = None
-        
-        value = self.stream_id + self.stream_rank.to_bytes(1, 'big') + \
-                self.accumulated_maximum_latency.to_bytes(4, 'big')
-
-        data_frame_spec = self.data_frame_parameters_stlv.serialize()
-        value = value + data_frame_spec
+        """ This Method serializes the object to bytes. The encoding is cached until the TAA is changed by one of
+        its methods, so declaring an unchanged TAA again does not encode it again """
+        return self.cached_encoding()
 
+    def encoded_length(self):
+        length = self.HEADER.size + self.data_frame_parameters_stlv.encoded_length()
         if self.msrp_tspec_stlv is not None:
-            tspec = self.msrp_tspec_stlv.serialize()
-            value = value + tspec
+            length += self.msrp_tspec_stlv.encoded_length()
         elif self.token_bucket_tspec_stlv is not None:
-            tspec = self.token_bucket_tspec_stlv.serialize()
-            value = value + tspec
-
+            length += self.token_bucket_tspec_stlv.encoded_length()
         if self.redundancy_control_stlv is not None:
-            tspec = self.redundancy_control_stlv.serialize()
-            value = value + tspec
-
+            length += self.redundancy_control_stlv.encoded_length()
         if self.failure_information_stlv is not None:
-            tspec = self.failure_information_stlv.serialize()
-            value = value + tspec
-
+            length += self.failure_information_stlv.encoded_length()
         if self.interface_configuration is not None:
-            inter_conf = self.interface_configuration.serialize()
-            value = value + inter_conf
-
+            length += self.interface_configuration.encoded_length()
         if self.organizationally_defined_stlv is not None:
-            org_tlv = self.organizationally_defined_stlv.serialize()
-            value = value + org_tlv
+            length += self.organizationally_defined_stlv.encoded_length()
+        return length
 
-        length = len(value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        end = self.data_frame_parameters_stlv.pack_into(buffer, offset + self.HEADER.size)
+        if self.msrp_tspec_stlv is not None:
+            end = self.msrp_tspec_stlv.pack_into(buffer, end)
+        elif self.token_bucket_tspec_stlv is not None:
+            end = self.token_bucket_tspec_stlv.pack_into(buffer, end)
+        if self.redundancy_control_stlv is not None:
+            end = self.redundancy_control_stlv.pack_into(buffer, end)
+        if self.failure_information_stlv is not None:
+            end = self.failure_information_stlv.pack_into(buffer, end)
+        if self.interface_configuration is not None:
+            end = self.interface_configuration.pack_into(buffer, end)
+        if self.organizationally_defined_stlv is not None:
+            end = self.organizationally_defined_stlv.pack_into(buffer, end)
 
-        return TLV.encapsulate_object(self.__TYPE_ID, length, value)
+        self.HEADER.pack_into(buffer, offset, self.__TYPE_ID, end - offset - 3, self.stream_id, self.stream_rank,
+                              self.accumulated_maximum_latency)
+        return end
 
         
 
@@ -103,45 +101,32 @@ class TAA:
         """ This Method builds an object from a string"""
 
         value, rest = TLV.extract(tlv)
-        self.stream_id = value[0:8]
+        self.stream_id = bytes(value[0:8])
         self.stream_rank = value[8]
         self.accumulated_maximum_latency = int.from_bytes(value[9:13], 'big')
         self.data_frame_parameters_stlv = Data_frame_parameters_tlv()
         self.data_frame_parameters_stlv.deserialize(value[13:24])
 
-        next_index = 24
-        if value[24] == 0x22: # token bucket tspec
-            self.token_bucket_tspec_stlv = Token_bucket_tspec_tlv()
-            next_index = 43
-            self.token_bucket_tspec_stlv.deserialize(value[24:next_index], next_index)
-        elif value[24] == 0x23: # MSRP tspec
-            self.msrp_tspec_stlv = Msrp_tspec_tlv()
-            next_index = 31
-            self.msrp_tspec_stlv.deserialize(value[24:next_index])
-
-        if len(value) > next_index and value[next_index] == 0x24: # Redundancy Control
-            offset = value[next_index + 1] * 256 + value[next_index + 2] + 3
-            self.redundancy_control_stlv = Redundancy_control_tlv()
-            self.redundancy_control_stlv.deserialize(value[next_index:next_index + offset])
-            next_index += offset
-
-        if len(value) > next_index and value[next_index] == 0x26: # Failure information
-            offset = value[next_index + 1] * 256 + value[next_index + 2] + 3
-            self.failure_information_stlv = Failure_information_tlv()
-            self.failure_information_stlv.deserialize(value[next_index:next_index + offset])
-            next_index += offset
-
-        if len(value) > next_index and value[next_index] == 0xFF: # Interface Config
-            offset = value[next_index + 1] * 256 + value[next_index + 2] + 3
-            self.interface_configuration = Interface_configuration_tlv()
-            self.interface_configuration.deserialize(value[next_index:next_index + offset])
-            next_index += offset
-
-        if len(value) > next_index and value[next_index] == 0x27: # Time aware spec org tlv
-            offset = value[next_index + 1] * 256 + value[next_index + 2] + 3
-            self.organizationally_defined_stlv = Org_defined_taa_tlv()
-            self.organizationally_defined_stlv.deserialize(value[next_index:next_index + offset])
-            next_index += offset
+        for sub_tlv in TLV.split(value[24:]):
+            if sub_tlv[0] == 0x22: # token bucket tspec
+                self.token_bucket_tspec_stlv = Token_bucket_tspec_tlv()
+                self.token_bucket_tspec_stlv.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0x23: # MSRP tspec
+                self.msrp_tspec_stlv = Msrp_tspec_tlv()
+                self.msrp_tspec_stlv.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0x24: # Redundancy Control
+                self.redundancy_control_stlv = Redundancy_control_tlv()
+                self.redundancy_control_stlv.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0x26: # Failure information
+                self.failure_information_stlv = Failure_information_tlv()
+                self.failure_information_stlv.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0xFF: # Interface Config
+                self.interface_configuration = Interface_configuration_tlv()
+                self.interface_configuration.deserialize(sub_tlv)
+            elif sub_tlv[0] == 0x27: # Time aware spec org tlv
+                self.organizationally_defined_stlv = Org_defined_taa_tlv()
+                self.organizationally_defined_stlv.deserialize(sub_tlv)
+        self.invalidate()
 
     def add_failure_information(self, mac, failure_code):
         """ Add a failure information sub-TLV to TAA
@@ -150,6 +135,7 @@ class TAA:
             failure_code    is the failure code from 802.1Qcc (Table 46-15)
         """
         self.failure_information_stlv = Failure_information_tlv(mac, failure_code)
+        self.invalidate()
 
     def remove_failure_information(self):
         """ Add a failure information sub-TLV to TAA
@@ -158,23 +144,28 @@ class TAA:
             failure_code    is the failure code from 802.1Qcc (Table 46-15)
         """
         self.failure_information_stlv = None
+        self.invalidate()
 
     def add_redundancy_control(self, r_tag_status, vlan_context_list):
         """ Add a redundancy control sub-TLV to TAA for multi-context announcements
         """
 
         self.redundancy_control_stlv = Redundancy_control_tlv(r_tag_status, vlan_context_list)
+        self.invalidate()
 
     def add_interface_configuration(self, json_string):
         inter_conf = Interface_configuration_tlv()
         inter_conf.parse_from_json(json_string)
         self.interface_configuration = inter_conf
+        self.invalidate()
 
     def add_org_defined(self, org_tlv):
         self.organizationally_defined_stlv = org_tlv
+        self.invalidate()
 
     def increase_accumulated_latency(self, summand):
         self.accumulated_maximum_latency += summand
+        self.invalidate()
 
     def dump(self):
         """ Dump object to console"""
@@ -227,6 +218,10 @@ class TAA:
 
 
 class Org_defined_taa_tlv:
+    # type (1), length (2), ocid (3), interval numerator (4), interval denominator (4), earliest transmit offset (4),
+    # latest transmit offset (4), jitter (4), maximum latency (4)
+    ENCODING = struct.Struct(">BH3s6I")
+
     def __init__(self, interval_numerator=0, interval_denominator=0, earliest_transmit_offset=0, latest_transit_offset=0, jitter=0, maximum_latency=0):
         self.__TYPE_ID = 0x27
         self.ocid = bytearray.fromhex("EFEFEF")
@@ -239,13 +234,17 @@ class Org_defined_taa_tlv:
         self.maximum_latency= maximum_latency  # L = 4
 
     def serialize(self):
+        return TLV.encode(self)
 
-        value = self.ocid + self.interval_numerator.to_bytes(4, "big") + self.interval_denominator.to_bytes(4, "big") \
-                + self.earliest_transmit_offset.to_bytes(4, "big") + self.latest_transmit_offset.to_bytes(4, "big") \
-                + self.jitter.to_bytes(4, "big") \
-                + self.maximum_latency.to_bytes(4, "big")
+    def encoded_length(self):
+        return self.ENCODING.size
 
-        return TLV.encapsulate_object(self.__TYPE_ID, len(value), value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        self.ENCODING.pack_into(buffer, offset, self.__TYPE_ID, self.ENCODING.size - 3, self.ocid,
+                                self.interval_numerator, self.interval_denominator, self.earliest_transmit_offset,
+                                self.latest_transmit_offset, self.jitter, self.maximum_latency)
+        return offset + self.ENCODING.size
 
     def deserialize(self, tlv):
         value, rest = TLV.extract(tlv)
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import abc
+import struct
+
+
 class TLV:
     # Type = 1
     # Len  = 2
     # Val  = Variable 
+    HEADER = struct.Struct(">BH")
 
     def __init__(self):
         pass 
@@ -20,14 +25,65 @@ class TLV:
         s = bytearray([type, length_h, length_l]) + value
         return s
 
+    @staticmethod
+    def encode(tlv_object):
+        """ Serialize an object providing encoded_length() and pack_into(buffer, offset), which returns the offset
+        behind the packed TLV. The byte array is allocated once with the final length and the object and its
+        sub-TLVs are packed into it. Fixed size TLVs pack header and value with one struct, TLVs with sub-TLVs
+        pack the sub-TLVs first and their header last, when the length is known """
+        buffer = bytearray(tlv_object.encoded_length())
+        tlv_object.pack_into(buffer, 0)
+        return buffer
+
     @staticmethod
     def extract(tlv):
-        """ Return the value of the given TLV as a byte string"""
+        """ Return the value of the given TLV and the bytes following it.
+        Both are memoryviews into tlv, so nested TLVs are decoded without copying. A decoder has to copy the
+        fields it keeps, the buffer of tlv may be reused after decoding """
+        if not isinstance(tlv, memoryview):
+            tlv = memoryview(tlv)
         length = tlv[1] * 256 + tlv[2]
         
         # @TODO add sanity checks
 
         return tlv[3:length + 3], tlv[length + 3 :]
 
+    @staticmethod
+    def split(tlvs):
+        """ Return the consecutive TLVs of tlvs as memoryviews into it """
+        if not isinstance(tlvs, memoryview):
+            tlvs = memoryview(tlvs)
+        result = []
+        offset = 0
+        while offset + 3 <= len(tlvs):
+            end = offset + 3 + tlvs[offset + 1] * 256 + tlvs[offset + 2]
+            result.append(tlvs[offset:end])
+            offset = end
+        return result
+
+
+class CachedTLV(abc.ABC):
+    """ Base of the attributes which cache their encoding, see cached_encoding.
+    The methods changing an attribute call invalidate(). Sub-TLVs are not changed in place, the add_... methods
+    of the attribute replace them and list fields hold tuples. A field assigned directly has to be followed by
+    invalidate()
+    """
+    _encoding = None  # bytes of the last encoding, None if the attribute changed since
+
+    @abc.abstractmethod
+    def encoded_length(self) -> int:
+        """ Return the length of the TLV including its header """
+
+    @abc.abstractmethod
+    def pack_into(self, buffer, offset) -> int:
+        """ Pack the TLV into buffer at offset and return the offset behind it """
 
+    def invalidate(self):
+        """ Drop the cached encoding after a change of the attribute """
+        self._encoding = None
 
+    def cached_encoding(self) -> bytes:
+        """ Return the encoding of the attribute, encoded again only after invalidate() """
+        if self._encoding is None:
+            self._encoding = bytes(TLV.encode(self))
+        return self._encoding
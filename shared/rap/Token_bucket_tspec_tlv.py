@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import struct
+
 from .TLV import TLV
 
 class Token_bucket_tspec_tlv:
+    # type (1), length (2), max frame size (2), min frame size (2), committed information rate (8),
+    # committed burst size (4)
+    ENCODING = struct.Struct(">BHHHQI")
+
     def __init__(self, max_trans_frame_size = 0, min_trans_frame_size = 0, commited_information_rate = 0, commited_burst_size = 0):
         self.__TYPE_ID = 0x22
 
@@ -26,12 +32,16 @@ class Token_bucket_tspec_tlv:
 
     def serialize(self):
         """ This method serializes the object to string"""
-         
-        value = self.max_trans_frame_size.to_bytes(2, "big") + self.min_trans_frame_size.to_bytes(2, "big") + self.commited_information_rate.to_bytes(8,"big") + self.commited_burst_size.to_bytes(4, "big")
-        
-        lenght = len(value)
+        return TLV.encode(self)
+
+    def encoded_length(self):
+        return self.ENCODING.size
 
-        return TLV.encapsulate_object(self.__TYPE_ID, lenght, value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        self.ENCODING.pack_into(buffer, offset, self.__TYPE_ID, self.ENCODING.size - 3, self.max_trans_frame_size,
+                                self.min_trans_frame_size, self.commited_information_rate, self.commited_burst_size)
+        return offset + self.ENCODING.size
 
     def deserialize(self, tlv):
         """ This method builds an object from a string"""
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import struct
+
 from .TLV import TLV
 from .Failure_code import Failure_code
 from .Failure_information_tlv import Failure_information_tlv
 
 
 class Vlan_context_tlv:
+    # type (1), length (2), vlan id (12 bit), padding (4 bit), followed by the sub-TLVs
+    HEADER = struct.Struct(">BHH")
+
     def __init__(self, vlan_id= 0x000):
         self.__TYPE_ID = 0x25
         
@@ -17,22 +22,22 @@ class Vlan_context_tlv:
         self.failure_information_stlv = None  # L = 0 | 9
 
     def serialize(self):
-        vlan_id_formated = self.vlan_id << 4 
-        vlan_id_bytes = bytearray(2)
-        vlan_id_bytes[0] = int(vlan_id_formated / 256)
-        vlan_id_bytes[1] = vlan_id_formated % 256
-
-        length = len(vlan_id_bytes)
-        value = vlan_id_bytes 
+        return TLV.encode(self)
 
-        if self.failure_information_stlv is not None: 
-            failure_bytes = self.failure_information_stlv.serialize()        
-            length = length + len(failure_bytes)
-            value = value +  failure_bytes
+    def encoded_length(self):
+        length = self.HEADER.size
+        if self.failure_information_stlv is not None:
+            length += self.failure_information_stlv.encoded_length()
+        return length
 
-        tlv = TLV.encapsulate_object(self.__TYPE_ID, length, value)
+    def pack_into(self, buffer, offset):
+        """ Pack the TLV into buffer at offset and return the offset behind it """
+        end = offset + self.HEADER.size
+        if self.failure_information_stlv is not None:
+            end = self.failure_information_stlv.pack_into(buffer, end)
 
-        return tlv
+        self.HEADER.pack_into(buffer, offset, self.__TYPE_ID, end - offset - 3, self.vlan_id << 4)
+        return end
 
     def deserialize(self, tlv):
         value, rest = TLV.extract(tlv)
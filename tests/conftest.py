@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# The modules of the cuc import each other relative to cuc/ and the shared modules relative to the repository
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "cuc"))
+
+# The modules log to files next to them, the tests write them to a temporary directory instead
+os.environ.setdefault("CUC_LOG_DIR", tempfile.mkdtemp(prefix="cuc_test_logs_"))
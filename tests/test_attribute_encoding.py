@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" TAA and LAA cache their encoding until one of their methods changes them """
+
+import copy
+import json
+
+import pytest
+
+from shared.rap.TLV import TLV, CachedTLV
+from shared.rap.TAA import TAA
+from shared.rap.LAA import LAA
+from shared.rap.Msrp_tspec_tlv import Msrp_tspec_tlv
+from shared.rap.Vlan_context_tlv import Vlan_context_tlv
+from shared.rap.Listener_status import Listener_status
+from shared.rap.Failure_code import Failure_code
+
+STREAM_ID = "00-11-22-33-44-55:00-01"
+MAC = "00-11-22-33-44-55"
+INTERFACE_CONFIGURATION = json.dumps({"mac-address": MAC, "interface-name": "", "config-list": [
+    {"ieee802-mac-addresses": {"destination-mac-address": "01-00-5e-00-00-01", "source-mac-address": MAC}},
+    {"ieee802-vlan-tag": {"priority-code-point": 3, "vlan-id": 10}},
+]})
+
+
+def assert_encoding_is_current(attribute):
+    assert attribute.serialize() == bytes(TLV.encode(attribute))
+
+
+def test_unchanged_attribute_is_encoded_once():
+    taa = TAA(stream_id=STREAM_ID, msrp_tspec=Msrp_tspec_tlv())
+    assert taa.serialize() is taa.serialize()
+
+
+@pytest.mark.parametrize("change", [
+    lambda taa: taa.increase_accumulated_latency(10),
+    lambda taa: taa.add_failure_information(mac=MAC, failure_code=Failure_code.ERROR),
+    lambda taa: taa.add_redundancy_control(True, [Vlan_context_tlv()]),
+    lambda taa: taa.add_interface_configuration(INTERFACE_CONFIGURATION),
+    lambda taa: taa.deserialize(TAA(stream_id="00-11-22-33-44-55:00-02", msrp_tspec=Msrp_tspec_tlv()).serialize()),
+])
+def test_taa_methods_invalidate_encoding(change):
+    taa = TAA(stream_id=STREAM_ID, msrp_tspec=Msrp_tspec_tlv())
+    before = taa.serialize()
+    change(taa)
+    assert taa.serialize() != before
+    assert_encoding_is_current(taa)
+
+
+@pytest.mark.parametrize("change", [
+    lambda laa: laa.update_status(Listener_status.READY),
+    lambda laa: laa.add_failure_information(mac=MAC, failure_code=Failure_code.ERROR),
+    lambda laa: laa.add_interface_configuration(INTERFACE_CONFIGURATION),
+])
+def test_laa_methods_invalidate_encoding(change):
+    laa = LAA(stream_id=STREAM_ID)
+    before = laa.serialize()
+    change(laa)
+    assert laa.serialize() != before
+    assert_encoding_is_current(laa)
+
+
+def test_removed_failure_information_is_not_encoded():
+    taa = TAA(stream_id=STREAM_ID, msrp_tspec=Msrp_tspec_tlv())
+    before = taa.serialize()
+    taa.add_failure_information(mac=MAC, failure_code=Failure_code.ERROR)
+    assert taa.serialize() != before
+    taa.remove_failure_information()
+    assert taa.serialize() == before
+
+
+def test_vlan_contexts_can_not_be_changed_in_place():
+    taa = TAA(stream_id=STREAM_ID, msrp_tspec=Msrp_tspec_tlv())
+    taa.add_redundancy_control(True, [Vlan_context_tlv()])
+    with pytest.raises(AttributeError):
+        taa.redundancy_control_stlv.vlan_context_stlv_list.append(Vlan_context_tlv())
+
+    decoded = TAA()
+    decoded.deserialize(taa.serialize())
+    assert isinstance(decoded.redundancy_control_stlv.vlan_context_stlv_list, tuple)
+    assert decoded.serialize() == taa.serialize()
+
+
+def test_copy_keeps_encoding_until_changed():
+    taa = TAA(stream_id=STREAM_ID, msrp_tspec=Msrp_tspec_tlv())
+    encoding = taa.serialize()
+    taa_copy = copy.deepcopy(taa)
+    assert taa_copy.serialize() == encoding
+
+    taa_copy.increase_accumulated_latency(10)
+    assert_encoding_is_current(taa_copy)
+    assert taa.serialize() == encoding
+
+
+def test_cached_tlv_requires_encoding_methods():
+    class Incomplete(CachedTLV):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
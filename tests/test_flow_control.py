@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Tasks sending to each other must not block on each other's full queue """
+
+import threading
+
+from cnc_connector.cnc_connector_lib import CncConnectorStubSM
+from protocol_connector.rap_cuc_lib import RapCucSM, StreamRegister
+from stream_management.sml_lib import StreamManagementSM
+from shared.aux.flowControl import SendBacklog
+from shared.aux.logger import Logger
+from shared.aux.msgQueue import MsgQueue
+from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgType import MsgType
+from shared.aux.task import Task
+from shared.qcc.tsn_types import Listener
+from shared.rap.Msrp_tspec_tlv import Msrp_tspec_tlv
+from shared.rap.TAA import TAA, Org_defined_taa_tlv
+
+QUEUE_SIZE = 4
+REQUESTS = 10
+
+logger = Logger(__file__ + ".log").get_logger()
+
+
+def rap_cuc(queue):
+    rap_cuc = RapCucSM.__new__(RapCucSM)
+    rap_cuc.queue_register = {"rap_participants": queue}
+    rap_cuc.stream_register = StreamRegister()
+    rap_cuc.participant_backlog = SendBacklog(queue, "rap_cuc")
+    return rap_cuc
+
+
+def talker(vlan_id):
+    return TAA(stream_id="00-11-22-33-44-55:00-%02x" % vlan_id, vlan_id=vlan_id)
+
+
+def requirements(vlan_id):
+    """ Return the talker and listener requirement of a stream, which make the stream management request it """
+    taa = TAA(stream_id=talker(vlan_id).get_stream_id(), vlan_id=vlan_id, msrp_tspec=Msrp_tspec_tlv(),
+              organizationally_defined=Org_defined_taa_tlv(maximum_latency=1000))
+    listener_mac = "00-00-00-00-01-%02x" % vlan_id
+    listener = Listener({"index": 0, "end-station-interfaces": [{"mac-address": listener_mac, "interface-name": ""}]})
+    return [
+        MsgQueuePacket(MsgType.PC_REG_TALKER_REQUIREMENT_IND,
+                       {"stream_id": taa.get_stream_id(), "mac": taa.get_mac(),
+                        "talker": RapCucSM.build_qcc_talker(None, taa)}),
+        MsgQueuePacket(MsgType.PC_REG_LISTENER_REQUIREMENT_IND,
+                       {"stream_id": taa.get_stream_id(), "mac": listener_mac, "listener": listener}),
+    ]
+
+
+def declare_all(rap_cuc):
+    for vlan_id in range(REQUESTS):
+        rap_cuc.declare_attribute(participantId=1, attribute=talker(vlan_id))
+
+
+def test_declarations_do_not_block_on_full_queue():
+    queue = MsgQueue("rap_participants", logger, maxsize=QUEUE_SIZE)
+    sm = rap_cuc(queue)
+
+    producer = threading.Thread(target=declare_all, args=[sm], daemon=True)
+    producer.start()
+    producer.join(timeout=2)
+    assert not producer.is_alive()
+
+    assert queue.qsize() == QUEUE_SIZE
+    assert len(sm.participant_backlog) == REQUESTS - QUEUE_SIZE
+    assert sm.participant_backlog.overflows == 1
+    assert sm.service_timers() is not None
+
+    received = []
+    while len(received) < REQUESTS:
+        received += queue.get_batch(QUEUE_SIZE, 0)
+        sm.service_timers()
+    assert sm.service_timers() is None
+    assert [q_pckt.msg_type for q_pckt in received] == [MsgType.RPSI_DECLARE_REQ] * REQUESTS
+    assert [q_pckt.message["attribute"].get_stream_id() for q_pckt in received] == \
+        [talker(vlan_id).get_stream_id() for vlan_id in range(REQUESTS)]
+
+
+def test_task_sends_held_back_requests_when_idle():
+    queue = MsgQueue("rap_participants", logger, maxsize=QUEUE_SIZE)
+    sm = rap_cuc(queue)
+    sm.states = {}
+    declare_all(sm)
+
+    Task("protocol_connector", batch_size=16).run_task_as_thread(sm)
+    received = []
+    while len(received) < REQUESTS:
+        received += queue.get_batch(QUEUE_SIZE, 2)
+    assert len(received) == REQUESTS
+    assert not sm.participant_backlog
+
+
+def run_to_completion(target, *args):
+    """ Run target in a thread and return whether it returned without blocking """
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    thread.join(timeout=2)
+    return not thread.is_alive()
+
+
+def full_queue(name):
+    queue = MsgQueue(name, logger, maxsize=QUEUE_SIZE)
+    while queue.qsize() < QUEUE_SIZE:
+        queue.send_msg(MsgQueuePacket(MsgType.CC_ADD_STREAM_REQ, {}), sender_name="other")
+    return queue
+
+
+def test_stream_management_does_not_block_on_full_cnc_connector_queue():
+    queue_register = {
+        "protocol_connector": MsgQueue("protocol_connector", logger, maxsize=0),
+        "stream_management": MsgQueue("stream_management", logger, maxsize=QUEUE_SIZE),
+        "cnc_connector": full_queue("cnc_connector"),
+    }
+    sml = StreamManagementSM(queue_register)
+
+    def register_all():
+        for vlan_id in range(REQUESTS):
+            for q_pckt in requirements(vlan_id):
+                sml.states[q_pckt.msg_type](q_pckt)
+
+    assert run_to_completion(register_all)
+    assert len(sml.cnc_backlog) == REQUESTS
+    assert sml.service_timers() is not None
+
+    received = []
+    while len(received) < REQUESTS:
+        received += [q_pckt for q_pckt in queue_register["cnc_connector"].get_batch(QUEUE_SIZE, 0)
+                     if q_pckt.sender == "sml"]
+        sml.service_timers()
+    assert sml.service_timers() is None
+    assert [q_pckt.message["stream_id"] for q_pckt in received] == \
+        [talker(vlan_id).get_stream_id() for vlan_id in range(REQUESTS)]
+
+
+def test_cnc_connector_does_not_block_on_full_stream_management_queue():
+    queue_register = {"stream_management": full_queue("stream_management")}
+    cnc = CncConnectorStubSM(queue_register)
+
+    def add_all():
+        for vlan_id in range(REQUESTS):
+            talker_ind, listener_ind = requirements(vlan_id)
+            cnc.add_stream(MsgQueuePacket(MsgType.CC_ADD_STREAM_REQ, {
+                "stream_id": talker_ind.message["stream_id"], "talker_req": talker_ind.message["talker"],
+                "listener_reqs": [listener_ind.message["listener"]]}))
+
+    assert run_to_completion(add_all)
+    assert len(cnc.sml_backlog) == REQUESTS
+    while cnc.service_timers() is not None:
+        queue_register["stream_management"].get_batch(QUEUE_SIZE, 0)
+    assert not cnc.sml_backlog
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" In-process connections wake up the selector of the LRP worker like sockets """
+
+import selectors
+
+from protocol_connector.lrp_transport import open_listener, connect
+
+PORT = {"inprocName": "test_inproc_transport", "transport": "inproc"}
+
+
+def test_selector_wakes_up_on_connection_and_data():
+    listener = open_listener(PORT)
+    selector = selectors.DefaultSelector()
+    try:
+        client = connect(PORT)
+        selector.register(listener, selectors.EVENT_READ)
+        assert [key.fileobj for key, _ in selector.select(1)] == [listener]
+
+        connection, _ = listener.accept()
+        selector.unregister(listener)
+        selector.register(connection, selectors.EVENT_READ)
+        assert selector.select(0) == []
+        client.sendall(b"\x01\x00\x00\x00")
+        client.sendall(b"\x02\x00\x00\x00")
+        assert [key.fileobj for key, _ in selector.select(1)] == [connection]
+        assert connection.recv(64) == b"\x01\x00\x00\x00\x02\x00\x00\x00"
+        assert selector.select(0) == []
+        client.close()
+        connection.close()
+    finally:
+        selector.close()
+        listener.close()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Latency statistics can be read while tasks record them """
+
+from shared.aux import latencyStats
+from shared.aux.latencyStats import LatencyRecorder
+from shared.aux.msgType import MsgType
+
+
+def test_snapshot_while_first_message_of_type_is_recorded(monkeypatch):
+    recorder = LatencyRecorder()
+    snapshots = []
+
+    class SnapshotOnCreation(latencyStats.LogHistogram):
+        # Another thread takes a snapshot whenever the recording thread creates a histogram
+        def __init__(self):
+            super().__init__()
+            snapshots.append(recorder.snapshot())
+
+    monkeypatch.setattr(latencyStats, "LogHistogram", SnapshotOnCreation)
+    recorder.record("protocol_connector", MsgType.RPSI_REGISTER_IND, 0.001, 0.002)
+
+    assert snapshots == [{}, {}]
+    stats = recorder.snapshot()["protocol_connector"]["RPSI_REGISTER_IND"]
+    assert stats["queue_wait"]["count"] == 1
+    assert stats["handler"]["count"] == 1
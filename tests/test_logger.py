@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Log messages are merged in the background writer, with the arguments as they were when logged """
+
+import logging
+
+from shared.aux.logger import _LazyQueueHandler
+from shared.aux.msgType import MsgType
+
+
+class Unknown:
+    def __init__(self):
+        self.state = "logged"
+
+    def __str__(self):
+        return self.state
+
+
+def prepared(msg, *args):
+    record = logging.LogRecord("cuc.test", logging.INFO, __file__, 1, msg, args, None)
+    return _LazyQueueHandler(None).prepare(record)
+
+
+def test_immutable_arguments_are_merged_later():
+    record = prepared("%s: %s of %s", "rap_participants_queue", MsgType.RPSI_DECLARE_REQ, 3)
+    assert record.msg == "%s: %s of %s"
+    assert record.getMessage() == "rap_participants_queue: %s of 3" % MsgType.RPSI_DECLARE_REQ
+
+
+def test_mutable_arguments_are_copied():
+    records = [1, 2]
+    stats = {"sent": 1}
+    record = prepared("%s %s", records, stats)
+    records.append(3)
+    stats["sent"] = 2
+    assert record.msg == "%s %s"
+    assert record.getMessage() == "[1, 2] {'sent': 1}"
+
+
+def test_other_objects_are_merged_at_once():
+    unknown = Unknown()
+    record = prepared("state %s %s", 1, unknown)
+    unknown.state = "changed"
+    assert record.args is None
+    assert record.getMessage() == "state 1 logged"
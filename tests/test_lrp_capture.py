@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Captured records are dumped to files the analyzer reads back """
+
+import struct
+
+from protocol_connector.lrp_capture import LrpCapture, EVENT_PORTAL, EVENT_IN, EVENT_OUT
+from tools.lrp_capture_analyzer import read_capture
+
+PORTAL = "7"
+
+
+def test_received_records_are_not_copied():
+    capture = LrpCapture(ring_bytes=1 << 20)
+    chunk = memoryview(bytes(range(16)))
+    records = [(1, chunk[4:8]), (2, chunk[12:16])]
+    capture.open(PORTAL, "peer").received(records)
+
+    payloads = [entry[3] for entry in capture.rings[PORTAL].entries]
+    assert all(payload is data for payload, (_, data) in zip(payloads, records))
+
+
+def test_record_above_short_length_is_dumped(tmp_path):
+    capture = LrpCapture(ring_bytes=1 << 20)
+    capture.configure(1 << 20, str(tmp_path))
+    ring = capture.open(PORTAL, "peer")
+    data = bytes(70000)
+    ring.received([(1, memoryview(data))])
+    ring.sent(bytes([2]) + data)
+
+    entries = read_capture(capture.dump())
+    assert [(event, record_number, len(payload)) for _, _, event, record_number, payload in entries] == \
+        [(EVENT_PORTAL, 0, 4), (EVENT_IN, 1, len(data)), (EVENT_OUT, 2, len(data))]
+
+
+def test_version_1_capture_is_read(tmp_path):
+    path = tmp_path / "v1.bin"
+    path.write_bytes(b"LRPCAP01" + struct.pack(">dIBBH", 1.0, 7, EVENT_IN, 3, 2) + b"\x01\x02")
+    assert read_capture(str(path)) == [(1.0, 7, EVENT_IN, 3, b"\x01\x02")]
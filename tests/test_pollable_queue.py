@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" PollableQueue serves the generic queue interface of the tasks """
+
+import threading
+
+from shared.aux.logger import Logger
+from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgType import MsgType
+from shared.aux.pollableQueue import PollableQueue
+
+logger = Logger(__file__ + ".log").get_logger()
+
+
+def test_get_msg_blocks_until_message_arrives():
+    queue = PollableQueue("lrp_dummy", logger)
+    received = []
+    consumer = threading.Thread(target=lambda: received.append(queue.get_msg()), daemon=True)
+    consumer.start()
+    consumer.join(timeout=0.1)
+    assert consumer.is_alive()
+
+    q_pckt = MsgQueuePacket(MsgType.LRP_WRITE_RECORD_REQ, {})
+    queue.send_msg(q_pckt, sender_name="rap_participant")
+    consumer.join(timeout=2)
+    assert received == [q_pckt]
+
+
+def test_get_msg_without_blocking_returns_none_from_empty_queue():
+    queue = PollableQueue("lrp_dummy", logger)
+    assert queue.get_msg(blocking=False) is None
+
+    q_pckt = MsgQueuePacket(MsgType.LRP_WRITE_RECORD_REQ, {})
+    queue.send_msg(q_pckt, sender_name="rap_participant")
+    assert queue.get_msg(blocking=False) is q_pckt
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" A portal closed by its peer is forgotten by the LRP-Dummy and indicated to the RAP participants """
+
+import asyncio
+import socket
+from collections import OrderedDict
+
+from protocol_connector.lrp_dummy_lib import LrpWorker, AsyncLrpDummy, PortalIdAllocator
+from shared.aux.logger import Logger
+from shared.aux.msgQueue import MsgQueue
+from shared.aux.msgQueuePacket import MsgQueuePacket
+from shared.aux.msgType import MsgType
+
+PARTICIPANT = 0
+
+logger = Logger(__file__ + ".log").get_logger()
+
+
+def indications(queue):
+    return [queue.get_msg() for _ in range(queue.qsize())]
+
+
+def portal_status(q_pckts):
+    return [(q_pckt.message["portalId"], q_pckt.message["associationStatus"]) for q_pckt in q_pckts
+            if q_pckt.msg_type == MsgType.LRP_PORTAL_STATUS_IND]
+
+
+def write_request(portal_id):
+    return MsgQueuePacket(MsgType.LRP_WRITE_RECORD_REQ, {"portalId": portal_id, "recordNo": 1, "data": bytearray()})
+
+
+def test_closed_portal_is_indicated():
+    queue = MsgQueue("rap_participants", logger, maxsize=0)
+    worker = LrpWorker({"rap_participants": queue}, "lrp_dummy", PortalIdAllocator(), {})
+    connection, peer = socket.socketpair()
+    portal_id = "1"
+    worker.portalIdtoSocketMapping[portal_id] = connection
+    worker.socketPortalIdMapping[connection] = portal_id
+    worker.applicant_db[portal_id] = OrderedDict()
+    worker.receive_buffers[portal_id] = bytearray()
+    worker.record_ranks[portal_id] = {}
+    peer.close()
+
+    worker.read(connection, 0)
+    worker.selector.close()
+
+    assert connection.fileno() == -1
+    assert portal_status(indications(queue)) == [(portal_id, "disconnected")]
+    assert not worker.portalIdtoSocketMapping and not worker.socketPortalIdMapping
+
+
+def test_async_portal_is_cleaned_up_on_eof():
+    queue = MsgQueue("rap_participants", logger, maxsize=0)
+
+    async def connect_and_close():
+        lrp_dummy = AsyncLrpDummy({"rap_participants": queue})
+        served = []
+
+        def client_connected(reader, writer):
+            served.append(writer)
+            return lrp_dummy.serve_portal(reader, writer, PARTICIPANT)
+
+        server = await asyncio.start_server(client_connected, host="127.0.0.1", port=0)
+        _, client = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        client.close()
+        for _ in range(100):
+            if served and not lrp_dummy.portalIdtoSocketMapping:
+                break
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+        return lrp_dummy, served[0]
+
+    lrp_dummy, writer = asyncio.run(connect_and_close())
+
+    assert writer.is_closing()
+    assert not lrp_dummy.portalIdtoSocketMapping and not lrp_dummy.portal_workers
+    assert lrp_dummy.stats["portals_closed"] == 1
+    q_pckts = indications(queue)
+    portal_id = q_pckts[0].message["portalId"]
+    assert portal_status(q_pckts) == [(portal_id, "disconnected")]
+
+    # A write racing with the close is dropped
+    lrp_dummy.write_record(write_request(portal_id))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Records an end station announces again unchanged are not decoded and not indicated to the rap cuc """
+
+from protocol_connector.rap_participant import RapParticipant
+from shared.aux.logger import Logger
+from shared.aux.msgQueue import MsgQueue
+from shared.aux.msgType import MsgType
+from shared.rap.Msrp_tspec_tlv import Msrp_tspec_tlv
+from shared.rap.TAA import TAA, Org_defined_taa_tlv
+
+PORTAL = "1"
+RECORD_NO = 3
+
+logger = Logger(__file__ + ".log").get_logger()
+
+
+def talker(latency=0):
+    taa = TAA(stream_id="00-11-22-33-44-55:00-01", msrp_tspec=Msrp_tspec_tlv(),
+              organizationally_defined=Org_defined_taa_tlv(maximum_latency=1000))
+    taa.increase_accumulated_latency(latency)
+    return bytes(taa.serialize())
+
+
+def participant():
+    return RapParticipant(participantId=0, localTargetPortInfo={}, lrp_queue=MsgQueue("lrp_dummy", logger),
+                          protocol_connector_queue=MsgQueue("protocol_connector", logger, maxsize=0),
+                          portalId=PORTAL)
+
+
+def receive(rapp, data):
+    """ Pass a received record to the participant and return the types of the indications to the rap cuc """
+    rapp.deserialize_attribute({"portalId": PORTAL, "recordNo": RECORD_NO, "data": memoryview(data)})
+    queue = rapp.protocol_connector_queue
+    return [queue.get_msg().msg_type for _ in range(queue.qsize())]
+
+
+def test_unchanged_record_is_not_decoded(monkeypatch):
+    rapp = participant()
+    assert receive(rapp, talker()) == [MsgType.RPSI_REGISTER_IND]
+
+    decoded = []
+    deserialize = TAA.deserialize
+    monkeypatch.setattr(TAA, "deserialize", lambda taa, tlv: decoded.append(tlv) or deserialize(taa, tlv))
+    assert receive(rapp, talker()) == []
+    assert decoded == []
+
+    assert receive(rapp, talker(latency=10)) == [MsgType.RPSI_REGISTER_IND]
+    assert len(decoded) == 1
+
+
+def test_record_announced_again_after_withdrawal_is_registered():
+    rapp = participant()
+    assert receive(rapp, talker()) == [MsgType.RPSI_REGISTER_IND]
+    assert receive(rapp, b"") == [MsgType.RPSI_DEREGISTER_IND]
+    assert receive(rapp, talker()) == [MsgType.RPSI_REGISTER_IND]
+
+
+def test_record_announced_again_after_disconnection_is_registered():
+    rapp = participant()
+    rapp.portalCreated = True
+    assert receive(rapp, talker()) == [MsgType.RPSI_REGISTER_IND]
+    rapp.processPortalStatusInd({"portalId": PORTAL, "associationStatus": "disconnected"})
+    rapp.protocol_connector_queue.get_msg()
+    assert receive(rapp, talker()) == [MsgType.RPSI_REGISTER_IND]
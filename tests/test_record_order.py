@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Records of one portal must not be reordered by the stream rank of their attributes """
+
+from protocol_connector.lrp_dummy_lib import LrpWorker, PortalIdAllocator
+from shared.aux.logger import Logger
+from shared.aux.msgQueue import MsgQueue
+from shared.aux.msgQueuePacket import MsgQueuePacket, RANK_EMERGENCY, RANK_NON_EMERGENCY
+from shared.aux.msgType import MsgType
+from shared.aux.rankQueue import RankedDeque
+from shared.rap.Attribute_list import Attribute_list
+from shared.rap.LAA import LAA
+from shared.rap.TAA import TAA
+
+PORTAL = "1"
+OTHER_PORTAL = "2"
+
+logger = Logger(__file__ + ".log").get_logger()
+
+
+def emergency_talker():
+    return bytes(TAA(stream_id="00-11-22-33-44-55:00-01", stream_rank=RANK_EMERGENCY).serialize())
+
+
+def listener():
+    return bytes(LAA(stream_id="00-11-22-33-44-55:00-02").serialize())
+
+
+def declaration(record_number, data):
+    return bytes([record_number]) + data
+
+
+def withdrawal(record_number):
+    return bytes([record_number, 0, 0, 0])
+
+
+def lrp_worker(queue):
+    worker = LrpWorker({"rap_participants": queue}, "lrp_dummy", PortalIdAllocator(), {})
+    for portal_id in (PORTAL, OTHER_PORTAL):
+        worker.record_ranks[portal_id] = {}
+    return worker
+
+
+def received(queue):
+    """ Return (portal id, record number, data) of the indicated records in the order they are served """
+    records = []
+    while queue.qsize():
+        message = queue.get_msg().message
+        for record_number, data in message.get("records", [(message.get("recordNo"), message.get("data"))]):
+            records.append((message["portalId"], record_number, bytes(data)))
+    return records
+
+
+def test_emergency_packet_does_not_overtake_packet_with_same_order_key():
+    queue = RankedDeque()
+    first = MsgQueuePacket(MsgType.LRP_RECORD_WRITTEN_IND, "first", RANK_NON_EMERGENCY, order_key=PORTAL)
+    other = MsgQueuePacket(MsgType.LRP_RECORD_WRITTEN_IND, "other", RANK_EMERGENCY, order_key=OTHER_PORTAL)
+    second = MsgQueuePacket(MsgType.LRP_RECORD_WRITTEN_IND, "second", RANK_EMERGENCY, order_key=PORTAL)
+    for q_pckt in (first, other, second):
+        queue.append(q_pckt)
+
+    assert [queue.popleft().message for _ in range(3)] == ["other", "first", "second"]
+    assert not queue.normal_keys
+
+
+def test_withdrawal_keeps_order_of_emergency_records():
+    queue = MsgQueue("rap_participants", logger, maxsize=0)
+    worker = lrp_worker(queue)
+    # declare, withdraw and declare again, each record received by another read
+    for record in (declaration(1, emergency_talker()), withdrawal(1), declaration(1, emergency_talker())):
+        worker.receive_chunk(PORTAL, record, bytearray())
+
+    assert [data for _, _, data in received(queue)] == [emergency_talker(), b"", emergency_talker()]
+
+
+def test_records_of_portal_are_not_reordered_by_rank():
+    queue = MsgQueue("rap_participants", logger, maxsize=0)
+    worker = lrp_worker(queue)
+    worker.receive_chunk(PORTAL, declaration(1, listener()), bytearray())
+    worker.receive_chunk(OTHER_PORTAL, declaration(1, listener()), bytearray())
+    worker.receive_chunk(PORTAL, declaration(2, emergency_talker()), bytearray())
+    worker.receive_chunk(OTHER_PORTAL, declaration(2, emergency_talker()), bytearray())
+
+    records = received(queue)
+    assert [record_number for portal_id, record_number, _ in records if portal_id == PORTAL] == [1, 2]
+    assert [record_number for portal_id, record_number, _ in records if portal_id == OTHER_PORTAL] == [1, 2]
+
+
+def test_rank_of_attribute_list_and_its_withdrawal():
+    queue = MsgQueue("rap_participants", logger, maxsize=0)
+    worker = lrp_worker(queue)
+    attribute_list = Attribute_list.pack([listener(), emergency_talker()])
+
+    assert worker.record_rank(PORTAL, 1, attribute_list) == RANK_EMERGENCY
+    assert worker.record_rank(PORTAL, 1, b"") == RANK_EMERGENCY
+    assert worker.record_rank(PORTAL, 1, b"") == RANK_NON_EMERGENCY
+    assert worker.record_rank(PORTAL, 2, listener()) == RANK_NON_EMERGENCY
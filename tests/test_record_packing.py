@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Attributes packed into one record reach the wire with the last content of the record """
+
+import socket
+from collections import OrderedDict
+
+import pytest
+
+from protocol_connector import rap_participant
+from protocol_connector.lrp_dummy_lib import LrpWorker, PortalIdAllocator
+from protocol_connector.rap_participant import RapParticipant
+from shared.aux.logger import Logger
+from shared.aux.msgQueue import MsgQueue
+from shared.aux.msgQueuePacket import RANK_EMERGENCY, RANK_NON_EMERGENCY
+from shared.aux.msgType import MsgType
+from shared.rap.Attribute_list import Attribute_list
+from shared.rap.TAA import TAA
+
+PORTAL = "1"
+RECORD_SIZE = 1400
+
+logger = Logger(__file__ + ".log").get_logger()
+
+
+def talker(stream_id, rank):
+    return TAA(stream_id=stream_id, stream_rank=rank)
+
+
+def participant(record_size=RECORD_SIZE):
+    return RapParticipant(participantId=0, localTargetPortInfo={}, lrp_queue=MsgQueue("lrp_dummy", logger, maxsize=0),
+                          protocol_connector_queue=MsgQueue("protocol_connector", logger, maxsize=0),
+                          portalId=PORTAL, targetRecordSize=record_size)
+
+
+def test_lower_rank_attribute_added_to_open_record_reaches_wire():
+    rapp = participant()
+    lrp_queue = rapp.lrp_queue
+    talker_b = talker("00-11-22-33-44-55:00-0b", RANK_NON_EMERGENCY)
+    talker_a = talker("00-11-22-33-44-55:00-0a", RANK_EMERGENCY)
+    rapp.declare_attribute(talker_b)
+    rapp.declare_attribute(talker_a)
+    assert rapp.attributeIdToRecordNoMapping[rapp.generate_attribute_id(talker_a)] == \
+        rapp.attributeIdToRecordNoMapping[rapp.generate_attribute_id(talker_b)]
+
+    connection, peer = socket.socketpair()
+    worker = LrpWorker({}, "lrp_dummy", PortalIdAllocator(), {})
+    worker.portalIdtoSocketMapping[PORTAL] = connection
+    worker.socketPortalIdMapping[connection] = PORTAL
+    worker.applicant_db[PORTAL] = OrderedDict()
+    try:
+        while lrp_queue.qsize():
+            worker.write_record(lrp_queue.get_msg())
+        worker.write(connection, 0)
+        wire = peer.recv(65536)
+    finally:
+        worker.selector.close()
+        connection.close()
+        peer.close()
+
+    record_number = rapp.attributeIdToRecordNoMapping[rapp.generate_attribute_id(talker_a)]
+    expected = Attribute_list.pack([bytes(talker_b.serialize()), bytes(talker_a.serialize())])
+    assert wire == bytes([record_number]) + expected
+
+
+@pytest.mark.parametrize("data", [
+    bytes([Attribute_list.TYPE_ID]),
+    bytes([Attribute_list.TYPE_ID, 0, 10, 0x01, 0, 40]),
+    bytes([0x01, 0, 2, 0]),
+])
+def test_malformed_record_is_dropped(data):
+    rapp = participant()
+    record = bytes(talker("00-11-22-33-44-55:00-0a", RANK_NON_EMERGENCY).serialize())
+    queue = rapp.protocol_connector_queue
+    for received in (record, data):
+        rapp.deserialize_attribute({"portalId": PORTAL, "recordNo": 1, "data": memoryview(received)})
+    assert [queue.get_msg().msg_type for _ in range(queue.qsize())] == [MsgType.RPSI_REGISTER_IND]
+    assert len(rapp.registrationList) == 1
+
+
+def test_full_records_refuse_declarations(monkeypatch):
+    monkeypatch.setattr(rap_participant, "MAX_RECORD_NO", 1)
+    monkeypatch.setattr(rap_participant, "MAX_RECORD_SIZE", 600)
+    rapp = participant(record_size=1)
+    talkers = [talker("00-11-22-33-44-55:%02x-00" % index, RANK_NON_EMERGENCY) for index in range(100)]
+    for taa in talkers:
+        rapp.declare_attribute(taa)
+
+    length = len(talkers[0].serialize())
+    records = rapp.serMappingInfo.values()
+    assert len(rapp.serMappingInfo) == 2
+    assert all(Attribute_list.encoded_length([length] * len(ids)) <= 600 for ids in records)
+    assert sum(len(ids) for ids in records) < len(talkers)
+    refused = talkers[-1]
+    assert rapp.generate_attribute_id(refused) not in rapp.attributeIdToRecordNoMapping
+
+    rapp.withdraw_attribute(refused)
+    assert rapp.generate_attribute_id(refused) not in rapp.declarationList
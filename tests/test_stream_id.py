@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Interned stream ids and mac addresses """
+
+import pickle
+
+from shared.rap import Stream_id as stream_id_module
+from shared.rap.Stream_id import Stream_id, Mac_address
+
+STREAM_ID = "00-11-22-33-44-55:00-01"
+
+
+def test_stream_id_is_interned_and_equal_to_its_string():
+    stream_id = Stream_id.from_bytes(bytes.fromhex("0011223344550001"))
+    assert stream_id == STREAM_ID and hash(stream_id) == hash(STREAM_ID)
+    assert Stream_id(STREAM_ID.upper()) is stream_id
+    assert pickle.loads(pickle.dumps(stream_id)) is stream_id
+    assert stream_id.attribute_id(10) == STREAM_ID + "-10"
+
+
+def test_full_intern_table_is_cleared_and_reported_once(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(stream_id_module, "INTERN_LIMIT", 4)
+    monkeypatch.setattr(Mac_address, "interned", {})
+    monkeypatch.setattr(Mac_address, "limit_reached", False)
+    monkeypatch.setattr(stream_id_module.logger, "warning", lambda *args: warnings.append(args))
+
+    first = Mac_address.from_value(0)
+    for value in range(1, 10):
+        Mac_address.from_value(value)
+
+    assert len(Mac_address.interned) < 4
+    assert len(warnings) == 1
+    assert Mac_address.from_value(0) == first
+    assert not Stream_id.limit_reached
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Registration and notification of streams between the protocol connector and the stream management """
+
+from protocol_connector.rap_cuc_lib import RapCucSM, StreamRegister
+from stream_management.lib.stream_status_db import StreamStatusDb, StreamState
+from shared.aux.flowControl import SendBacklog
+from shared.aux.msgType import MsgType
+from shared.qcc.tsn_types import StatusStream, StatusTalkerListener
+from shared.rap.Msrp_tspec_tlv import Msrp_tspec_tlv
+from shared.rap.TAA import TAA, Org_defined_taa_tlv
+from shared.rap.Listener_status import Listener_status
+
+STREAM_ID = "00-11-22-33-44-55:00-01"
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.packets = []
+
+    def send_msg(self, msg, sender_name, block=True):
+        self.packets.append(msg)
+        return True
+
+    def try_send(self, msg, sender_name):
+        return self.send_msg(msg, sender_name, block=False)
+
+
+# Interface configuration of the talker as configured by the CNC
+CONFIG_LIST = [
+    {"ieee802-mac-addresses": {"destination-mac-address": "01-00-5e-00-00-01",
+                               "source-mac-address": "00-11-22-33-44-55"}},
+    {"ieee802-vlan-tag": {"priority-code-point": 3, "vlan-id": 10}},
+]
+
+
+def end_station_status(mac):
+    return StatusTalkerListener({
+        "accumulated-latency": 10,
+        "interface-configuration": {"interface-list": [{"mac-address": mac, "interface-name": "",
+                                                        "config-list": CONFIG_LIST}]}
+    })
+
+
+def stream_status(failed_macs=()):
+    return StatusStream({
+        "status-info": {"talker-status": 1, "listener-status": Listener_status.READY,
+                        "failure-code": 1 if failed_macs else 0},
+        "failed-interfaces": [{"mac-address": mac, "interface-name": ""} for mac in failed_macs]
+    })
+
+
+def rap_cuc(listener_macs: dict):
+    """ RapCucSM without sub tasks, listener_macs maps participant ids to the mac of their listener """
+    rap_cuc = RapCucSM.__new__(RapCucSM)
+    rap_cuc.queue_register = {"rap_participants": RecordingQueue()}
+    rap_cuc.stream_register = StreamRegister()
+    rap_cuc.participant_backlog = SendBacklog(rap_cuc.queue_register["rap_participants"], "rap_cuc")
+    rap_cuc.get_listener_mac = lambda participant_id: listener_macs[participant_id]
+    return rap_cuc
+
+
+def declarations(rap_cuc):
+    return [(q_pckt.message["participantId"], q_pckt.message["attribute"])
+            for q_pckt in rap_cuc.queue_register["rap_participants"].packets
+            if q_pckt.msg_type == MsgType.RPSI_DECLARE_REQ]
+
+
+def test_talker_joining_requested_stream_updates_it():
+    db = StreamStatusDb()
+    db.advance_state("NEW_LISTENER", STREAM_ID)
+    assert db.advance_state("NEW_LISTENER", STREAM_ID) == MsgType.CC_ADD_STREAM_REQ
+    assert db.advance_state("NEW_TALKER", STREAM_ID) == MsgType.CC_UPDATE_STREAM_REQ
+    assert db.is_state(STREAM_ID, StreamState.PENDING)
+
+
+def test_listener_joining_deployed_stream_is_requested():
+    db = StreamStatusDb()
+    db.add_stream(STREAM_ID)
+    db.update_stream_state(STREAM_ID, StreamState.DEPLOYED)
+    assert db.advance_state("NEW_LISTENER", STREAM_ID) == MsgType.CC_ADD_LISTENER_REQ
+    assert db.is_state(STREAM_ID, StreamState.PENDING)
+
+
+def test_register_listener_keeps_all_listeners():
+    register = StreamRegister()
+    for participant_id in (3, 4, 4, 5):
+        register.register_listener(STREAM_ID, participant_id)
+    assert register.get_participant_id_listeners(STREAM_ID) == [3, 4, 5]
+
+
+def test_dst_mac_is_hex():
+    taa = TAA(STREAM_ID, destination_mac="0a-1b-2c-3d-4e-ff")
+    assert taa.get_dst_mac() == "0a-1b-2c-3d-4e-ff"
+
+
+def test_dst_mac_sent_to_cnc_is_declared_to_talker():
+    taa = TAA(STREAM_ID, destination_mac="0a-1b-2c-3d-4e-ff", msrp_tspec=Msrp_tspec_tlv(),
+              organizationally_defined=Org_defined_taa_tlv(maximum_latency=1000))
+    cuc = rap_cuc({})
+    cuc.stream_register.register_talker(STREAM_ID, 0, taa)
+    # The CNC configures the talker interface as requested in the data frame specification
+    config_list = [frame.field.getData() for frame in cuc.build_qcc_talker(taa).dataFrameSpecification]
+    talker_conf = StatusTalkerListener({
+        "accumulated-latency": 0,
+        "interface-configuration": {"interface-list": [{"mac-address": taa.get_mac(), "interface-name": "",
+                                                        "config-list": config_list}]}
+    })
+    cuc.notify_talker(STREAM_ID, stream_status(), talker_conf)
+
+    laa = declarations(cuc)[0][1]
+    assert laa.interface_configuration.get_dst_mac() == "0a-1b-2c-3d-4e-ff"
+
+
+def test_notify_listeners_skips_listeners_which_left():
+    cuc = rap_cuc({1: "00-00-00-00-00-01"})
+    cuc.stream_register.register_talker(STREAM_ID, 0, TAA(STREAM_ID))
+    cuc.stream_register.register_listener(STREAM_ID, 1)
+
+    # The result configures a second listener which withdrew its attribute since the request
+    configs = [end_station_status("00-00-00-00-00-01"), end_station_status("00-00-00-00-00-02")]
+    cuc.notify_listeners(configs, STREAM_ID, stream_status(), 1)
+
+    declared = declarations(cuc)
+    assert [participant_id for participant_id, _ in declared] == [1]
+    assert declared[0][1].accumulated_maximum_latency == 10
+
+
+def test_notify_listeners_fails_unconfigured_listeners():
+    cuc = rap_cuc({1: "00-00-00-00-00-01", 2: "00-00-00-00-00-02"})
+    cuc.stream_register.register_talker(STREAM_ID, 0, TAA(STREAM_ID))
+    cuc.stream_register.register_listener(STREAM_ID, 1)
+    cuc.stream_register.register_listener(STREAM_ID, 2)
+
+    cuc.notify_listeners([end_station_status("00-00-00-00-00-01")], STREAM_ID,
+                         stream_status(failed_macs=["00-00-00-00-00-02"]), 1)
+
+    declared = dict(declarations(cuc))
+    assert declared[1].failure_information_stlv is None
+    assert declared[2].failure_information_stlv is not None
+
+
+def test_notify_listeners_ignores_withdrawn_talker():
+    cuc = rap_cuc({1: "00-00-00-00-00-01"})
+    cuc.stream_register.register_listener(STREAM_ID, 1)
+    cuc.notify_listeners([end_station_status("00-00-00-00-00-01")], STREAM_ID, stream_status(), 1)
+    assert declarations(cuc) == []
+
+
+def test_notify_talker_declares_laa():
+    cuc = rap_cuc({})
+    cuc.stream_register.register_talker(STREAM_ID, 0, TAA(STREAM_ID))
+    talker_conf = end_station_status("00-11-22-33-44-55")
+    cuc.notify_talker(STREAM_ID, stream_status(), talker_conf)
+
+    declared = declarations(cuc)
+    assert [participant_id for participant_id, _ in declared] == [0]
+    assert declared[0][1].listener_attach_status == Listener_status.READY
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic end-station fleet for load tests of the CUC. Every end station connects from a neighbour target port to
+the local target port with the same index, declares one generated TAA (talker) or LAA (listener) via the
+LRP-Dummy protocol and parses the attributes the CUC declares back. A listener is answered by the TAA of its
+stream, a talker by the LAA of its stream. Registration-to-response latency percentiles (overall and per role)
+and throughput are reported at the end. The latency of a talker includes waiting for the first listener of its
+stream, since the CUC only requests a stream with listeners.
+
+Run the CUC with the stub CNC, which approves every request:
+    python3 tools/end_station_fleet.py --generate-config /tmp/fleet.json --stations 1000
+    python3 tools/end_station_fleet.py --port-config /tmp/fleet.json --spawn --duration 30 --churn 20
+or start cuc.py yourself with "--port-config /tmp/fleet.json --cnc stub" and leave out --spawn.
+With "--transport unix" the generated ports are unix domain sockets, which leaves loopback TCP out of the measurement.
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import signal
+import argparse
+import selectors
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CUC_DIR = os.path.join(ROOT_DIR, "cuc")
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, CUC_DIR)
+from protocol_connector.port_config import load_port_config, DEFAULT_PORT_CONFIG_PATH, TRANSPORT_TCP, TRANSPORT_UNIX
+from protocol_connector.lrp_transport import connect
+from shared.rap.TAA import TAA, Org_defined_taa_tlv
+from shared.rap.LAA import LAA
+from shared.rap.Attribute_list import Attribute_list
+from shared.rap.Msrp_tspec_tlv import Msrp_tspec_tlv
+from shared.rap.Listener_status import Listener_status
+
+# LRP-Dummy record: record number (1 byte) followed by the attribute TLV (type 1 byte, length 2 bytes, value)
+RECORD_HEADER_LENGTH = 4
+RECEIVE_CHUNK_SIZE = 65536
+# Every end station declares its attribute in this record
+RECORD_NUMBER = 0
+
+ROLE_TALKER = "talker"
+ROLE_LISTENER = "listener"
+
+STREAM_RANK_EMERGENCY = 0
+STREAM_RANK_NON_EMERGENCY = 1
+# Intervals of the generated streams (numerator / denominator seconds): 125us, 250us, 500us and 1ms
+INTERVAL_DENOMINATORS = (8000, 4000, 2000, 1000)
+VLAN_ID = 10
+PRIORITY = 5
+
+
+def parse_range(value: str) -> tuple:
+    """ Parse "N" or "MIN-MAX" to (MIN, MAX) """
+    low, _, high = value.partition("-")
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError("invalid range %r" % value)
+    return low, high
+
+
+def percentile(sorted_values: list, percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def generate_port_config(stations: int, local_base_port: int, neighbour_base_port: int,
+                         transport: str = TRANSPORT_TCP, unix_dir: str = None) -> dict:
+    """ Build a port configuration with one local and one neighbour target port per end station.
+    The chassisId of a neighbour target port is the mac address of the end station.
+    Unix domain socket ports are named after the tcp port they replace and placed in unix_dir
+    """
+    local_ports = []
+    neighbour_ports = []
+    for index in range(stations):
+        local_ports.append({
+            "chassisId": "00:00:00:00:00:00",
+            "portId": str(index + 1),
+            "ecpCapable": False,
+            "tcpCapable": True,
+            "tcpPort": str(local_base_port + index),
+            "addrIPv4": "127.0.0.1",
+            "addrIPv6": ""
+        })
+        neighbour_ports.append({
+            "chassisId": "02-00-00-%02x-%02x-%02x" % ((index >> 16) & 0xff, (index >> 8) & 0xff, index & 0xff),
+            "portId": str(index + 1),
+            "ecpCapable": False,
+            "tcpCapable": True,
+            "tcpPort": str(neighbour_base_port + index),
+            "addrIPv4": "127.0.0.1",
+            "addrIPv6": ""
+        })
+        if transport == TRANSPORT_UNIX:
+            for port in (local_ports[-1], neighbour_ports[-1]):
+                port["transport"] = TRANSPORT_UNIX
+                port["unixPath"] = os.path.join(unix_dir, "port_%s.sock" % port["tcpPort"])
+    return {"localTargetPorts": local_ports, "neighbourTargetPorts": neighbour_ports}
+
+
+class Stream:
+    """ Generated stream: one talker and its listeners """
+
+    def __init__(self, stream_id: str, rank: int, frame_size: int, interval_denominator: int):
+        self.stream_id = stream_id
+        self.rank = rank
+        self.frame_size = frame_size
+        self.interval_denominator = interval_denominator
+        self.talker = None
+        self.listeners = []
+
+
+class EndStation:
+    """ End station with one portal to the CUC, declaring one attribute """
+
+    def __init__(self, index: int, local_port: dict, neighbour_port: dict, role: str, stream: Stream):
+        self.index = index
+        self.local_port = local_port
+        self.neighbour_port = neighbour_port
+        self.mac = neighbour_port["chassisId"]
+        self.role = role
+        self.stream = stream
+
+        self.sock = None
+        self.connected = False
+        self.receive_buffer = bytearray()
+        self.send_buffer = bytearray()
+        self.declared = False
+        self.pending_since = None  # time of the declaration which is not answered yet
+        self.record = None
+
+    def build_record(self) -> bytes:
+        """ Serialize the attribute of the end station as LRP-Dummy record """
+        stream = self.stream
+        if self.role == ROLE_TALKER:
+            attribute = TAA(stream_id=stream.stream_id, stream_rank=stream.rank,
+                            destination_mac="01-00-5e-%s" % stream.stream_id[9:17], vlan_id=VLAN_ID,
+                            priority=PRIORITY, msrp_tspec=Msrp_tspec_tlv(stream.frame_size, 1),
+                            organizationally_defined=Org_defined_taa_tlv(1, stream.interval_denominator, 0, 0, 0,
+                                                                         1000000 // stream.interval_denominator))
+        else:
+            attribute = LAA(stream_id=stream.stream_id)
+            attribute.update_status(Listener_status.READY)
+        return bytes([RECORD_NUMBER]) + attribute.serialize()
+
+    def is_response(self, attribute_type: int, attribute) -> bool:
+        """ Check if a received attribute answers the declaration of the end station """
+        if attribute.get_stream_id() != self.stream.stream_id:
+            return False
+        if self.role == ROLE_TALKER:
+            return attribute_type == 0x02
+        return attribute_type == 0x01
+
+    @staticmethod
+    def is_failure(attribute_type: int, attribute) -> bool:
+        if attribute_type == 0x01:
+            return attribute.failure_information_stlv is not None
+        return attribute.listener_attach_status != Listener_status.READY
+
+
+class Fleet:
+    """ Drives all end stations from one selector loop """
+
+    def __init__(self, stations: list, churn_rate: float, rejoin_delay: float, rng: random.Random):
+        self.stations = stations
+        self.churn_rate = churn_rate
+        self.rejoin_delay = rejoin_delay
+        self.rng = rng
+        self.selector = selectors.DefaultSelector()
+        self.events = []  # heap of (time, sequence, function, station)
+        self.sequence = 0
+
+        self.latencies = {ROLE_TALKER: [], ROLE_LISTENER: []}
+        self.declarations = 0
+        self.withdrawals = 0
+        self.responses = 0
+        self.failures = 0
+        self.updates = 0  # attributes received for an already answered declaration
+        self.records_received = 0
+        self.first_declaration = None
+        self.last_response = None
+
+    def schedule(self, at: float, function, station=None) -> None:
+        self.sequence += 1
+        heapq.heappush(self.events, (at, self.sequence, function, station))
+
+    def connect_all(self, timeout: float) -> None:
+        """ Connect all end stations, retrying refused connections until the CUC listens on all ports """
+        deadline = time.monotonic() + timeout
+        pending = list(self.stations)
+        while pending:
+            retry = []
+            for station in pending:
+                # The CUC identifies listeners by the neighbour target port the connection comes from
+                try:
+                    sock = connect(station.local_port, station.neighbour_port)
+                except ConnectionRefusedError:
+                    retry.append(station)
+                    continue
+                sock.setblocking(False)
+                station.sock = sock
+                station.connected = True
+                self.selector.register(sock, selectors.EVENT_READ, station)
+            pending = retry
+            if pending:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("%s local target ports not listening after %ss" % (len(pending), timeout))
+                time.sleep(0.05)
+
+    def declare(self, station: EndStation, now: float) -> None:
+        if station.record is None:
+            station.record = station.build_record()
+        station.declared = True
+        station.pending_since = now
+        self.declarations += 1
+        if self.first_declaration is None:
+            self.first_declaration = now
+        self.send(station, station.record)
+
+    def withdraw(self, station: EndStation, now: float) -> None:
+        station.declared = False
+        station.pending_since = None
+        self.withdrawals += 1
+        self.send(station, bytes([RECORD_NUMBER, 0, 0, 0]))
+        self.schedule(now + self.rejoin_delay, self.declare, station)
+
+    def churn(self, _, now: float) -> None:
+        """ Withdraw the attribute of a random declared end station, it declares again after the rejoin delay """
+        declared = [candidate for candidate in self.rng.sample(self.stations, min(len(self.stations), 16))
+                    if candidate.declared]
+        if declared:
+            self.withdraw(declared[0], now)
+        self.schedule(now + self.rng.expovariate(self.churn_rate), self.churn)
+
+    def send(self, station: EndStation, data: bytes) -> None:
+        if station.send_buffer:
+            station.send_buffer += data
+            return
+        try:
+            sent = station.sock.send(data)
+        except BlockingIOError:
+            sent = 0
+        if sent < len(data):
+            station.send_buffer += data[sent:]
+            self.selector.modify(station.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, station)
+
+    def flush(self, station: EndStation) -> None:
+        try:
+            sent = station.sock.send(station.send_buffer)
+        except BlockingIOError:
+            return
+        del station.send_buffer[:sent]
+        if not station.send_buffer:
+            self.selector.modify(station.sock, selectors.EVENT_READ, station)
+
+    def receive(self, station: EndStation, now: float) -> None:
+        try:
+            data = station.sock.recv(RECEIVE_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except ConnectionResetError:
+            data = b''
+        if not data:
+            print("end station %s: connection closed by the CUC" % station.index)
+            self.selector.unregister(station.sock)
+            station.sock.close()
+            station.connected = False
+            return
+
+        buffer = station.receive_buffer
+        buffer += data
+        offset = 0
+        while len(buffer) - offset >= RECORD_HEADER_LENGTH:
+            length = int.from_bytes(buffer[offset + 2:offset + 4], byteorder='big')
+            record_end = offset + RECORD_HEADER_LENGTH + length
+            if record_end > len(buffer):
+                break
+            self.records_received += 1
+            if length > 0:
+                for tlv in Attribute_list.unpack(bytes(buffer[offset + 1:record_end])):
+                    self.process_attribute(station, tlv, now)
+            offset = record_end
+        del buffer[:offset]
+
+    def process_attribute(self, station: EndStation, tlv: bytes, now: float) -> None:
+        attribute_type = tlv[0]
+        if attribute_type == 0x01:
+            attribute = TAA()
+        elif attribute_type == 0x02:
+            attribute = LAA()
+        else:
+            return
+        attribute.deserialize(tlv)
+        if not station.is_response(attribute_type, attribute):
+            return
+
+        if station.pending_since is None:
+            self.updates += 1
+            return
+        self.latencies[station.role].append(now - station.pending_since)
+        station.pending_since = None
+        self.responses += 1
+        self.last_response = now
+        if station.is_failure(attribute_type, attribute):
+            self.failures += 1
+
+    def run(self, ramp: float, duration: float, drain: float) -> None:
+        """ Declare the attributes of all end stations spread over ramp seconds, churn until duration
+        seconds have passed and wait up to drain seconds for the outstanding responses
+        """
+        start = time.monotonic()
+        order = list(self.stations)
+        self.rng.shuffle(order)
+        for index, station in enumerate(order):
+            self.schedule(start + ramp * index / len(order), self.declare, station)
+        if self.churn_rate > 0:
+            self.schedule(start + ramp + self.rng.expovariate(self.churn_rate), self.churn)
+
+        end = start + max(ramp, duration)
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                outstanding = any(station.pending_since is not None for station in self.stations)
+                if not outstanding or now >= end + drain:
+                    break
+            while self.events and self.events[0][0] <= now and now < end:
+                _, _, function, station = heapq.heappop(self.events)
+                function(station, now)
+
+            timeout = 0.05
+            if self.events and now < end:
+                timeout = min(timeout, max(0.0, self.events[0][0] - now))
+            for key, mask in self.selector.select(timeout):
+                station = key.data
+                if mask & selectors.EVENT_WRITE:
+                    self.flush(station)
+                if mask & selectors.EVENT_READ:
+                    self.receive(station, time.monotonic())
+
+    def close(self) -> None:
+        for station in self.stations:
+            if station.connected:
+                self.selector.unregister(station.sock)
+                station.sock.close()
+        self.selector.close()
+
+    @staticmethod
+    def summarize(latencies: list) -> dict:
+        latencies = sorted(latencies)
+        return {
+            "count": len(latencies),
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        }
+
+    def report(self) -> dict:
+        outstanding = sum(1 for station in self.stations if station.pending_since is not None)
+        elapsed = (self.last_response - self.first_declaration) if self.last_response is not None else 0.0
+        return {
+            "stations": len(self.stations),
+            "declarations": self.declarations,
+            "withdrawals": self.withdrawals,
+            "responses": self.responses,
+            "failures": self.failures,
+            "unanswered": outstanding,
+            "updates": self.updates,
+            "records_received": self.records_received,
+            # responses per second between the first declaration and the last response
+            "throughput": self.responses / elapsed if elapsed > 0 else 0.0,
+            "latency": self.summarize(self.latencies[ROLE_TALKER] + self.latencies[ROLE_LISTENER]),
+            "latency_talker": self.summarize(self.latencies[ROLE_TALKER]),
+            "latency_listener": self.summarize(self.latencies[ROLE_LISTENER]),
+        }
+
+
+def build_fleet(port_config: dict, station_count: int, listeners: tuple, emergency_ratio: float,
+                frame_size: tuple, rng: random.Random) -> list:
+    """ Assign the end stations to generated streams, one talker and a random number of listeners per stream """
+    station_count = min(station_count, len(port_config["localTargetPorts"]),
+                        len(port_config["neighbourTargetPorts"]))
+    ports = list(zip(port_config["localTargetPorts"], port_config["neighbourTargetPorts"]))[:station_count]
+
+    stations = []
+    index = 0
+    while station_count - index >= 2:
+        talker_port = ports[index]
+        stream = Stream(stream_id="%s:00-01" % talker_port[1]["chassisId"],
+                        rank=STREAM_RANK_EMERGENCY if rng.random() < emergency_ratio else STREAM_RANK_NON_EMERGENCY,
+                        frame_size=rng.randint(*frame_size),
+                        interval_denominator=rng.choice(INTERVAL_DENOMINATORS))
+        listener_count = min(max(1, rng.randint(*listeners)), station_count - index - 1)
+
+        stream.talker = EndStation(index, talker_port[0], talker_port[1], ROLE_TALKER, stream)
+        stations.append(stream.talker)
+        for listener_index in range(index + 1, index + 1 + listener_count):
+            listener = EndStation(listener_index, ports[listener_index][0], ports[listener_index][1], ROLE_LISTENER,
+                                  stream)
+            stream.listeners.append(listener)
+            stations.append(listener)
+        index += 1 + listener_count
+    return stations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic end-station fleet for CUC load tests')
+    parser.add_argument('--port-config', default=DEFAULT_PORT_CONFIG_PATH,
+                        help='port configuration of the CUC, end station i connects from neighbour target port i '
+                             'to local target port i')
+    parser.add_argument('--generate-config', default=None, metavar='PATH',
+                        help='write a port configuration for --stations end stations to PATH and exit')
+    parser.add_argument('--local-base-port', type=int, default=20000, help='first local target port (generate)')
+    parser.add_argument('--neighbour-base-port', type=int, default=10000,
+                        help='first neighbour target port (generate)')
+    parser.add_argument('--transport', default=TRANSPORT_TCP, choices=[TRANSPORT_TCP, TRANSPORT_UNIX],
+                        help='transport of the generated target ports (generate)')
+    parser.add_argument('--unix-dir', default=None, metavar='DIR',
+                        help='directory of the unix domain sockets (generate, default: next to the config)')
+    parser.add_argument('--stations', type=int, default=None, help='number of end stations (default: all ports)')
+    parser.add_argument('--listeners', type=parse_range, default=(1, 1), metavar='MIN[-MAX]',
+                        help='listeners per stream, drawn uniformly')
+    parser.add_argument('--emergency-ratio', type=float, default=0.0,
+                        help='fraction of streams with emergency stream rank')
+    parser.add_argument('--frame-size', type=parse_range, default=(64, 1500), metavar='MIN[-MAX]',
+                        help='maximum frame size of the streams, drawn uniformly')
+    parser.add_argument('--ramp', type=float, default=1.0, help='seconds over which the stations declare')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load including the ramp')
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help='withdrawals per second across the fleet after the ramp')
+    parser.add_argument('--rejoin-delay', type=float, default=1.0,
+                        help='seconds until a withdrawn station declares again')
+    parser.add_argument('--drain', type=float, default=5.0,
+                        help='seconds to wait for outstanding responses after the duration')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for the CUC to listen')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated fleet and churn')
+    parser.add_argument('--json', default=None, metavar='PATH', help='write the results as json to PATH')
+    parser.add_argument('--spawn', action='store_true',
+                        help='start cuc.py with the port configuration and the stub CNC')
+    parser.add_argument('--cuc-output', default=os.devnull, metavar='PATH',
+                        help='file the output of the spawned cuc.py is written to')
+    parser.add_argument('cuc_args', nargs=argparse.REMAINDER, help='arguments passed to cuc.py after --')
+    args = parser.parse_args()
+
+    if args.generate_config is not None:
+        if args.stations is None:
+            parser.error("--generate-config requires --stations")
+        unix_dir = os.path.abspath(args.unix_dir or os.path.dirname(os.path.abspath(args.generate_config)))
+        with open(args.generate_config, "w") as f:
+            json.dump(generate_port_config(args.stations, args.local_base_port, args.neighbour_base_port,
+                                           args.transport, unix_dir), f, indent=4)
+        print("Wrote port configuration for %s end stations to %s" % (args.stations, args.generate_config))
+        return
+
+    port_config = load_port_config(args.port_config)
+    rng = random.Random(args.seed)
+    stations = build_fleet(port_config, args.stations or len(port_config["localTargetPorts"]), args.listeners,
+                           args.emergency_ratio, args.frame_size, rng)
+    if not stations:
+        parser.error("the port configuration has too few target ports for a stream")
+
+    process = None
+    if args.spawn:
+        cuc_args = args.cuc_args[1:] if args.cuc_args[:1] == ["--"] else args.cuc_args
+        # New session, so the process group including worker processes can be stopped at once
+        with open(args.cuc_output, "w") as output:
+            process = subprocess.Popen([sys.executable, "cuc.py", "--port-config",
+                                        os.path.abspath(args.port_config), "--cnc", "stub"] + cuc_args,
+                                       cwd=CUC_DIR, stdout=output, stderr=subprocess.STDOUT, start_new_session=True)
+
+    fleet = Fleet(stations, args.churn, args.rejoin_delay, rng)
+    try:
+        fleet.connect_all(args.timeout)
+        print("connected %s end stations in %s streams" % (len(stations),
+                                                            sum(1 for s in stations if s.role == ROLE_TALKER)))
+        fleet.run(args.ramp, args.duration, args.drain)
+    finally:
+        fleet.close()
+        if process is not None:
+            if process.poll() is not None:
+                print("cuc.py exited early with %s" % process.returncode)
+            os.killpg(process.pid, signal.SIGINT)
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+
+    result = fleet.report()
+    print("declarations=%s withdrawals=%s responses=%s failures=%s unanswered=%s updates=%s"
+          % (result["declarations"], result["withdrawals"], result["responses"], result["failures"],
+             result["unanswered"], result["updates"]))
+    for name in ("latency", "latency_talker", "latency_listener"):
+        latency = result[name]
+        print("%-16s n=%-6s mean=%.3fms p50=%.3fms p90=%.3fms p99=%.3fms max=%.3fms"
+              % ((name, latency["count"]) + tuple(latency[key] * 1000 for key in ("mean", "p50", "p90", "p99", "max"))))
+    print("throughput=%.1f responses/s" % result["throughput"])
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline analyzer of LRP-Dummy captures. The CUC keeps the last records of every portal in a capture ring and writes
+them to lrp_capture_<pid>_<reason>_<time>.bin on SIGUSR2 or when a portal fails (see --lrp-capture-bytes of cuc.py).
+The analyzer decodes the records with the shared/rap attribute classes and prints a summary per portal and a
+timeline per stream. Withdrawals are attributed to the streams last declared in the same record of the portal,
+records holding several attributes add an entry to the timeline of each of their streams.
+
+Usage:
+    kill -USR2 <pid of cuc.py>
+    python3 tools/lrp_capture_analyzer.py lrp_capture_*.bin [--stream 00-11-22-33-44-55:00-01] [--portal 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+from collections import OrderedDict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CUC_DIR = os.path.join(ROOT_DIR, "cuc")
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, CUC_DIR)
+from protocol_connector.lrp_capture import ENTRY_HEADERS, EVENT_PORTAL, EVENT_IN, EVENT_OUT, EVENT_CLOSED, \
+    EVENT_DROPPED
+from shared.rap.TAA import TAA
+from shared.rap.LAA import LAA
+from shared.rap.RACA import RACA
+from shared.rap.Attribute_list import Attribute_list
+
+DIRECTIONS = {EVENT_IN: "in", EVENT_OUT: "out"}
+# Timeline key of records without a stream
+NO_STREAM = "(no stream)"
+
+
+class Portal:
+    """ Records of one portal found in the capture files """
+
+    def __init__(self, portal_id: int, peer: str):
+        self.portal_id = portal_id
+        self.peer = peer
+        self.records = {EVENT_IN: 0, EVENT_OUT: 0}
+        self.dropped = 0
+        self.closed = None  # (time, reason)
+
+
+def read_capture(path: str) -> list:
+    """ Read the entries of a capture file
+    @return: [(time, portal id, event, record number, payload), ...] in file order
+    @raise ValueError: if the file is no capture or truncated
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    magic = content[:8]
+    if magic not in ENTRY_HEADERS:
+        raise ValueError("%s is no LRP capture" % path)
+    entry_header = ENTRY_HEADERS[magic]
+
+    entries = []
+    offset = len(magic)
+    while offset < len(content):
+        if offset + entry_header.size > len(content):
+            raise ValueError("%s is truncated" % path)
+        timestamp, portal_id, event, record_number, length = entry_header.unpack_from(content, offset)
+        offset += entry_header.size
+        payload = content[offset:offset + length]
+        if len(payload) < length:
+            raise ValueError("%s is truncated" % path)
+        offset += length
+        entries.append((timestamp, portal_id, event, record_number, payload))
+    return entries
+
+
+def decode_attribute(payload: bytes) -> tuple:
+    """ Decode an attribute TLV of a record
+    @return: (stream id or None, description)
+    """
+    payload = bytes(payload)
+    attribute_type = payload[0]
+    try:
+        if attribute_type == 0x01:
+            taa = TAA()
+            taa.deserialize(payload)
+            description = "TAA rank=%s vlan=%s priority=%s dst=%s latency=%s" % (
+                taa.stream_rank, taa.data_frame_parameters_stlv.vlan_id, taa.data_frame_parameters_stlv.priority,
+                taa.get_dst_mac(), taa.accumulated_maximum_latency)
+            if taa.msrp_tspec_stlv is not None:
+                description += " msrp=%s/%s" % (taa.msrp_tspec_stlv.max_frame_size,
+                                                taa.msrp_tspec_stlv.max_interval_frames)
+            if taa.failure_information_stlv is not None:
+                description += " failure=%s by %s" % (taa.failure_information_stlv.failure_code.name,
+                                                      taa.failure_information_stlv.get_system_id())
+            return taa.get_stream_id(), description
+        if attribute_type == 0x02:
+            laa = LAA()
+            laa.deserialize(payload)
+            description = "LAA status=%s" % laa.listener_attach_status.name
+            if laa.failure_information_stlv is not None:
+                description += " failure=%s by %s" % (laa.failure_information_stlv.failure_code.name,
+                                                      laa.failure_information_stlv.get_system_id())
+            return laa.get_stream_id(), description
+        if attribute_type == 0x00:
+            raca = RACA([])
+            raca.deserialize(payload)
+            return None, "RACA %s" % ", ".join("%s/%s" % (descriptor.get_rsid(), descriptor.priority)
+                                               for descriptor in raca.ra_class_desc_list)
+    except Exception as e:
+        return None, "undecodable type 0x%02x (%s: %s) %s" % (attribute_type, type(e).__name__, e, payload.hex())
+    return None, "unknown type 0x%02x %s" % (attribute_type, payload.hex())
+
+
+def format_time(timestamp: float) -> str:
+    return time.strftime("%H:%M:%S", time.localtime(timestamp)) + ("%.6f" % (timestamp % 1))[1:]
+
+
+def analyze(entries: list, stream_filter: str = None, portal_filter: int = None) -> None:
+    portals = OrderedDict()
+    timelines = OrderedDict()  # stream id : [(time, portal id, direction, record number, description)]
+    declared = {}  # (portal id, direction, record number) : stream id of the last declaration
+
+    for timestamp, portal_id, event, record_number, payload in sorted(entries, key=lambda entry: entry[0]):
+        if portal_filter is not None and portal_id != portal_filter:
+            continue
+        if event == EVENT_PORTAL:
+            portals.setdefault(portal_id, Portal(portal_id, payload.decode(errors="replace")))
+            continue
+        portal = portals.setdefault(portal_id, Portal(portal_id, "?"))
+        if event == EVENT_DROPPED:
+            portal.dropped += int.from_bytes(payload, 'big')
+        elif event == EVENT_CLOSED:
+            portal.closed = (timestamp, payload.decode(errors="replace"))
+        elif event in DIRECTIONS:
+            portal.records[event] += 1
+            key = (portal_id, event, record_number)
+            try:
+                attributes = [decode_attribute(tlv) for tlv in Attribute_list.unpack(payload)]
+            except ValueError as e:
+                attributes = [(None, "undecodable attribute list (%s) %s" % (e, payload.hex()))]
+            previous = declared.pop(key, [])
+            streams = [stream_id for stream_id, _ in attributes if stream_id is not None]
+            if streams:
+                declared[key] = streams
+            # Streams of the previous content of the record which it no longer holds
+            attributes += [(stream_id, "withdrawn") for stream_id in previous if stream_id not in streams]
+            if not attributes:
+                attributes = [(None, "withdrawn")]
+            for stream_id, description in attributes:
+                timelines.setdefault(stream_id or NO_STREAM, []).append(
+                    (timestamp, portal_id, DIRECTIONS[event], record_number, description))
+
+    print("Portals:")
+    for portal in portals.values():
+        line = "  portal %-6s peer %-24s in=%-5s out=%-5s" % (portal.portal_id, portal.peer,
+                                                                portal.records[EVENT_IN], portal.records[EVENT_OUT])
+        if portal.dropped:
+            line += " dropped=%s" % portal.dropped
+        if portal.closed is not None:
+            line += " closed %s: %s" % (format_time(portal.closed[0]), portal.closed[1])
+        print(line)
+
+    for stream_id, timeline in timelines.items():
+        if stream_filter is not None and stream_id != stream_filter:
+            continue
+        print("\nStream %s" % stream_id)
+        for timestamp, portal_id, direction, record_number, description in timeline:
+            print("  %s  portal %-6s %-3s record %-3s %s" % (format_time(timestamp), portal_id, direction,
+                                                              record_number, description))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LRP-Dummy capture analyzer')
+    parser.add_argument('captures', nargs='+', help='capture files written by the CUC')
+    parser.add_argument('--stream', default=None, help='only print the timeline of this stream id')
+    parser.add_argument('--portal', type=int, default=None, help='only analyze the records of this portal')
+    args = parser.parse_args()
+
+    entries = []
+    for path in args.captures:
+        try:
+            entries += read_capture(path)
+        except (OSError, ValueError) as e:
+            print("Skipping %s: %s" % (path, e))
+    # An error dump and a later dump on request contain the same records
+    entries = list(OrderedDict.fromkeys(entries))
+    analyze(entries, args.stream, args.portal)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark of the CUC: measures the time from a cold start of cuc/cuc.py until all local target ports
+accept connections. Fails (exit code 1) if the median exceeds the budget or regresses against a baseline.
+
+Usage:
+    python3 tools/startup_benchmark.py [--runs 5] [--budget 1.5] [--baseline startup.json] [-- <cuc.py args>]
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CUC_DIR = os.path.join(ROOT_DIR, "cuc")
+
+sys.path.insert(0, CUC_DIR)
+from protocol_connector.port_config import load_port_config, DEFAULT_PORT_CONFIG_PATH, TRANSPORT_INPROC, \
+    target_port_transport, target_port_address
+from protocol_connector.lrp_transport import connect
+
+
+def port_accepts(target_port: dict) -> bool:
+    try:
+        with connect(target_port):
+            return True
+    except OSError:
+        return False
+
+
+def measure_startup(cuc_args: list, target_ports: list, timeout: float) -> float:
+    """ Start the CUC and wait until all target ports accept connections
+    @param cuc_args: additional command line arguments of cuc.py
+    @param target_ports: local target port entries which have to listen
+    @param timeout: seconds to wait for the ports
+    @return: seconds from process start until all ports listen
+    """
+    start = time.perf_counter()
+    # New session, so the process group including worker processes can be stopped at once
+    process = subprocess.Popen([sys.executable, "cuc.py"] + cuc_args, cwd=CUC_DIR, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        pending = list(target_ports)
+        while pending:
+            if process.poll() is not None:
+                raise RuntimeError("cuc.py exited with %s before all ports were listening" % process.returncode)
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("Ports %s not listening after %ss" % ([target_port_address(target)
+                                                                          for target in pending], timeout))
+            pending = [target for target in pending if not port_accepts(target)]
+            if pending:
+                time.sleep(0.005)
+        return time.perf_counter() - start
+    finally:
+        os.killpg(process.pid, signal.SIGINT)
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CUC startup benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='number of cold starts')
+    parser.add_argument('--budget', type=float, default=1.5, help='maximum median startup time in seconds')
+    parser.add_argument('--baseline', default=None,
+                        help='json file with the median of a previous run, written if it does not exist')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative regression against the baseline')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for the ports per run')
+    parser.add_argument('--port-config', default=DEFAULT_PORT_CONFIG_PATH, help='port configuration of the CUC')
+    parser.add_argument('cuc_args', nargs=argparse.REMAINDER, help='arguments passed to cuc.py after --')
+    args = parser.parse_args()
+
+    cuc_args = args.cuc_args[1:] if args.cuc_args[:1] == ["--"] else args.cuc_args
+    cuc_args = ["--port-config", args.port_config] + cuc_args
+    port_config = load_port_config(args.port_config)
+    # In-process ports can not be reached from this process
+    target_ports = [port for port in port_config["localTargetPorts"]
+                    if target_port_transport(port) != TRANSPORT_INPROC]
+
+    durations = []
+    for run in range(args.runs):
+        duration = measure_startup(cuc_args, target_ports, args.timeout)
+        durations.append(duration)
+        print("run %s: %.3fs" % (run, duration))
+
+    median = statistics.median(durations)
+    print("startup min=%.3fs median=%.3fs max=%.3fs budget=%.3fs" % (min(durations), median, max(durations),
+                                                                     args.budget))
+    failed = False
+    if median > args.budget:
+        print("FAIL: median startup time exceeds the budget")
+        failed = True
+
+    if args.baseline is not None:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)["median"]
+            print("baseline median=%.3fs tolerance=%d%%" % (baseline, args.tolerance * 100))
+            if median > baseline * (1 + args.tolerance):
+                print("FAIL: startup time regressed against the baseline")
+                failed = True
+        else:
+            with open(args.baseline, "w") as f:
+                json.dump({"median": median, "durations": durations}, f)
+            print("Wrote baseline to %s" % args.baseline)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()